@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# Degradation levels, from full LLM analysis down to keyword triage only
+FULL = 0
+REDUCED = 1
+LOCAL_ONLY = 2
+LEVEL_NAMES = ("full", "reduced", "local-only")
+
+# Summaries waiting for a slot before optional LLM work is shed, and before calls are triaged locally
+ADMISSION_REDUCED_DEPTH = int(os.getenv("ADMISSION_REDUCED_DEPTH", "4"))
+ADMISSION_LOCAL_DEPTH = int(os.getenv("ADMISSION_LOCAL_DEPTH", "12"))
+# A level is only left once the depth has fallen below this fraction of its threshold
+ADMISSION_RECOVER_RATIO = float(os.getenv("ADMISSION_RECOVER_RATIO", "0.5"))
+# Rate limited models fail every request; past this error rate optional work is shed even with a short queue
+ADMISSION_ERROR_RATE = float(os.getenv("ADMISSION_ERROR_RATE", "0.5"))
+
+
+class AdmissionController:
+    """Maps the backlog in front of the LLM tier to a degradation level.
+
+    depth() returns how many requests are waiting; error_rate(), if given, the
+    recent failure rate of the tier. The level rises as soon as a threshold is
+    reached and only falls once the depth is well below it again, so a queue
+    hovering around a threshold does not flap between levels.
+    """
+
+    def __init__(self, depth: Callable[[], int], error_rate: Optional[Callable[[], float]] = None,
+                 reduced_depth: int = ADMISSION_REDUCED_DEPTH, local_depth: int = ADMISSION_LOCAL_DEPTH,
+                 recover_ratio: float = ADMISSION_RECOVER_RATIO):
+        self.depth = depth
+        self.error_rate = error_rate
+        self.thresholds = (reduced_depth, local_depth)
+        self.recover_ratio = recover_ratio
+        self.current = FULL
+        self.changed = time.time()
+        self.admitted = [0] * len(LEVEL_NAMES)
+
+    def level(self) -> int:
+        depth = self.depth()
+        level = self.current
+        while level < LOCAL_ONLY and depth >= self.thresholds[level]:
+            level += 1
+        while level > FULL and depth < self.thresholds[level - 1] * self.recover_ratio:
+            level -= 1
+        if level == FULL and self.error_rate and self.error_rate() >= ADMISSION_ERROR_RATE:
+            level = REDUCED
+        if level != self.current:
+            print(f"Admission level {LEVEL_NAMES[self.current]} -> {LEVEL_NAMES[level]} at depth {depth}")
+            self.current = level
+            self.changed = time.time()
+        return level
+
+    def admit(self) -> int:
+        """Return the level a new request runs at, counting requests admitted at each level"""
+        level = self.level()
+        self.admitted[level] += 1
+        return level
+
+    def snapshot(self) -> Dict:
+        level = self.level()
+        return {
+            "level": level,
+            "name": LEVEL_NAMES[level],
+            "depth": self.depth(),
+            "error_rate": self.error_rate() if self.error_rate else None,
+            "thresholds": {"reduced": self.thresholds[0], "local-only": self.thresholds[1]},
+            "since": self.changed,
+            "admitted": dict(zip(LEVEL_NAMES, self.admitted)),
+        }
+
+
+class InFlight:
+    """Thread-safe count of running requests, used as the depth of work without a queue"""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.count += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self.lock:
+            self.count -= 1
+
+    def __call__(self) -> int:
+        return self.count
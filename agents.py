@@ -1,24 +1,140 @@
-from typing import List, Dict, Optional, Set
+from typing import TYPE_CHECKING, List, Dict, Optional, Set
 from datetime import datetime
-from pydantic import BaseModel, Field
-from crewai import Agent, Task, Crew, Process, LLM
+import time
+from pydantic import BaseModel, Field, ValidationError
 import json
-from litellm import completion
 import os
-from dotenv import load_dotenv
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-from duckduckgo_search import DDGS
 import sqlite3
 from pathlib import Path
 from enum import Enum
 from ast import literal_eval
 
-os.environ['LITELLM_LOG'] = 'DEBUG'
-# Load environment variables
-load_dotenv()
-
-llm = LLM(model="groq/gemma2-9b-it")
+from admission import LEVEL_NAMES, LOCAL_ONLY, REDUCED, AdmissionController, InFlight
+from compaction import compact_transcript, prefix_cache_report
+from geocache import get_geocode_cache
+from gazetteer import get_gazetteer
+from geocoding import geocode_blocking
+from metrics import publish, registry, stage
+from taskgraph import TaskGraph
+from tracing import span
+from triage import local_analysis
+
+# crewai, litellm, geopy and duckduckgo_search each take hundreds of milliseconds to import, so they
+# are imported where they are first used; importing this module only costs pydantic
+if TYPE_CHECKING:
+    from crewai import Task
+
+AGENT_MODEL = "groq/gemma2-9b-it"
+llm = None
+
+
+def get_llm():
+    """Load the environment and create the crew's LLM on first use"""
+    global llm
+    if llm is None:
+        from crewai import LLM
+        from dotenv import load_dotenv
+        os.environ['LITELLM_LOG'] = 'DEBUG'
+        load_dotenv()
+        llm = LLM(model=AGENT_MODEL)
+    return llm
+
+# Task names in create_tasks order, with the agent that runs each
+TASK_AGENTS = {
+    "summarize": "summarizer",
+    "assess_urgency": "urgency_assessor",
+    "route_department": "department_router",
+    "extract_info": "info_extractor",
+    "analyze_location": "location_analyzer",
+    "find_news": "news_finder",
+    "check_spam": "spam_detector",
+    "final_report": "summarizer",
+}
+
+# Shared by every agent; the roles that used to tell the agents apart are the briefs below
+SHARED_ROLE = "Emergency Call Analyst"
+SHARED_GOAL = "Analyze emergency calls so dispatchers can respond quickly and correctly"
+SHARED_BACKSTORY = "Emergency dispatch specialist with experience in triage, routing, location analysis and fraud detection"
+# Each agent's role, placed in its task prompts after the transcript
+AGENT_BRIEFS = {
+    "summarizer": "As the call summarizer, an expert at extracting key information from emergency conversations:",
+    "urgency_assessor": "As the urgency assessor, an emergency response coordinator with triage experience:",
+    "department_router": "As the department router, an expert in emergency response coordination:",
+    "info_extractor": "As the information extraction specialist, skilled at identifying key emergency information:",
+    "location_analyzer": "As the location analyst, an expert in geographical information and location analysis:",
+    "news_finder": "As the local news analyst, a specialist in correlating local news with emergency incidents:",
+    "spam_detector": "As the spam detection specialist, an expert in detecting fraudulent emergency calls:",
+}
+
+
+def transcript_block(conversation_text: str) -> str:
+    """The opening of every analysis prompt; byte-identical across a call's requests so a provider can cache it"""
+    return f"Emergency call transcript:\n{conversation_text}\n\nEnd of transcript.\n\n"
+
+# The report reads every other task's output; the others only read the transcript, so they run side by side
+REPORT_TASK = "final_report"
+# Tasks sent to the model at once; lower it if the Groq key is rate limited
+CREW_TASK_CONCURRENCY = int(os.getenv("CREW_TASK_CONCURRENCY", "7"))
+
+# "crew" runs one task per agent; "single-shot" asks for the whole Output in one request
+CREW = "crew"
+SINGLE_SHOT = "single-shot"
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", CREW)
+# Rounds of follow-up requests for fields that failed validation or came back low-confidence
+SINGLE_SHOT_FOLLOWUPS = int(os.getenv("SINGLE_SHOT_FOLLOWUPS", "1"))
+SINGLE_SHOT_MIN_CONFIDENCE = float(os.getenv("SINGLE_SHOT_MIN_CONFIDENCE", "0.6"))
+
+# Output fields by the crew task that produces them; a follow-up re-asks a whole group so related fields agree
+FIELD_GROUPS = {
+    "summarize": ("summary", "key_points", "critical_info"),
+    "assess_urgency": ("level", "relative_score", "time_sensitivity", "justification", "immediate_actions"),
+    "route_department": ("primary_department", "secondary_departments", "confidence", "notes", "required_resources"),
+    "extract_info": ("name", "phone", "emergency_type", "key_details"),
+    "analyze_location": ("location", "landmarks", "area_type", "additional_context"),
+    "find_news": ("news", "news_timestamp", "relevance_scores"),
+    "check_spam": ("probability", "indicators", "spam_confidence"),
+}
+# Groups that are asked again when their confidence comes back below SINGLE_SHOT_MIN_CONFIDENCE
+CONFIDENCE_FIELDS = {"route_department": "confidence", "check_spam": "spam_confidence"}
+# Values for required fields of optional groups that are not asked again while crew runs are shed
+OPTIONAL_DEFAULTS = {"find_news": {"news": [], "relevance_scores": []}}
+
+# The system message and transcript come first and never change within a call, so follow-ups reuse the cached prefix
+SINGLE_SHOT_INSTRUCTIONS = """You analyze emergency calls for a dispatcher. Read the call transcript and answer with one JSON object that matches the JSON schema given after it, with no other text.
+- level is 1-5, where 5 is a life-threatening emergency needing immediate response; relative_score (0.0-1.0) must agree with it.
+- time_sensitivity is "low", "medium", "high" or "critical": how quickly the situation could get worse.
+- confidence is how sure you are of the department routing; spam_confidence how sure you are of the spam probability.
+- Callers at an emergency scene are often panicked and vague; that alone is not a spam indicator.
+- Use null for details the caller did not give."""
+
+ANALYSIS_TOKENS = registry.counter("echolink_analysis_tokens", "Tokens used by single-shot call analysis", ("kind",))
+# Crew runs are estimated from the prompt layout; single-shot requests use the provider's cached token count
+PROMPT_CACHE_TOKENS = registry.counter("echolink_prompt_cache_tokens", "Analysis prompt tokens by prefix cache state",
+                                       ("state", "source"))
+
+# Agents dropped first when crew runs back up; the report is still complete without them
+OPTIONAL_AGENTS = ("location_analyzer", "news_finder")
+# Crew runs in flight before optional agents are shed, and before calls get keyword triage only
+CREW_REDUCED_DEPTH = int(os.getenv("CREW_REDUCED_DEPTH", "2"))
+CREW_LOCAL_DEPTH = int(os.getenv("CREW_LOCAL_DEPTH", "4"))
+
+crew_runs = InFlight()
+crew_admission = AdmissionController(crew_runs, reduced_depth=CREW_REDUCED_DEPTH, local_depth=CREW_LOCAL_DEPTH)
+registry.gauge("echolink_crew_runs", "Crew runs in flight", function=crew_runs)
+registry.gauge("echolink_crew_admission_level", "Crew degradation level: 0 full, 1 reduced, 2 local-only",
+               function=lambda: crew_admission.current)
+registry.gauge("echolink_geocode_cache_hit_rate", "Share of geocode lookups answered by the cache",
+               function=lambda: get_geocode_cache().stats()["hit_rate"])
+
+
+
+def urgency_priority(level) -> str:
+    """Scheduler priority class for a crew urgency level (1-5)"""
+    try:
+        level = int(level)
+    except (TypeError, ValueError):
+        return "MEDIUM"
+    return "HIGH" if level >= 4 else "MEDIUM" if level == 3 else "LOW"
 
 
 # Core Data Models
@@ -148,91 +264,50 @@ class Output(BaseModel):
 
 
 class CoreCallAnalysisAgents:
-    def __init__(self):
+    def __init__(self, mode: str = ANALYSIS_MODE):
+        self.mode = mode
+        # The crew is also the fallback for single-shot answers that do not validate
         self.setup_agents()
-        self.geolocator = Nominatim(user_agent="emergency_call_system")
         
     def setup_agents(self):
+        from crewai import Agent
+        llm = get_llm()
+        # One persona for every agent, so every crew prompt opens with the same system message and
+        # transcript block; what each agent does is set out in its task, after the transcript
         self.agents = {
-            'summarizer': Agent(
-                role='Call Summarizer',
-                goal='Create concise summaries of emergency calls',
-                backstory='Expert at extracting key information from emergency conversations',
-                llm=llm,
-                verbose=True
-            ),
-            'urgency_assessor': Agent(
-                role='Urgency Level Assessor',
-                goal='Evaluate emergency priority and urgency level',
-                backstory='Emergency response coordinator with triage experience',
-                llm=llm,
-                verbose=True
-            ),
-            'department_router': Agent(
-                role='Department Router',
-                goal='Determine appropriate emergency response departments',
-                backstory='Expert in emergency response coordination',
-                llm=llm,
-                verbose=True
-            ),
-            'info_extractor': Agent(
-                role='Information Extraction Specialist',
-                goal='Extract critical details from emergency calls',
-                backstory='Specialist in identifying key emergency information',
-                llm=llm,
-                verbose=True
-            ),
-            'location_analyzer': Agent(
-                role='Location Analysis Specialist',
-                goal='Extract and validate location information',
-                backstory='Expert in geographical information and location analysis',
-                llm=llm,
-                verbose=True
-            ),
-            'news_finder': Agent(
-                role='Local News Analyzer',
-                goal='Find relevant local news and incidents',
-                backstory='Specialist in local news and emergency incident correlation',
-                llm=llm,
-                verbose=True
-            ),
-            'spam_detector': Agent(
-                role='Spam Detection Specialist',
-                goal='Identify potential spam or false emergency calls',
-                backstory='Expert in detecting fraudulent emergency calls',
+            name: Agent(
+                role=SHARED_ROLE,
+                goal=SHARED_GOAL,
+                backstory=SHARED_BACKSTORY,
                 llm=llm,
                 verbose=True
             )
+            for name in AGENT_BRIEFS
         }
 
-    def create_tasks(self, conversation_text: str) -> List[Task]:
-        return [
-            Task(
-                description=f"""Create a concise summary of this emergency call:
-                {conversation_text}
+    def create_tasks(self, conversation_text: str, skip: tuple = ()) -> List['Task']:
+        from crewai import Task
+        # Identical in every task description and always first, so the transcript is a shared prompt prefix
+        transcript = transcript_block(conversation_text)
+        instructions = {
+            "summarize": """Create a concise summary of this emergency call.
                 
                 Provide output in the following JSON format:
-                {{
+                {
                     "summary": "Brief summary of the call",
                     "key_points": ["key point 1", "key point 2"],
                     "critical_info": "Any critical information"
-                }}""",
-                agent=self.agents['summarizer'],
-                expected_output="JSON containing summary, key points, and critical information",
-                task_name="summarize"
-            ),
-            Task(
-                description=f"""Assess the urgency level of this emergency:
-                {conversation_text}
+                }""",
+            "assess_urgency": """Assess the urgency level of this emergency.
                 
                 Provide output in the following JSON format:
-                {{
+                {
                     "level": 3,  # Integer from 1-5, where 5 is most urgent
                     "relative_score": 0.75,  # Float from 0.0-1.0 indicating relative urgency compared to other emergencies
                     "time_sensitivity": "high",  # String: "low", "medium", "high", or "critical"
                     "justification": "Explanation of urgency level and why this emergency has this relative priority",
                     "immediate_actions": ["action 1", "action 2"]
-                }}""" + """
+                }
                 
                 Guidelines for urgency assessment:
                 - Level 1 (relative_score 0.0-0.2): Non-emergency situations, general inquiries, minor concerns
@@ -247,44 +322,26 @@ class CoreCallAnalysisAgents:
                 - "high": Situation likely to worsen within an hour if not addressed
                 - "critical": Immediate response needed to prevent loss of life/severe consequences
                 """,
-                agent=self.agents['urgency_assessor'],
-                expected_output="JSON containing urgency level, relative score, time sensitivity, justification, and immediate actions",
-                task_name="assess_urgency"
-            ),
-            Task(
-                description=f"""Determine appropriate emergency departments:
-                {conversation_text}
+            "route_department": """Determine appropriate emergency departments.
                 
                 Provide output in the following JSON format:
-                {{
+                {
                     "primary_department": "POLICE",
                     "secondary_departments": ["MEDICAL", "FIRE"],
                     "confidence": 0.95,
                     "notes": "Dispatch notes",
                     "required_resources": ["resource1", "resource2"]
-                }}""",
-                agent=self.agents['department_router'],
-                expected_output="JSON containing department routing information and required resources",
-                task_name="route_department"
-            ),
-            Task(
-                description=f"""Extract critical information from this call:
-                {conversation_text}
+                }""",
+            "extract_info": """Extract critical information from this call.
                 
                 Provide output in the following JSON format:
-                {{
+                {
                     "name": "Caller's name if available",
                     "phone": "Phone number if available",
                     "emergency_type": "Type of emergency",
                     "key_details": ["detail 1", "detail 2"]
-                }}""",
-                agent=self.agents['info_extractor'],
-                expected_output="JSON containing extracted caller and emergency information",
-                task_name="extract_info"
-            ),
-            Task(
-                description=f"""Extract and validate detailed location information from this emergency call:
-                {conversation_text}
+                }""",
+            "analyze_location": """Extract and validate detailed location information from this emergency call.
                 
                 Focus on extracting the following:
                 1. Specific address or location mentioned by the caller
@@ -294,7 +351,7 @@ class CoreCallAnalysisAgents:
                 5. Building types, floor numbers, or apartment identifiers
                 
                 Provide output in the following JSON format:
-                {{
+                {
                     "location": "Full location description as mentioned by caller",
                     "extracted_locations": ["Chennai", "Park Street", "Near Central Hospital"],
                     "primary_location": "Most specific location identified",
@@ -302,48 +359,30 @@ class CoreCallAnalysisAgents:
                     "area_type": "residential/commercial/industrial/rural/etc",
                     "confidence": 0.85,
                     "additional_context": "Any additional location context or notes about the location"
-                }}""",
-                agent=self.agents['location_analyzer'],
-                expected_output="JSON containing detailed location extraction, confidence score, and context",
-                task_name="analyze_location"
-            ),
-            Task(
-                description=f"""Find relevant local news and incidents in the area related to this emergency:
-                {conversation_text}
+                }""",
+            "find_news": """Find relevant local news and incidents in the area related to this emergency.
                 
                 Focus on extracting the location and emergency type first, then search for recent news (last 24 hours if possible).
                 
                 Provide output in the following JSON format:
-                {{
+                {
                     "news": [
-                        {{"title": "News title", "link": "URL", "published": "publication date if available"}},
-                        {{"title": "News title", "link": "URL", "published": "publication date if available"}}
+                        {"title": "News title", "link": "URL", "published": "publication date if available"},
+                        {"title": "News title", "link": "URL", "published": "publication date if available"}
                     ],
                     "relevance_scores": [0.9, 0.8],
                     "timestamp": "Time when the search was performed"
-                }}""",
-                agent=self.agents['news_finder'],
-                expected_output="JSON containing relevant recent news articles with timestamps and relevance scores",
-                task_name="find_news"
-            ),
-            Task(
-                description=f"""Analyze this call for potential spam indicators in which it could be a spam call to the dispatcher.
-                keep in mind that a person is calling at a scene of emergency. so the data might be vague because the person is in panic:
-                {conversation_text}
+                }""",
+            "check_spam": """Analyze this call for potential spam indicators in which it could be a spam call to the dispatcher.
+                keep in mind that a person is calling at a scene of emergency. so the data might be vague because the person is in panic.
                 
                 Provide output in the following JSON format:
-                {{
+                {
                     "probability": 0.1,
                     "indicators": ["indicator1", "indicator2"],
                     "spam_confidence": 0.95
-                }}""",
-                agent=self.agents['spam_detector'],
-                expected_output="JSON containing spam analysis results and spam confidence score",
-                task_name="check_spam"
-            ),
-            Task(
-                description=f"""Create a final comprehensive report of all findings:
-                {conversation_text}
+                }""",
+            "final_report": """Create a final comprehensive report of all findings.
                 
                 Review the outputs of all previous tasks and create a final summary report that includes:
                 - Name of the caller :
@@ -357,8 +396,16 @@ class CoreCallAnalysisAgents:
                 
                 For any None value or missing information, provide an empty string.
                """,
-                agent=self.agents['summarizer'],  # Using the summarizer agent for the final report
-                expected_output="""
+        }
+        expected_outputs = {
+            "summarize": "JSON containing summary, key points, and critical information",
+            "assess_urgency": "JSON containing urgency level, relative score, time sensitivity, justification, and immediate actions",
+            "route_department": "JSON containing department routing information and required resources",
+            "extract_info": "JSON containing extracted caller and emergency information",
+            "analyze_location": "JSON containing detailed location extraction, confidence score, and context",
+            "find_news": "JSON containing relevant recent news articles with timestamps and relevance scores",
+            "check_spam": "JSON containing spam analysis results and spam confidence score",
+            "final_report": """
                     JSON containing a comprehensive report with the following fields:
                     {
                         "name": "Caller's name if available",
@@ -389,10 +436,35 @@ class CoreCallAnalysisAgents:
                         "indicators": ["indicator1", "indicator2"],
                         "spam_confidence": 0.95
                 """,
-                task_name="final_report"
-            ),
+        }
+        return [
+            Task(
+                description=transcript + AGENT_BRIEFS[agent] + "\n" + instructions[name],
+                agent=self.agents[agent],
+                expected_output=expected_outputs[name],
+                task_name=name
+            )
+            for name, agent in TASK_AGENTS.items()
+            if agent not in skip
         ]
 
+    def build_task_graph(self, tasks: List['Task'], names: List[str]) -> TaskGraph:
+        """Fan the independent tasks out and their outputs into the final report"""
+        graph = TaskGraph()
+        for name, task in zip(names, tasks):
+            if name != REPORT_TASK:
+                graph.add(name, lambda upstream, name=name, task=task: self.run_task(name, task, upstream))
+        graph.add(REPORT_TASK, lambda upstream, task=tasks[names.index(REPORT_TASK)]: self.run_task(REPORT_TASK, task, upstream),
+                  after=[name for name in names if name != REPORT_TASK])
+        return graph
+
+    def run_task(self, name: str, task: 'Task', upstream: Dict):
+        """Run one task on its own agent, with the outputs it depends on as context"""
+        # Joined the way a sequential crew passes earlier outputs on to the next task
+        context = "\n\n----------\n\n".join(output.raw for output in upstream.values() if output.raw) or None
+        with stage(name, agent=TASK_AGENTS.get(name)):
+            return task.execute_sync(agent=task.agent, context=context)
+
     def enhance_location_data(self, results_dict: Dict, conversation_text: str, simulator_data: Optional[Dict] = None):
         """Enhance location data using multiple sources"""
         try:
@@ -406,7 +478,8 @@ class CoreCallAnalysisAgents:
                 }
             
             # Extract additional location details directly from text
-            extracted_location = self.extract_location_details(conversation_text)
+            # Urgent calls get their geocode ahead of routine ones when Nominatim's rate limit is the bottleneck
+            extracted_location = self.extract_location_details(conversation_text, urgency_priority(results_dict.get("level")))
             
             # Get location from simulator data if available
             simulator_location = None
@@ -460,37 +533,71 @@ class CoreCallAnalysisAgents:
 
     def analyze_conversation(self, conversation_file: str, simulator_data: Optional[Dict] = None):
         """Analyze conversation with optional simulator data for enhanced location extraction"""
+        # The file is named after the call uid, so the crew's spans join that call's trace
+        with stage("crew_analysis", uid=os.path.basename(conversation_file)):
+            analysis = self._analyze_conversation(conversation_file, simulator_data)
+        publish("agents")
+        return analysis
+
+    def _analyze_conversation(self, conversation_file: str, simulator_data: Optional[Dict] = None):
         try:
             conversation_text = self.read_conversation(conversation_file)
             
+            # Shed optional agents, or the whole crew, while too many runs are already in flight
+            level = crew_admission.admit()
+            if level >= LOCAL_ONLY:
+                print(f"Crew runs are {LEVEL_NAMES[level]}, answering with keyword triage")
+                return self.create_local_response(conversation_text)
+            skip = OPTIONAL_AGENTS if level >= REDUCED else ()
+            
+            # Every task pastes the transcript, so strip tags and filler and fit it to the model's budget once
+            prompt_text, report = compact_transcript(conversation_text, AGENT_MODEL)
+            
+            if self.mode == SINGLE_SHOT:
+                with crew_runs:
+                    results_dict = self.analyze_single_shot(prompt_text, skip)
+                if results_dict is not None:
+                    self.enhance_location_data(results_dict, conversation_text, simulator_data)
+                    results_dict["degradation"] = LEVEL_NAMES[level]
+                    return results_dict
+                print("Single-shot analysis did not validate, running the full crew")
+            
             # Create tasks separately so we can reference them
-            tasks = self.create_tasks(conversation_text)
+            tasks = self.create_tasks(prompt_text, skip)
+            print(f"Transcript compaction: {report['original_tokens']} -> {report['compacted_tokens']} tokens per task, "
+                  f"saved {report['saved_tokens'] * len(tasks)} prompt tokens across {len(tasks)} tasks")
+            prompt_cache = prefix_cache_report([task.description for task in tasks])
+            PROMPT_CACHE_TOKENS.inc(prompt_cache["cached_tokens"], state="cached", source="estimate")
+            PROMPT_CACHE_TOKENS.inc(prompt_cache["uncached_tokens"], state="uncached", source="estimate")
+            print(f"Prompt cache: {prompt_cache['cached_tokens']} of {prompt_cache['prompt_tokens']} task prompt tokens "
+                  f"can be served from a {prompt_cache['shared_prefix_tokens']} token shared prefix")
             
-            crew = Crew(
-                agents=list(self.agents.values()),
-                tasks=tasks,
-                process=Process.sequential,
-                verbose=True
-            )
+            graph = self.build_task_graph(tasks, [name for name, agent in TASK_AGENTS.items() if agent not in skip])
             
             # Add defensive error handling
             try:
-                results = crew.kickoff()
+                with crew_runs, stage("crew_kickoff"):
+                    outputs, errors = graph.run(CREW_TASK_CONCURRENCY)
+                for name, error in errors.items():
+                    print(f"Crew task {name} failed: {error}")
+                results = outputs.get(REPORT_TASK)
                 # Make sure we have a valid response before parsing
                 if not results or not hasattr(results, 'raw') or not results.raw:
-                    print(f"Warning: Empty or invalid results from crew.kickoff()")
+                    print(f"Warning: Empty or invalid results from the {REPORT_TASK} task")
                     # Provide fallback response structure
                     return self.create_fallback_response(conversation_text)
                     
                 results_dict = json.loads(results.raw)
             except json.JSONDecodeError as e:
                 print(f"Error decoding JSON from agent response: {e}")
-                print(f"Problematic response: {results if 'results' in locals() else 'No results'}")
+                print(f"Problematic response: {results.raw if results else 'No results'}")
                 # Return a minimal valid response
                 return self.create_fallback_response(conversation_text)
             
             # Post-process results to enhance location data
             self.enhance_location_data(results_dict, conversation_text, simulator_data)
+            results_dict["degradation"] = LEVEL_NAMES[level]
+            results_dict["prompt_cache"] = prompt_cache
             
             return results_dict
                 
@@ -506,6 +613,142 @@ class CoreCallAnalysisAgents:
             # No need to raise exception, we'll return fallback response instead
             return self.create_fallback_response(conversation_text)
             
+    def analyze_single_shot(self, conversation_text: str, skip: tuple = ()) -> Optional[Dict]:
+        """Ask for every Output field in one request, then follow up only on the groups that need it.
+
+        Returns None if the answer still does not validate, or a group is still low-confidence after
+        SINGLE_SHOT_FOLLOWUPS rounds, so the caller can fall back to the crew.
+        """
+        usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        data = self.request_fields(conversation_text, list(Output.model_fields), usage)
+        if data is None:
+            return None
+
+        for attempt in range(SINGLE_SHOT_FOLLOWUPS + 1):
+            invalid, low_confidence = self.field_issues(data)
+            retry = {}
+            for group, problem in {**low_confidence, **invalid}.items():
+                if TASK_AGENTS[group] in skip:
+                    # Not worth another request while crew runs are shed; fall back to the field defaults
+                    if group in invalid:
+                        for field in FIELD_GROUPS[group]:
+                            data.pop(field, None)
+                        data.update(OPTIONAL_DEFAULTS.get(group, {}))
+                else:
+                    retry[group] = problem
+            if not retry or attempt == SINGLE_SHOT_FOLLOWUPS:
+                break
+            fields = [field for group in retry for field in FIELD_GROUPS[group]]
+            answer = self.request_fields(conversation_text, fields, usage, data, list(retry.values()))
+            if answer is None:
+                continue
+            for group in retry:
+                confidence = CONFIDENCE_FIELDS.get(group)
+                if group not in invalid and not self.more_confident(answer.get(confidence), data.get(confidence)):
+                    continue
+                data.update({field: answer[field] for field in FIELD_GROUPS[group] if field in answer})
+
+        if retry:
+            # Still invalid or low-confidence after every follow-up; the crew's dedicated agents get a go instead
+            print(f"Single-shot answer still has problems after {usage['requests']} requests: "
+                  f"{'; '.join(retry.values())}")
+            return None
+        try:
+            output = Output.model_validate(data)
+        except ValidationError as e:
+            print(f"Single-shot answer failed validation after {usage['requests']} requests: {e}")
+            return None
+        print(f"Single-shot analysis: {usage['requests']} requests, "
+              f"{usage['prompt_tokens']} prompt ({usage['cached_tokens']} cached) + {usage['completion_tokens']} completion tokens")
+
+        results_dict = output.model_dump(mode="json")
+        # Department names as the crew reports them
+        results_dict["primary_department"] = output.primary_department.name
+        results_dict["secondary_departments"] = [department.name for department in output.secondary_departments]
+        results_dict["analysis_mode"] = SINGLE_SHOT
+        results_dict["analysis_usage"] = usage
+        return results_dict
+
+    def request_fields(self, conversation_text: str, fields: List[str], usage: Dict,
+                       current: Optional[Dict] = None, problems: Optional[List[str]] = None) -> Optional[Dict]:
+        """One JSON-mode request for the given Output fields; with current, a follow-up that fixes problems"""
+        from litellm import completion
+
+        schema = Output.model_json_schema()
+        wanted = {
+            "type": "object",
+            "properties": {field: schema["properties"][field] for field in fields},
+            "required": fields,
+            "$defs": schema.get("$defs", {}),
+        }
+        request = f"Schema: {json.dumps(wanted, separators=(',', ':'))}"
+        if current is not None:
+            previous = {field: current.get(field) for field in fields}
+            request += (f"\nA first pass answered {json.dumps(previous, default=str)}. "
+                        f"Problems: {'; '.join(problems or [])}. Answer again with only these fields.")
+        messages = [
+            {"role": "system", "content": SINGLE_SHOT_INSTRUCTIONS},
+            {"role": "user", "content": transcript_block(conversation_text) + request},
+        ]
+
+        try:
+            with stage("single_shot" if current is None else "single_shot_followup", fields=len(fields)):
+                response = completion(model=AGENT_MODEL, messages=messages, temperature=0,
+                                      response_format={"type": "json_object"})
+        except Exception as e:
+            print(f"Single-shot request failed: {e}")
+            return None
+
+        usage["requests"] += 1
+        if getattr(response, "usage", None):
+            for kind in ("prompt_tokens", "completion_tokens"):
+                tokens = getattr(response.usage, kind, 0) or 0
+                usage[kind] += tokens
+                ANALYSIS_TOKENS.inc(tokens, kind=kind)
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+            usage["cached_tokens"] += cached
+            PROMPT_CACHE_TOKENS.inc(cached, state="cached", source="provider")
+            PROMPT_CACHE_TOKENS.inc((getattr(response.usage, "prompt_tokens", 0) or 0) - cached,
+                                    state="uncached", source="provider")
+        try:
+            answer = json.loads(response.choices[0].message.content)
+        except (ValueError, TypeError, AttributeError, IndexError) as e:
+            print(f"Single-shot response was not JSON: {e}")
+            return None
+        if not isinstance(answer, dict):
+            return None
+        # The crew prompts use upper case department names; the enum values are lower case
+        for field in ("primary_department", "secondary_departments"):
+            if isinstance(answer.get(field), str):
+                answer[field] = answer[field].lower()
+            elif isinstance(answer.get(field), list):
+                answer[field] = [item.lower() if isinstance(item, str) else item for item in answer[field]]
+        return answer
+
+    def field_issues(self, data: Dict):
+        """Return ({group: problem} for groups that fail validation, {group: problem} for low-confidence groups)"""
+        invalid = {}
+        try:
+            Output.model_validate(data)
+        except ValidationError as e:
+            for error in e.errors():
+                field = error["loc"][0] if error["loc"] else None
+                group = next((group for group, fields in FIELD_GROUPS.items() if field in fields), None)
+                if group is not None:
+                    problem = f"{field}: {error['msg']}"
+                    invalid[group] = f"{invalid[group]}, {problem}" if group in invalid else problem
+        low_confidence = {}
+        for group, field in CONFIDENCE_FIELDS.items():
+            value = data.get(field)
+            if group not in invalid and isinstance(value, (int, float)) and value < SINGLE_SHOT_MIN_CONFIDENCE:
+                low_confidence[group] = f"{field} is only {value}; look again at the transcript"
+        return invalid, low_confidence
+
+    @staticmethod
+    def more_confident(new, old) -> bool:
+        return isinstance(new, (int, float)) and (not isinstance(old, (int, float)) or new > old)
+
     def create_fallback_response(self, conversation_text: str) -> Dict:
         """Create a fallback response with minimal valid structure when analysis fails"""
         print("Creating fallback response for failed analysis")
@@ -545,11 +788,31 @@ class CoreCallAnalysisAgents:
             "summary": "Analysis failed - emergency details could not be extracted."
         }
 
+    def create_local_response(self, conversation_text: str) -> Dict:
+        """Keyword triage in the shape of the crew report, without any LLM or network calls"""
+        local = local_analysis(conversation_text)
+        urgency = {"HIGH": (5, 0.9, "critical"), "MEDIUM": (3, 0.5, "medium"), "LOW": (1, 0.1, "low")}
+        level, relative_score, time_sensitivity = urgency[local["criticality"]]
+        department = local["department"].split(", ")[0].upper()
+        return {
+            "name": local["user"],
+            "location": local["location"],
+            "location_confidence": 0.3,
+            "location_source": "keyword_triage",
+            "emergency_type": local["department"],
+            "level": level,
+            "relative_score": relative_score,
+            "time_sensitivity": time_sensitivity,
+            "primary_department": department if department in Department.__members__ else "DISASTER_RESPONSE",
+            "summary": local["summary"],
+            "degradation": LEVEL_NAMES[LOCAL_ONLY],
+        }
+
     def read_conversation(self, filename: str) -> str:
         with open(filename, 'r') as file:
             return file.read()
             
-    def extract_location_details(self, text: str) -> Dict:
+    def extract_location_details(self, text: str, priority: str = "MEDIUM") -> Dict:
         """Extract location information from conversation text using pattern matching."""
         import re
         
@@ -587,8 +850,8 @@ class CoreCallAnalysisAgents:
             result["primary_location"] = sorted_locations[0]
             result["confidence"] = 0.7
             
-            # Attempt to geocode
-            location_info = self.geocode_location(sorted_locations[0])
+            # Attempt to geocode, offline first so dispatch keeps working when Nominatim is down or rate limited
+            location_info = self.offline_geocode(sorted_locations[0]) or self.geocode_location(sorted_locations[0], priority)
             if location_info:
                 result.update(location_info)
                 result["confidence"] = 0.9
@@ -610,23 +873,51 @@ class CoreCallAnalysisAgents:
         
         return None
     
-    def geocode_location(self, location_string: str) -> Optional[Dict]:
+    def geocode(self, location_string: str, priority: str = "MEDIUM") -> Optional[Dict]:
+        """Address and coordinates for a location string, from the shared cache or Nominatim.
+
+        Returns None if the location does not resolve. Geocoder errors, and waits longer
+        than GEOCODE_WAIT_TIMEOUT, are raised and not cached.
+        """
+        # The shared service keeps to Nominatim's rate limit and merges lookups other calls are already making
+        with span("geocode", priority=priority):
+            return geocode_blocking(location_string, priority)
+
+    def offline_geocode(self, location_string: str) -> Optional[Dict]:
+        """Geocode from the local gazetteer index, or None if there is no index or no good match"""
+        index = get_gazetteer()
+        if index is None:
+            return None
+        with stage("gazetteer"):
+            location = index.geocode(location_string)
+        if not location:
+            return None
+        print(f"Resolved from gazetteer: {location_string} -> {location['address']} (score {location['score']})")
+        return {
+            "address": location["address"],
+            "latitude": location["latitude"],
+            "longitude": location["longitude"],
+            "area_type": self.estimate_area_type(f"{location['address']} {location['kind']}"),
+            "source": "gazetteer"
+        }
+
+    def geocode_location(self, location_string: str, priority: str = "MEDIUM") -> Optional[Dict]:
         """Geocode a location string to obtain coordinates"""
+        from geopy.exc import GeocoderTimedOut
         try:
-            geolocator = Nominatim(user_agent="emergency_call_processor")
-            location = geolocator.geocode(location_string)
+            location = self.geocode(location_string, priority)
             
             if location:
                 print(f"Successfully geocoded: {location_string}")
                 return {
-                    "address": location.address,
-                    "latitude": location.latitude,
-                    "longitude": location.longitude,
-                    "area_type": self.estimate_area_type(location.address),
+                    **location,
+                    "area_type": self.estimate_area_type(location["address"]),
                     "source": "geocoded"
                 }
         except GeocoderTimedOut:
             print(f"Geocoding service timed out for: {location_string}")
+        except TimeoutError:
+            print(f"Gave up waiting for a geocoding slot for: {location_string}")
         except Exception as e:
             print(f"Error in geocoding: {str(e)}")
             
@@ -652,16 +943,17 @@ class CoreCallAnalysisAgents:
         return "unknown"
 
     def get_location_info(self, location_str: str) -> LocationInfo:
+        from geopy.exc import GeocoderTimedOut
         try:
-            location = self.geolocator.geocode(location_str)
+            location = self.geocode(location_str)
             if location:
                 return LocationInfo(
-                    address=location.address,
-                    latitude=location.latitude,
-                    longitude=location.longitude,
-                    area_context=self.get_area_context(location.latitude, location.longitude)
+                    address=location["address"],
+                    latitude=location["latitude"],
+                    longitude=location["longitude"],
+                    area_context=self.get_area_context(location["latitude"], location["longitude"])
                 )
-        except GeocoderTimedOut:
+        except (GeocoderTimedOut, TimeoutError):
             print("Geocoding service timed out")
         return LocationInfo()
 
@@ -681,11 +973,12 @@ class CoreCallAnalysisAgents:
         Returns:
             List of news article dictionaries with title, link, and publication date
         """
+        from duckduckgo_search import DDGS
         search_query = f"{emergency_type} {location} news"
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         try:
-            with DDGS() as ddgs:
+            with DDGS() as ddgs, stage("news_search"):
                 # Set time_period to filter by recency
                 results = list(ddgs.news(search_query, max_results=5, time_period=time_period))
                 
@@ -0,0 +1,84 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Cold import budgets in milliseconds, measured with `python -X importtime`. The UI budget covers what runs
+# before the login window appears; the voice budget covers what runs before the control channel listens.
+STARTUP_BUDGETS = {
+    "userinterface": float(os.getenv("UI_IMPORT_BUDGET_MS", "350")),
+    "main": float(os.getenv("VOICE_IMPORT_BUDGET_MS", "700")),
+}
+
+# Heavy modules each entry point must only import on first use, never at startup
+DEFERRED_MODULES = {
+    "userinterface": ("PyQt5.QtWebEngineWidgets", "PyQt5.QtChart", "groq", "hume", "crewai", "litellm"),
+    "main": ("groq", "httpx", "crewai", "litellm", "geopy", "duckduckgo_search", "PyQt5"),
+}
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str) -> List[Tuple[str, int, int, int]]:
+    """Import module in a fresh interpreter and return (name, self us, cumulative us, depth) per import"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            imports.append((name, int(own), int(cumulative), (len(indent) - 1) // 2))
+    return imports
+
+
+def report(module: str, budget_ms: float, top: int) -> bool:
+    imports = measure(module)
+    by_name: Dict[str, Tuple[int, int, int]] = {name: (own, cumulative, depth) for name, own, cumulative, depth in imports}
+    total_ms = by_name[module][1] / 1000 if module in by_name else sum(own for _, own, _, _ in imports) / 1000
+
+    print(f"{module}: {total_ms:.1f} ms cold import (budget {budget_ms:.0f} ms), {len(imports)} modules")
+    # Direct dependencies of the entry point, by cumulative time. importtime prints children before their
+    # parent, so they are the depth 1 lines between the previous top-level import and the entry point.
+    direct = []
+    names = [name for name, _, _, _ in imports]
+    if module in names:
+        for item in reversed(imports[:names.index(module)]):
+            if item[3] == 0:
+                break
+            if item[3] == 1:
+                direct.append(item)
+    direct.sort(key=lambda item: item[2], reverse=True)
+    for name, own, cumulative, _ in direct[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    ok = total_ms <= budget_ms
+    if not ok:
+        print(f"  over budget by {total_ms - budget_ms:.1f} ms")
+    eager = [name for name in DEFERRED_MODULES.get(module, ())
+             if any(imported == name or imported.startswith(name + ".") for imported in by_name)]
+    if eager:
+        ok = False
+        print(f"  imported at startup but should be deferred: {', '.join(eager)}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check cold start import time of the UI and voice process")
+    parser.add_argument("modules", nargs="*", default=list(STARTUP_BUDGETS),
+                        help="Entry point modules to measure (default: userinterface main)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest direct imports to list per module")
+    args = parser.parse_args()
+
+    passed = True
+    for module in args.modules:
+        try:
+            passed = report(module, STARTUP_BUDGETS.get(module, float("inf")), args.top) and passed
+        except RuntimeError as e:
+            print(e)
+            passed = False
+    sys.exit(0 if passed else 1)
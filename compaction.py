@@ -0,0 +1,142 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Transcript tokens allowed per model, leaving room for the system prompt and the response
+MODEL_TOKEN_BUDGETS = {
+    "llama3-8b-8192": 6000,
+    "groq/gemma2-9b-it": 6000,
+}
+DEFAULT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "4000"))
+
+# Rough tokens-per-character ratio for English text; close enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Providers only cache a prompt prefix once it is at least this long (1024 tokens for OpenAI-style caching)
+PREFIX_CACHE_MIN_TOKENS = int(os.getenv("PREFIX_CACHE_MIN_TOKENS", "1024"))
+
+_TIMESTAMP = re.compile(r"^\[\d{2}:\d{2}:\d{2}\]\s*")
+_TAG = re.compile(r"<[A-Z_]+>")
+_SPEAKER = re.compile(r"^(You|EVI):\s*")
+_WHITESPACE = re.compile(r"\s+")
+# The same word three or more times in a row ("help help help help") is kept twice
+_REPEATED_WORD = re.compile(r"\b(\w+)(?:[\s,.!?]+\1\b){2,}", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    return _tokens_for_chars(len(text))
+
+
+def _tokens_for_chars(chars: int) -> int:
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def token_budget(model: Optional[str] = None) -> int:
+    return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+
+def _parse(text: str) -> List[Tuple[str, str]]:
+    """Split a transcript into (speaker, utterance) pairs with tags, timestamps and repeats removed"""
+    utterances = []
+    for line in text.splitlines():
+        line = _TAG.sub(" ", _TIMESTAMP.sub("", line.strip()))
+        match = _SPEAKER.match(line)
+        speaker = match.group(1) if match else ""
+        line = _WHITESPACE.sub(" ", line[match.end():] if match else line).strip()
+        line = _REPEATED_WORD.sub(lambda m: f"{m.group(1)} {m.group(1)}", line)
+        if not line:
+            continue
+        # Collapse consecutive repeats of the same utterance by the same speaker
+        if utterances and utterances[-1][0] == speaker and utterances[-1][1].lower() == line.lower():
+            continue
+        utterances.append((speaker, line))
+    return utterances
+
+
+def _render(utterances: List) -> str:
+    """Join utterances back into lines; dropped caller speech (None) leaves a marker, dropped operator lines (False) do not"""
+    lines = []
+    omitted = 0
+    for utterance in utterances:
+        if utterance is False:
+            continue
+        if utterance is None:
+            omitted += 1
+            continue
+        if omitted:
+            lines.append(f"[... {omitted} utterances omitted ...]")
+            omitted = 0
+        speaker, line = utterance
+        lines.append(f"{speaker}: {line}" if speaker else line)
+    if omitted:
+        lines.append(f"[... {omitted} utterances omitted ...]")
+    return "\n".join(lines)
+
+
+def compact_transcript(text: str, model: Optional[str] = None, budget: Optional[int] = None) -> Tuple[str, Dict]:
+    """Return (compacted transcript, report) fitted to the model's token budget.
+
+    Tags, timestamps and repeated filler are stripped first. If the transcript is
+    still over budget, operator (EVI) utterances are dropped longest first, then
+    caller utterances from the middle of the call, keeping its start and end.
+    """
+    budget = budget or token_budget(model)
+    original_tokens = estimate_tokens(text)
+    utterances: List = list(_parse(text))
+    compacted = _render(utterances)
+
+    if estimate_tokens(compacted) > budget:
+        # Drop operator boilerplate before any caller speech
+        operator = sorted((i for i, u in enumerate(utterances) if u[0] == "EVI"),
+                          key=lambda i: len(utterances[i][1]), reverse=True)
+        # Then caller speech from the middle outwards; the opening and the latest lines matter most
+        middle = (len(utterances) - 1) / 2
+        caller = sorted((i for i, u in enumerate(utterances) if u[0] != "EVI"),
+                        key=lambda i: abs(i - middle))
+        # Track characters rather than tokens so per-line rounding does not accumulate
+        chars = len(compacted)
+        marker_reserved = False
+        for index in operator + caller:
+            speaker, line = utterances[index]
+            if speaker != "EVI" and not marker_reserved:
+                # Leave room for the omission marker once caller speech starts being dropped
+                chars += len("[... 9999 utterances omitted ...]\n")
+                marker_reserved = True
+            if _tokens_for_chars(chars) <= budget:
+                break
+            chars -= len(speaker) + len(line) + 3
+            utterances[index] = False if speaker == "EVI" else None
+        compacted = _render(utterances)
+
+    compacted_tokens = estimate_tokens(compacted)
+    report = {
+        "model": model,
+        "budget": budget,
+        "original_tokens": original_tokens,
+        "compacted_tokens": compacted_tokens,
+        "saved_tokens": max(0, original_tokens - compacted_tokens),
+        "omitted_utterances": sum(1 for utterance in utterances if not utterance),
+    }
+    return compacted, report
+
+
+def prefix_cache_report(prompts: List[str], min_tokens: int = PREFIX_CACHE_MIN_TOKENS) -> Dict:
+    """Estimate how many prompt tokens a provider's prefix cache can serve across prompts sent in this order.
+
+    A prompt's longest common prefix with any earlier prompt counts as cached if it reaches
+    min_tokens; the rest of the prompt is uncached. Requests sent at the same moment can still
+    miss a cold cache, so this is the most caching the layout allows rather than what was billed.
+    """
+    prompt_tokens = cached_tokens = 0
+    for index, prompt in enumerate(prompts):
+        prompt_tokens += estimate_tokens(prompt)
+        shared = max((len(os.path.commonprefix([prompt, earlier])) for earlier in prompts[:index]), default=0)
+        if shared // CHARS_PER_TOKEN >= min_tokens:
+            cached_tokens += shared // CHARS_PER_TOKEN
+    return {
+        "prompts": len(prompts),
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "uncached_tokens": prompt_tokens - cached_tokens,
+        "shared_prefix_tokens": len(os.path.commonprefix(prompts)) // CHARS_PER_TOKEN if prompts else 0,
+    }
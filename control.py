@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+import socket
+
+# Path of the Unix domain socket the voice process listens on
+CONTROL_SOCKET = os.getenv("CONTROL_SOCKET", "echolink.sock")
+
+
+class ControlServer:
+    """Newline-delimited JSON command server running on the voice process's event loop.
+
+    Each request is a JSON object with a "command" field, e.g. {"command": "end"}.
+    Each reply is a JSON object with an "ok" field plus whatever the handler returns.
+    The server only wakes up when a client writes, so an idle call costs no CPU.
+    """
+
+    def __init__(self, path: str = CONTROL_SOCKET):
+        self.path = path
+        self.handlers = {}
+        self.server = None
+
+    def register(self, command: str, handler) -> None:
+        """Register a handler (sync or async) that takes the request dict and returns a dict"""
+        self.handlers[command] = handler
+
+    async def start(self) -> None:
+        # A stale socket file from a crashed process would make bind() fail
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = await asyncio.start_unix_server(self._handle_client, path=self.path)
+        print(f"Control channel listening on {self.path}")
+
+    async def close(self) -> None:
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._dispatch(line)
+                writer.write(json.dumps(response, default=str).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            return {"ok": False, "error": "Invalid JSON request"}
+
+        command = request.get("command") if isinstance(request, dict) else None
+        handler = self.handlers.get(command)
+        if handler is None:
+            return {"ok": False, "error": f"Unknown command: {command}"}
+
+        try:
+            result = handler(request)
+            if asyncio.iscoroutine(result):
+                result = await result
+        except Exception as e:
+            print(f"Error handling control command {command}: {e}")
+            return {"ok": False, "error": str(e)}
+
+        response = {"ok": True}
+        response.update(result or {})
+        return response
+
+
+def send_command(command: str, path: str = CONTROL_SOCKET, timeout: float = 2.0, **fields) -> dict:
+    """Send a single command to the voice process and return its reply (blocking)"""
+    request = dict(fields)
+    request["command"] = command
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(json.dumps(request).encode() + b"\n")
+        buffer = b""
+        while not buffer.endswith(b"\n"):
+            chunk = s.recv(4096)
+            if not chunk:
+                break
+            buffer += chunk
+    if not buffer:
+        raise ConnectionError(f"No reply from control channel for command: {command}")
+    return json.loads(buffer)
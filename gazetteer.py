@@ -0,0 +1,293 @@
+import argparse
+import csv
+import math
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from geocache import normalize_location
+
+# Prebuilt index, made from a gazetteer CSV with `python gazetteer.py build places.csv`
+GAZETTEER_INDEX = os.getenv("GAZETTEER_INDEX", "gazetteer.idx")
+# Dice similarity of name trigrams below which a place is not considered a match
+GAZETTEER_MIN_SCORE = float(os.getenv("GAZETTEER_MIN_SCORE", "0.6"))
+# Most posting entries scanned per query; trigrams too common to fit ("street", "road") are only
+# probed for the candidates the rarer ones found
+GAZETTEER_SCAN_BUDGET = int(os.getenv("GAZETTEER_SCAN_BUDGET", "100000"))
+# Candidates scored per query, most shared trigrams first
+GAZETTEER_MAX_CANDIDATES = int(os.getenv("GAZETTEER_MAX_CANDIDATES", "64"))
+
+_MAGIC = b"ELGZ"
+_VERSION = 1
+# magic, version, places, trigrams, postings, name bytes
+_HEADER = struct.Struct("<4sIIIII")
+_SEPARATOR = "\x1f"
+
+gazetteer = None
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Trigrams of a normalized name; the padding weights the start of each word, so prefixes match well"""
+    return {padded[i:i + 3] for word in text.split() for padded in (f"  {word} ",) for i in range(len(padded) - 2)}
+
+
+def _trigram_key(trigram: str) -> int:
+    """Pack three code points into one integer so the trigram table is a flat sorted array"""
+    key = 0
+    for char in trigram:
+        key = (key << 21) | ord(char)
+    return key
+
+
+def _dice(query: Set[str], name: Set[str]) -> float:
+    return 2 * len(query & name) / (len(query) + len(name)) if query and name else 0.0
+
+
+def _pad(size: int) -> int:
+    return -size % 8
+
+
+def build_index(csv_path: str, index_path: str = GAZETTEER_INDEX) -> int:
+    """Build the index file from a CSV of places and return the number of places.
+
+    The CSV needs name, latitude (or lat) and longitude (or lon) columns; kind, context
+    (city, district) and importance (higher wins ties) are optional. OSM extracts
+    exported with osmium or Overpass map onto these columns directly.
+    """
+    latitudes, longitudes, importance, names, name_trigrams, full_trigrams = [], [], [], [], [], []
+    postings: Dict[int, List[int]] = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            name = (row.get("name") or "").strip()
+            try:
+                latitude = float(row.get("latitude") or row.get("lat"))
+                longitude = float(row.get("longitude") or row.get("lon"))
+            except (TypeError, ValueError):
+                continue
+            if not name:
+                continue
+            place = len(names)
+            context = (row.get("context") or "").strip()
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+            importance.append(float(row.get("importance") or 0.0))
+            names.append(_SEPARATOR.join((name, context, (row.get("kind") or "").strip())))
+            # Index the name with its context, so "park street chennai" finds Park Street in Chennai
+            trigrams = _trigrams(normalize_location(f"{name} {context}"))
+            for trigram in trigrams:
+                postings.setdefault(_trigram_key(trigram), []).append(place)
+            # Trigram set sizes, so a query can bound a place's score before decoding its name
+            name_trigrams.append(min(len(_trigrams(normalize_location(name))), 0xFFFF))
+            full_trigrams.append(min(len(trigrams), 0xFFFF))
+
+    blob = bytearray()
+    offsets = [0]
+    for name in names:
+        blob += name.encode("utf-8")
+        offsets.append(len(blob))
+    keys = sorted(postings)
+    posting_offsets = [0]
+    for key in keys:
+        posting_offsets.append(posting_offsets[-1] + len(postings[key]))
+
+    count = len(names)
+    sections = [
+        struct.pack(f"<{count}d", *latitudes),
+        struct.pack(f"<{count}d", *longitudes),
+        struct.pack(f"<{count}f", *importance),
+        struct.pack(f"<{count}H", *name_trigrams),
+        struct.pack(f"<{count}H", *full_trigrams),
+        struct.pack(f"<{count + 1}I", *offsets),
+        bytes(blob),
+        struct.pack(f"<{len(keys)}Q", *keys),
+        struct.pack(f"<{len(keys) + 1}I", *posting_offsets),
+        # Place ids were appended in order, so every posting list is already sorted
+        struct.pack(f"<{posting_offsets[-1]}I", *(place for key in keys for place in postings[key])),
+    ]
+    with open(index_path + ".tmp", "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, count, len(keys), posting_offsets[-1], len(blob)))
+        f.write(b"\0" * _pad(_HEADER.size))
+        for section in sections:
+            f.write(section)
+            f.write(b"\0" * _pad(len(section)))
+    os.replace(index_path + ".tmp", index_path)
+    return count
+
+
+class Gazetteer:
+    """Offline forward geocoder over a memory-mapped index file.
+
+    The file holds coordinate, importance and trigram count arrays, a names blob,
+    and a trigram table: sorted trigram keys with sorted lists of the places whose
+    name contains each trigram. Opening it maps the file and slices views over the sections, so
+    startup does not depend on the size of the gazetteer and pages load on first use.
+    """
+
+    def __init__(self, path: str = GAZETTEER_INDEX):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        magic, version, count, trigrams, postings, name_bytes = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a version {_VERSION} gazetteer index")
+        self.count = count
+
+        position = _HEADER.size + _pad(_HEADER.size)
+
+        def section(size: int, format: Optional[str] = None):
+            nonlocal position
+            part = view[position:position + size]
+            position += size + _pad(size)
+            return part.cast(format) if format else part
+
+        self.latitudes = section(8 * count, "d")
+        self.longitudes = section(8 * count, "d")
+        self.importance = section(4 * count, "f")
+        self.name_trigrams = section(2 * count, "H")
+        self.full_trigrams = section(2 * count, "H")
+        self.name_offsets = section(4 * (count + 1), "I")
+        self.names = section(name_bytes)
+        self.keys = section(8 * trigrams, "Q")
+        self.posting_offsets = section(4 * (trigrams + 1), "I")
+        self.postings = section(4 * postings, "I")
+
+    def _postings(self, trigram: str):
+        key = _trigram_key(trigram)
+        index = bisect_left(self.keys, key)
+        if index == len(self.keys) or self.keys[index] != key:
+            return self.postings[0:0]
+        return self.postings[self.posting_offsets[index]:self.posting_offsets[index + 1]]
+
+    def _name(self, place: int) -> List[str]:
+        return bytes(self.names[self.name_offsets[place]:self.name_offsets[place + 1]]).decode("utf-8").split(_SEPARATOR)
+
+    def search(self, query: str, limit: int = 5, min_score: float = GAZETTEER_MIN_SCORE) -> List[Dict]:
+        """Places whose name, alone or with its context, is within min_score Dice similarity of query"""
+        normalized = normalize_location(query)
+        wanted = _trigrams(normalized)
+        if not wanted:
+            return []
+
+        # Candidates come from the rarest trigrams. Once some place shares enough of them to reach
+        # min_score, or the scan budget is spent, the remaining lists are only probed for candidates
+        size = len(wanted)
+        needed = max(1, math.ceil(min_score * size / (2 - min_score)))
+        lists = sorted((self._postings(trigram) for trigram in wanted), key=len)
+        counts = Counter()
+        scanned = entries = 0
+        common = []
+        for posting in lists:
+            if counts and (entries + len(posting) > GAZETTEER_SCAN_BUDGET
+                           or scanned >= needed and counts.most_common(1)[0][1] >= needed):
+                common.append(posting)
+            else:
+                counts.update(posting)
+                entries += len(posting)
+                scanned += 1
+        candidates = [place for place, _ in counts.most_common(GAZETTEER_MAX_CANDIDATES)]
+        for posting in common:
+            for place in candidates:
+                index = bisect_left(posting, place)
+                if index < len(posting) and posting[index] == place:
+                    counts[place] += 1
+
+        # Shared trigram counts give the exact score against name and context together, and a bound
+        # on the score against the name alone, so only places that can make the results are decoded
+        bounded = []
+        for place in candidates:
+            shared = counts[place]
+            full = 2 * shared / (size + self.full_trigrams[place])
+            name_bound = 2 * min(shared, self.name_trigrams[place]) / (size + self.name_trigrams[place])
+            if max(full, name_bound) >= min_score:
+                bounded.append((max(full, name_bound), full, self.importance[place], place))
+        bounded.sort(reverse=True)
+
+        matches = []
+        for bound, full, importance, place in bounded:
+            if len(matches) >= limit and bound < matches[limit - 1][0]:
+                break
+            name, context, kind = self._name(place)
+            # Streets are often split into many ways; report each named place once, at its best entry
+            if any(match[3] == name and match[4] == context for match in matches):
+                continue
+            score = full
+            if bound > full:
+                score = max(full, _dice(wanted, _trigrams(normalize_location(name))))
+            if score >= min_score:
+                matches.append((score, importance, place, name, context, kind))
+                matches.sort(key=lambda match: (match[0], match[1]), reverse=True)
+
+        return [{
+            "name": name,
+            "context": context,
+            "kind": kind,
+            "latitude": self.latitudes[place],
+            "longitude": self.longitudes[place],
+            "score": round(score, 3),
+        } for score, _, place, name, context, kind in matches[:limit]]
+
+    def geocode(self, query: str) -> Optional[Dict]:
+        """Best match in the shape of a geocoder result, or None"""
+        matches = self.search(query, limit=1)
+        if not matches:
+            return None
+        match = matches[0]
+        return {
+            "address": ", ".join(part for part in (match["name"], match["context"]) if part),
+            "latitude": match["latitude"],
+            "longitude": match["longitude"],
+            "kind": match["kind"],
+            "score": match["score"],
+        }
+
+    def close(self) -> None:
+        for name in ("latitudes", "longitudes", "importance", "name_trigrams", "full_trigrams", "name_offsets", "names",
+                     "keys", "posting_offsets", "postings"):
+            getattr(self, name).release()
+        self.map.close()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """Open the prebuilt index on first use; None if there is none, so callers go straight to Nominatim"""
+    global gazetteer
+    if gazetteer is None:
+        if not os.path.exists(GAZETTEER_INDEX):
+            return None
+        try:
+            gazetteer = Gazetteer(GAZETTEER_INDEX)
+        except (OSError, ValueError) as e:
+            print(f"Error opening gazetteer index {GAZETTEER_INDEX}: {e}")
+            return None
+    return gazetteer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the offline gazetteer index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build the index from a CSV of places")
+    build.add_argument("csv", help="CSV with name, latitude, longitude and optional kind, context, importance")
+    build.add_argument("--index", default=GAZETTEER_INDEX, help="Index file to write")
+    search = commands.add_parser("search", help="Look up a location")
+    search.add_argument("query")
+    search.add_argument("--index", default=GAZETTEER_INDEX, help="Index file to read")
+    search.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        places = build_index(args.csv, args.index)
+        print(f"Indexed {places} places into {args.index} in {time.perf_counter() - started:.1f}s")
+    else:
+        started = time.perf_counter()
+        index = Gazetteer(args.index)
+        opened = time.perf_counter()
+        results = index.search(args.query, args.limit)
+        print(f"Opened in {(opened - started) * 1000:.2f} ms, searched in {(time.perf_counter() - opened) * 1000:.2f} ms")
+        for result in results:
+            print(f"{result['score']:.3f}  {result['name']} ({result['context'] or result['kind']})  "
+                  f"{result['latitude']:.6f}, {result['longitude']:.6f}")
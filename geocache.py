@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+GEOCODE_CACHE_DB = os.getenv("GEOCODE_CACHE_DB", "geocode_cache.db")
+# Places rarely move; a name that did not resolve may be a typo that later calls spell differently
+GEOCODE_TTL = float(os.getenv("GEOCODE_TTL", str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = float(os.getenv("GEOCODE_NEGATIVE_TTL", str(24 * 3600)))
+# Maximum number of locations kept on disk and in memory
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "20000"))
+GEOCODE_CACHE_MEMORY_ENTRIES = int(os.getenv("GEOCODE_CACHE_MEMORY_ENTRIES", "1024"))
+# Seconds between last_access updates on disk for a location that keeps being served from memory
+GEOCODE_CACHE_TOUCH_INTERVAL = float(os.getenv("GEOCODE_CACHE_TOUCH_INTERVAL", "60"))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+geocode_cache = None
+
+
+def normalize_location(location: str) -> str:
+    """Cache key for a location string: case, punctuation and spacing do not change where a place is"""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", location.lower())).strip()
+
+
+def get_geocode_cache() -> "GeocodeCache":
+    """Open the shared geocode cache on first use"""
+    global geocode_cache
+    if geocode_cache is None:
+        geocode_cache = GeocodeCache()
+    return geocode_cache
+
+
+class GeocodeCache:
+    """Persistent, size-bounded LRU cache of geocoder results keyed by normalized location.
+
+    Entries are positive (address, latitude, longitude) or negative (the geocoder
+    found nothing), each with its own TTL. get() returns None on a miss and an
+    empty dict for a negative entry. An in-memory LRU in front of the SQLite table
+    answers repeat lookups without reading the disk; the table is shared between
+    processes. Memory hits still refresh the row's last_access, at most once per
+    touch_interval, so another process's LRU eviction sees the location as hot.
+    """
+
+    def __init__(self, path: str = GEOCODE_CACHE_DB, ttl: float = GEOCODE_TTL, negative_ttl: float = GEOCODE_NEGATIVE_TTL,
+                 max_entries: int = GEOCODE_CACHE_MAX_ENTRIES, memory_entries: int = GEOCODE_CACHE_MEMORY_ENTRIES,
+                 touch_interval: float = GEOCODE_CACHE_TOUCH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.touch_interval = touch_interval
+        # key -> (value or None for a negative entry, expires_at, time last_access was last written to disk)
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.inserts_since_evict = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS geocode_cache
+                             (key text PRIMARY KEY, result text, created_at real, expires_at real, last_access real)''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS geocode_cache_last_access ON geocode_cache (last_access)")
+        self.conn.commit()
+
+    def get(self, location: str) -> Optional[Dict]:
+        key = normalize_location(location)
+        now = time.time()
+        with self.lock:
+            if key in self.memory:
+                value, expires_at, touched = self.memory[key]
+                if expires_at > now:
+                    self.memory.move_to_end(key)
+                    self._count_hit(value)
+                    self.memory_hits += 1
+                    if now - touched >= self.touch_interval:
+                        self._touch(key, now)
+                        self.memory[key] = (value, expires_at, now)
+                    return dict(value) if value else {}
+                # Another process may have refreshed it; fall through to the table
+                del self.memory[key]
+
+            row = self.conn.execute("SELECT result, expires_at FROM geocode_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self.expired += 1
+                self.misses += 1
+                return None
+
+            self._touch(key, now)
+            value = json.loads(row[0]) if row[0] is not None else None
+            self._count_hit(value)
+            self._remember(key, value, row[1], now)
+            return dict(value) if value else {}
+
+    def put(self, location: str, value: Optional[Dict]) -> None:
+        """Store a geocoder result; None records that the location did not resolve"""
+        key = normalize_location(location)
+        now = time.time()
+        expires_at = now + (self.ttl if value else self.negative_ttl)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?, ?, ?)",
+                              (key, json.dumps(value) if value else None, now, expires_at, now))
+            self.conn.commit()
+            self._remember(key, dict(value) if value else None, expires_at, now)
+
+            # Evict in batches rather than counting rows on every insert
+            self.inserts_since_evict += 1
+            if self.inserts_since_evict >= max(1, self.max_entries // 20):
+                self._evict()
+
+    def _count_hit(self, value: Optional[Dict]) -> None:
+        self.hits += 1
+        if not value:
+            self.negative_hits += 1
+
+    def _touch(self, key: str, now: float) -> None:
+        self.conn.execute("UPDATE geocode_cache SET last_access = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+
+    def _remember(self, key: str, value: Optional[Dict], expires_at: float, touched: float) -> None:
+        self.memory[key] = (value, expires_at, touched)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        self.inserts_since_evict = 0
+        # Expired entries go first, whatever their last access
+        removed = self.conn.execute("DELETE FROM geocode_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        count = self.conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+        if count > self.max_entries:
+            # Trim a little below the limit so the next eviction is not one insert away
+            excess = count - int(self.max_entries * 0.95)
+            self.conn.execute('''DELETE FROM geocode_cache WHERE key IN
+                                 (SELECT key FROM geocode_cache ORDER BY last_access LIMIT ?)''', (excess,))
+            removed += excess
+        self.conn.commit()
+        if removed:
+            self.evictions += removed
+            print(f"Evicted {removed} expired or least recently used locations from geocode cache")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,213 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from geocache import GeocodeCache, get_geocode_cache, normalize_location
+from metrics import observe, registry, stage
+from scheduler import PRIORITY_OFFSETS, priority_class
+
+# Nominatim's usage policy allows one request per second
+GEOCODE_RATE = float(os.getenv("GEOCODE_RATE", "1.0"))
+GEOCODE_BURST = float(os.getenv("GEOCODE_BURST", "1"))
+# Seconds Nominatim may take to answer, and seconds a synchronous caller waits for its turn and the answer
+GEOCODE_TIMEOUT = float(os.getenv("GEOCODE_TIMEOUT", "5"))
+GEOCODE_WAIT_TIMEOUT = float(os.getenv("GEOCODE_WAIT_TIMEOUT", "10"))
+
+service = None
+service_loop = None
+service_lock = threading.Lock()
+nominatim = None
+
+
+def nominatim_lookup(location: str) -> Optional[Dict]:
+    """Address and coordinates from Nominatim, or None if the location does not resolve"""
+    global nominatim
+    if nominatim is None:
+        from geopy.geocoders import Nominatim
+        nominatim = Nominatim(user_agent="emergency_call_processor", timeout=GEOCODE_TIMEOUT)
+    place = nominatim.geocode(location)
+    if place is None:
+        return None
+    return {"address": place.address, "latitude": place.latitude, "longitude": place.longitude}
+
+
+class TokenBucket:
+    """Allows rate acquisitions per second on average, with bursts of up to capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token and return 0 if one is available, else return seconds until one will be"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    async def acquire(self) -> None:
+        while True:
+            delay = self.take()
+            if delay == 0:
+                return
+            await asyncio.sleep(delay)
+
+
+class PendingLookup:
+    def __init__(self, location: str, future: asyncio.Future, rank: float, priority: str):
+        self.location = location
+        self.future = future
+        self.rank = rank
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.started = False
+
+
+class GeocodingService:
+    """Rate limited geocoder shared by every call in the process.
+
+    Lookups are answered from the geocode cache when possible. Otherwise they wait
+    in a queue ordered like the summary scheduler, by enqueue time plus a priority
+    class offset, so HIGH calls go ahead of backfill work without starving it. A
+    single worker sends them at the token bucket's rate. Concurrent requests for the
+    same normalized location share one lookup; a more urgent duplicate moves the
+    shared lookup up the queue.
+    """
+
+    def __init__(self, lookup: Callable[[str], Optional[Dict]] = nominatim_lookup, cache: Optional[GeocodeCache] = None,
+                 rate: float = GEOCODE_RATE, burst: float = GEOCODE_BURST, offsets: Dict[str, float] = PRIORITY_OFFSETS):
+        self.lookup = lookup
+        self.cache = cache or get_geocode_cache()
+        self.bucket = TokenBucket(rate, burst)
+        self.offsets = offsets
+        self.waiting = []
+        self.pending: Dict[str, PendingLookup] = {}
+        self.sequence = itertools.count()
+        self.wakeup = None
+        self.worker = None
+        self.lookups = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def geocode(self, location: str, priority="MEDIUM") -> Optional[Dict]:
+        """Address and coordinates for location, or None if it does not resolve; geocoder errors are raised"""
+        cached = self.cache.get(location)
+        if cached is not None:
+            return cached or None
+
+        key = normalize_location(location)
+        name = priority_class(priority)
+        rank = time.monotonic() + self.offsets.get(name, 0.0)
+        pending = self.pending.get(key)
+        if pending is None:
+            pending = self.pending[key] = PendingLookup(location, asyncio.get_running_loop().create_future(), rank, name)
+            self._push(rank, key)
+        else:
+            self.coalesced += 1
+            if rank < pending.rank and not pending.started:
+                # Queue it again at the better rank; the worker skips the stale entry
+                pending.rank = rank
+                pending.priority = name
+                self._push(rank, key)
+        # Shielded, so a caller that gives up does not cancel the lookup for the others
+        return await asyncio.shield(pending.future)
+
+    def _push(self, rank: float, key: str) -> None:
+        heapq.heappush(self.waiting, (rank, next(self.sequence), key))
+        if self.worker is None or self.worker.done():
+            self.wakeup = asyncio.Event()
+            # A fresh context, so lookups are not traced as part of whichever call started the worker
+            self.worker = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+        self.wakeup.set()
+
+    def _next(self) -> Optional[PendingLookup]:
+        while self.waiting:
+            rank, _, key = heapq.heappop(self.waiting)
+            pending = self.pending.get(key)
+            if pending is not None and not pending.started and pending.rank == rank:
+                return pending
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            while not self.waiting:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            await self.bucket.acquire()
+            # Chosen once the token is in hand, so a HIGH request that arrived meanwhile goes first
+            pending = self._next()
+            if pending is None:
+                self.bucket.refund()
+                continue
+            pending.started = True
+            observe("geocode_queue", time.monotonic() - pending.enqueued)
+            key = normalize_location(pending.location)
+            try:
+                with stage("geocode", priority=pending.priority):
+                    result = await asyncio.to_thread(self.lookup, pending.location)
+            except Exception as e:
+                self.errors += 1
+                pending.future.set_exception(e)
+                # Nobody may be waiting any more; do not report the exception as never retrieved
+                pending.future.exception()
+            else:
+                self.lookups += 1
+                self.cache.put(pending.location, result)
+                pending.future.set_result(result)
+            finally:
+                self.pending.pop(key, None)
+
+    def depth(self) -> int:
+        return sum(1 for pending in self.pending.values() if not pending.started)
+
+    def snapshot(self) -> Dict:
+        return {
+            "depth": self.depth(),
+            "in_flight": len(self.pending) - self.depth(),
+            "lookups": self.lookups,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "rate": self.bucket.rate,
+            "cache": self.cache.stats(),
+        }
+
+
+def get_geocoding_service() -> GeocodingService:
+    """Start the shared service on its own event loop thread, for callers that are not async"""
+    global service, service_loop
+    with service_lock:
+        if service is None:
+            service_loop = asyncio.new_event_loop()
+            threading.Thread(target=service_loop.run_forever, name="geocoding", daemon=True).start()
+            service = GeocodingService()
+            registry.gauge("echolink_geocode_queue_depth", "Geocode lookups waiting for a rate limit token",
+                           function=service.depth)
+    return service
+
+
+def geocode_blocking(location: str, priority="MEDIUM", timeout: float = GEOCODE_WAIT_TIMEOUT) -> Optional[Dict]:
+    """Geocode through the shared service from a worker thread; raises TimeoutError after timeout seconds"""
+    geocoder = get_geocoding_service()
+    # Cache hits are answered here, without a round trip through the service's loop
+    cached = geocoder.cache.get(location)
+    if cached is not None:
+        return cached or None
+    future = asyncio.run_coroutine_threadsafe(geocoder.geocode(location, priority), service_loop)
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
@@ -1,257 +1,226 @@
+import argparse
 import asyncio
-from hume import HumeVoiceClient, MicrophoneInterface
-from dotenv import load_dotenv
+from typing import Optional
 import os
-from groq import Groq
 import sqlite3
 import json
 import uuid
 from datetime import datetime
 
-# Using sqlite3 to store the conversation
-conn = sqlite3.connect('conversation.db')
-c = conn.cursor()
+if __name__ == "__main__":
+    # Load .env before the imports below read their settings; importing main itself has no side effects
+    from dotenv import load_dotenv
+    load_dotenv()
+
+import metrics
+from admission import LEVEL_NAMES, LOCAL_ONLY, REDUCED
+from summarizer import (EARLY_FIELDS, RollingSummarizer, compact_for_summary, get_service, is_fallback_summary,
+                        normalize_summary, preload_clients, summarize_transcript)
+from storage import get_storage
+from supervisor import CallSupervisor
+from transcript import TranscriptLog
+from triage import local_analysis
+
+# Interval between rolling summary updates while a call is live
+ROLLING_INTERVAL = float(os.getenv("ROLLING_INTERVAL", "5"))
+# Longest a call waits for its LLM summary after hang-up before local triage is stored instead
+PROCESSING_DEADLINE = float(os.getenv("PROCESSING_DEADLINE", "20"))
 
-# create a table conversations only if it doesn't exist
-c.execute('''CREATE TABLE IF NOT EXISTS conversations
-              (uid text, conversation text, timestamp text, summary text, criticality text, isSpam bool, user text, location text)''')
-conn.commit()
-conn.close()
+# Late LLM summaries still on their way to replace a local triage record
+pending_refinements = set()
 
-load_dotenv()
+async def main(uid: Optional[str] = None) -> None:
+    # Start the call supervisor; the Hume client and imports are set up once for every call
+    supervisor = CallSupervisor(on_session_started=rolling_summary, on_session_ended=process_session)
+    # Depth, wait and service time of the summarization queue per priority class
+    supervisor.control.register("queue", lambda request: get_service().scheduler.stats())
+    # Latency, error rate and hedging counters per summary model
+    supervisor.control.register("models", lambda request: get_service().router.snapshot())
+    # Current degradation level of the LLM tier and the backlog it was derived from
+    supervisor.control.register("admission", lambda request: get_service().admission.snapshot())
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    # Gauges are read whenever the snapshot is published, so they cost nothing in between
+    metrics.registry.gauge("echolink_active_calls", "Calls not yet processed",
+                           function=lambda: sum(1 for session in supervisor.sessions.values() if not session.finished))
+    metrics.registry.gauge("echolink_summary_queue_depth", "Summaries waiting for a slot",
+                           function=lambda: get_service().scheduler.depth())
+    metrics.registry.gauge("echolink_summaries_in_flight", "Summaries running against the LLM",
+                           function=lambda: get_service().in_flight)
+    metrics.registry.gauge("echolink_admission_level", "LLM degradation level: 0 full, 1 reduced, 2 local-only",
+                           function=lambda: get_service().admission.current)
+    # Held here so the tasks are not garbage collected, and cancelled when the supervisor stops
+    background = [asyncio.create_task(publish_metrics()),
+                  # Groq's client modules load in the background once the control channel is up, not before it
+                  asyncio.create_task(asyncio.to_thread(preload_clients))]
 
-conversations = None
-async def main() -> None:
-    # Paste your Hume API key here
-    HUME_API_KEY = os.getenv("HUME_API_KEY")
-    # Connect and authenticate with Hume
-    client = HumeVoiceClient(HUME_API_KEY)
-    # Start streaming EVI over your device's microphone and speakers
-    with open ("conversations.txt", "w") as f:
-        f.write("")
+    if uid:
+        # Single call mode: stop serving once this call has been processed
+        session = supervisor.start_session(uid)
+
+        async def stop_when_done():
+            await session.done_event.wait()
+            supervisor.stopped.set()
+
+        background.append(asyncio.create_task(stop_when_done()))
 
     try:
-        async with client.connect(config_id=os.getenv("CONFIG_ID")) as socket:
-            mic_interface = None
-            try:
-                mic_interface = await MicrophoneInterface.start(socket, allow_user_interrupt=True)
-                
-                # Check for end call signal
-                while not os.path.exists("end_call.txt"):
-                    await asyncio.sleep(0.1)
-                print("End call signal detected")
-                
-                # Force stop the microphone interface immediately
-                if mic_interface:
-                    print("Force stopping microphone interface...")
-                    try:
-                        await mic_interface.stop()
-                        await socket.close()  # Force close the socket
-                        print("Microphone interface and socket stopped")
-                    except:
-                        # If normal stop fails, force close everything
-                        try:
-                            socket._ws.close()
-                            print("Socket forcefully closed")
-                        except:
-                            pass
-                    
-                # Clean up end call signal
-                if os.path.exists("end_call.txt"):
-                    os.remove("end_call.txt")
-                    
-            except asyncio.CancelledError:
-                print("Conversation cancelled by user")
-                # Force stop everything
-                if mic_interface:
-                    try:
-                        await mic_interface.stop()
-                        await socket.close()
-                    except:
-                        try:
-                            socket._ws.close()
-                        except:
-                            pass
-                    print("Microphone and socket forcefully stopped after cancellation")
-            except Exception as e:
-                print(f"Error during conversation: {e}")
-                raise
-            finally:
-                # Ensure everything is stopped in any case
-                if mic_interface:
-                    try:
-                        await mic_interface.stop()
-                        await socket.close()
-                    except:
-                        try:
-                            socket._ws.close()
-                        except:
-                            pass
-                    print("Microphone and socket forcefully stopped in cleanup")
+        await supervisor.serve()
+    finally:
+        for task in background:
+            task.cancel()
+        metrics.publish("supervisor", force=True)
+        await get_service().close()
+        get_storage().close()
+
+async def publish_metrics() -> None:
+    # The FastAPI server merges this snapshot into /metrics
+    while True:
+        await asyncio.to_thread(metrics.publish, "supervisor", True)
+        await asyncio.sleep(metrics.METRICS_PUBLISH_INTERVAL)
+
+async def rolling_summary(session) -> None:
+    # Summarize new transcript chunks while the call is live so hang-up only has a small delta left
+    session.rolling = RollingSummarizer(session.uid)
+    while not session.end_event.is_set():
+        try:
+            await asyncio.wait_for(session.end_event.wait(), timeout=ROLLING_INTERVAL)
+        except asyncio.TimeoutError:
+            # Mid-call summaries are optional work; under load the final summary covers the whole call
+            if get_service().admission.level() >= REDUCED:
+                continue
+            session.rolling.priority = session.priority()["criticality"]
+            if await session.rolling.update():
+                session.analysis.update({field: session.rolling.state.get(field) for field in EARLY_FIELDS})
+
+async def process_session(session) -> None:
+    # Store the call within PROCESSING_DEADLINE of hang-up: if the LLM has not answered by then, commit
+    # a local triage record now and let the LLM summary refine it whenever it arrives
+    level = get_service().admission.admit()
+    if level >= LOCAL_ONLY:
+        # The LLM tier is saturated: shed the summary and leave it to resummarize.py --refine
+        print(f"LLM tier is {LEVEL_NAMES[level]}, storing local triage for call {session.uid}")
+        await store_local_triage(session.uid)
+        return
+
+    summary_task = asyncio.ensure_future(summarize_session(session))
+    done, _ = await asyncio.wait({summary_task}, timeout=PROCESSING_DEADLINE)
+    if summary_task in done:
+        try:
+            json_data = summary_task.result()
+        except Exception as e:
+            print(f"Summary for call {session.uid} failed, storing local triage instead: {e}")
+        else:
+            if json_data is not None and not is_fallback_summary(json_data):
+                await asyncio.to_thread(get_conversation, session.uid, json_data)
+                return
+            # No summary at all: never fall back to an unbounded synchronous summary inside the deadline
+            print(f"Summary for call {session.uid} failed, storing local triage instead")
+    else:
+        print(f"Summary for call {session.uid} missed the {PROCESSING_DEADLINE:g}s deadline, storing local triage")
+        refinement = asyncio.create_task(refine_later(session.uid, summary_task))
+        pending_refinements.add(refinement)
+        refinement.add_done_callback(pending_refinements.discard)
+
+    await store_local_triage(session.uid)
+
+async def store_local_triage(uid: str) -> None:
+    # Keyword triage record, flagged so the LLM summary can refine it later
+    with metrics.stage("local_triage"):
+        json_data = local_analysis(TranscriptLog(uid).read_all())
+    await asyncio.to_thread(get_conversation, uid, json_data, True)
+
+async def summarize_session(session) -> Optional[dict]:
+    # Finish the rolling summary on the shared summarization service; off the event loop work
+    # is left to the caller so other calls keep streaming
+    json_data = None
+    tokens_saved = 0
+    # Calls that triage as HIGH are summarized ahead of others that ended at the same time
+    priority = session.priority()["criticality"]
+    rolling = getattr(session, "rolling", None)
+    if rolling:
+        rolling.priority = priority
+        json_data = await rolling.finalize()
+        tokens_saved += rolling.tokens_saved
+    if json_data is None:
+        conversation_text, report = compact_for_summary(TranscriptLog(session.uid).read_all(), session.uid)
+        tokens_saved += report["saved_tokens"]
+        if conversation_text.strip():
+            # Criticality streams in before the summary text, so the UI can show it straight away
+            json_data = await get_service().summarize(conversation_text, on_early=session.analysis.update,
+                                                      priority=priority)
+    print(f"Transcript compaction saved {tokens_saved} prompt tokens for call {session.uid}")
+    return json_data
+
+async def refine_later(uid: str, summary_task: asyncio.Future) -> None:
+    # Replace the local triage record with the LLM summary once it arrives; the UI has moved on,
+    # so no completion signal is written
+    try:
+        json_data = await summary_task
     except Exception as e:
-        print(f"Connection error: {e}")
-        raise
+        print(f"Late summary for call {uid} failed, record stays flagged for refinement: {e}")
+        return
+    if json_data is None or is_fallback_summary(json_data):
+        print(f"Late summary for call {uid} unusable, record stays flagged for refinement")
+        return
+    await asyncio.to_thread(get_conversation, uid, json_data, False, False)
+    print(f"Refined call {uid} with the late LLM summary")
 
-def get_conversation():
+def get_conversation(uid: str, json_data: Optional[dict] = None, needs_refinement: bool = False,
+                     signal_complete: bool = True):
     try:
         print("\nStarting conversation processing...")
-        # Keep reading the conversation file that is asyncronously written to by the chat client and wait for 'end the call' to be said by the user. then return the conversation
-        with open("conversations.txt", "r") as f:
-            conversations = f.read()
-            print("Retrieved conversation text:", conversations[:100], "...")  # Print first 100 chars
-            
-            if not conversations.strip():
-                print("Warning: Empty conversation text!")
-                return
-            
+        # Read the call's transcript log that is appended to by the voice process
+        conversations = TranscriptLog(uid).read_all()
+        print("Retrieved conversation text:", conversations[:100], "...")  # Print first 100 chars
+        
+        if not conversations.strip():
+            print("Warning: Empty conversation text!")
+            return
+        
+        if json_data is None:
             print("Generating summary with Groq...")
-            try:
-                chat_summary = client.chat.completions.create(messages=[
-                    {
-                        "role": "system",
-                        "content": """You must analyze the conversation carefully and respond with a valid JSON object containing exactly these fields:
-                            {
-                              "summary": "A brief summary of the conversation",
-                              "criticality": "Criticality of the emergency call using these guidelines: HIGH (immediate life-threatening situations, major fires, violent crimes in progress), MEDIUM (non-life threatening injuries, property damage, ongoing but non-violent crimes), LOW (minor incidents, information requests, non-emergency situations)",
-                              "isSpam": "True if the call appears to be a prank, contains no actual emergency, is deliberately misleading, or the caller is not serious. False for genuine emergency calls",
-                              "department": "Department name (Fire, Police, Medical, or combination if multiple services needed)",
-                              "user": "User name (Unknown if not provided)",
-                              "location": "User location (Unknown if not provided)"
-                            }
-                            Carefully examine the conversation context to accurately determine criticality and spam status. Do not default to HIGH criticality unless truly warranted by the situation described. Do not include any other text or formatting.
-                        """.strip()
-                    },
-                    {
-                        "role": "user",
-                        "content": conversations
-                    }
-                ], model='llama3-8b-8192', stream=False)
-                
-                print("Received response from model:", chat_summary.choices[0].message.content)
-                response_content = chat_summary.choices[0].message.content.strip()
-                
-                # Special handling for malformed JSON responses
-                if not (response_content.startswith('{') and response_content.endswith('}')):
-                    print("Warning: Response is not valid JSON, attempting to fix...")
-                    # Try to extract JSON from the response if it's embedded in other text
-                    import re
-                    json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
-                    if json_match:
-                        response_content = json_match.group(0)
-                        print("Extracted JSON:", response_content)
-                    else:
-                        # Create default JSON if extraction fails
-                        print("Could not extract JSON, creating default response...")
-                        response_content = """
-                        {
-                          "summary": "Unable to determine details from conversation",
-                          "criticality": "LOW",
-                          "isSpam": "True",
-                          "department": "Unknown",
-                          "user": "Unknown",
-                          "location": "Unknown"
-                        }
-                        """
-                        print("Created default JSON:", response_content)
-                
-                try:
-                    json_data = json.loads(response_content)
-                    print("Successfully parsed JSON data")
-                except json.JSONDecodeError as je:
-                    print(f"JSON parsing error: {je}")
-                    # Create default json_data as fallback
-                    json_data = {
-                        "summary": "Unable to parse conversation details",
-                        "criticality": "LOW",
-                        "isSpam": "True",
-                        "department": "Unknown",
-                        "user": "Unknown",
-                        "location": "Unknown"
-                    }
-                    print("Using default JSON data due to parsing error")
-                
-            except Exception as model_error:
-                print(f"Error generating summary with model: {model_error}")
-                # Create default json_data
-                json_data = {
-                    "summary": "Error processing conversation",
-                    "criticality": "LOW",
-                    "isSpam": "True",
-                    "department": "Unknown",
-                    "user": "Unknown",
-                    "location": "Unknown"
-                }
-                print("Using default JSON data due to model error")
-            
-            # Convert string "True"/"False" to boolean for isSpam
-            try:
-                is_spam = True if json_data["isSpam"].lower() == "true" else False
-            except (KeyError, AttributeError) as e:
-                print(f"Error processing isSpam value: {e}")
-                is_spam = True  # Default to True for safety
-            
-            try:
-                # Ensure criticality is one of the expected values
-                valid_criticalities = ["HIGH", "MEDIUM", "LOW"]
-                if json_data.get("criticality", "").upper() not in valid_criticalities:
-                    print(f"Invalid criticality value: {json_data.get('criticality')}")
-                    json_data["criticality"] = "LOW"  # Default to low if invalid
-                else:
-                    # Normalize to uppercase
-                    json_data["criticality"] = json_data["criticality"].upper()
-            except Exception as e:
-                print(f"Error processing criticality: {e}")
-                json_data["criticality"] = "LOW"  # Default to low
-            
-            # Get current timestamp
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            print("Inserting into database...")
-            conn = sqlite3.connect('conversation.db')
-            c = conn.cursor()
-            uid = str(uuid.uuid4())
-            
-            # Fill in missing fields with defaults if necessary
-            for field in ["summary", "department", "user", "location"]:
-                if field not in json_data or not json_data[field]:
-                    json_data[field] = "Unknown"
-                    print(f"Using default value for missing field: {field}")
-            
-            # Print values being inserted
-            values = (uid, conversations, current_time, json_data["summary"],
-                     json_data["criticality"], is_spam,
-                     json_data["user"], json_data["location"])
-            print("Inserting values into database:", values)
+            json_data = summarize_transcript(compact_for_summary(conversations, uid)[0])
+        else:
+            print("Using rolling summary computed during the call")
+        
+        # Normalize isSpam to a boolean and criticality to HIGH/MEDIUM/LOW
+        json_data, is_spam = normalize_summary(json_data)
+        
+        # Get current timestamp
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        print("Inserting into database...")
+        
+        # Fill in missing fields with defaults if necessary
+        for field in ["summary", "department", "user", "location"]:
+            if field not in json_data or not json_data[field]:
+                json_data[field] = "Unknown"
+                print(f"Using default value for missing field: {field}")
+        
+        # Print values being inserted
+        values = (uid, conversations, current_time, json_data["summary"],
+                 json_data["criticality"], is_spam,
+                 json_data["user"], json_data["location"])
+        print("Inserting values into database:", values)
+        
+        try:
+            with metrics.stage("db_insert"):
+                get_storage().save_conversation(values, json_data["department"], needs_refinement)
+            print("Database commit successful" + (" (flagged for LLM refinement)" if needs_refinement else ""))
             
-            try:
-                c.execute("INSERT INTO conversations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values)
-                conn.commit()
-                print("Database commit successful")
-                
-                # Verify insertion
-                c.execute("SELECT * FROM conversations WHERE uid = ?", (uid,))
-                result = c.fetchone()
-                print("Verified database insertion:", result is not None)
-                if result:
-                    print("Retrieved row:", result)
-                
-                conn.close()
-                print("Database connection closed")
-                
+            if signal_complete:
                 # Create a file to signal that summary is complete
                 with open("summary_complete.txt", "w") as f:
                     f.write(uid)
                 print("Created summary_complete.txt with uid:", uid)
-                
-            except sqlite3.Error as e:
-                print(f"Database error: {e}")
-                raise
-            except Exception as e:
-                print(f"Error during database operations: {e}")
-                raise
             
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            raise
+        except Exception as e:
+            print(f"Error during database operations: {e}")
+            raise
+        
     except Exception as e:
         print("Error during conversation processing:", str(e))
         import traceback
@@ -261,15 +230,11 @@ def get_conversation():
         # Attempt to create a record even when an error occurs
         try:
             print("Attempting to create error record in database...")
-            conn = sqlite3.connect('conversation.db')
-            c = conn.cursor()
-            uid = str(uuid.uuid4())
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
             # Get conversation text if possible
             try:
-                with open("conversations.txt", "r") as f:
-                    conversations = f.read()
+                conversations = TranscriptLog(uid).read_all()
             except:
                 conversations = "Error retrieving conversation text"
             
@@ -285,14 +250,14 @@ def get_conversation():
                 "Unknown"
             )
             
-            c.execute("INSERT INTO conversations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", error_values)
-            conn.commit()
+            # Never overwrite a record that was already stored for this call
+            get_storage().save_conversation(error_values, needs_refinement=True, replace=False)
             
-            # Create summary completion signal
-            with open("summary_complete.txt", "w") as f:
-                f.write(uid)
+            # Create summary completion signal, unless this was a refinement of a call the UI already finished
+            if signal_complete:
+                with open("summary_complete.txt", "w") as f:
+                    f.write(uid)
             
-            conn.close()
             print("Created error record in database with uid:", uid)
         except Exception as recovery_error:
             print(f"Failed to create error record: {recovery_error}")
@@ -300,11 +265,16 @@ def get_conversation():
         raise
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run EchoLink voice calls")
+    parser.add_argument("--uid", default=None, help="Run a single call with this uid and exit when it has been processed")
+    parser.add_argument("--serve", action="store_true", help="Run the long-lived call supervisor for the UI")
+    args = parser.parse_args()
+    uid = None if args.serve else (args.uid or str(uuid.uuid4()))
     try:
-        print("Starting main process...")
-        asyncio.run(main())
+        print("Starting call supervisor..." if args.serve else f"Starting main process for call {uid}...")
+        asyncio.run(main(uid))
         print("------------Conversation has ended------------")
     except Exception as e:
         print(f"Fatal error in main process: {e}")
     finally:
-        print("Main process completed")
\ No newline at end of file
+        print("Main process completed")
@@ -0,0 +1,252 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from tracing import span
+
+# Each process publishes a JSON snapshot here; the FastAPI server merges them into /metrics
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "5"))
+# Snapshots from processes that have not published for this long are left out of /metrics
+METRICS_STALE_AFTER = float(os.getenv("METRICS_STALE_AFTER", "600"))
+
+# Seconds, from a single DB insert up to a slow crew run
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], object] = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Return (name suffix, labels, value) for every series"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [("_total", dict(zip(self.labels, key)), value) for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    """A value that goes up and down; with a function, it is read when metrics are collected"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), function: Optional[Callable] = None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value: float, **labels) -> None:
+        with self.lock:
+            self.values[self._key(labels)] = float(value)
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                return [("", {}, float(self.function()))]
+            except Exception as e:
+                print(f"Error reading gauge {self.name}: {e}")
+                return []
+        with self.lock:
+            return [("", dict(zip(self.labels, key)), value) for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    """Bucketed distribution; observe() is a bisect and three additions under a lock"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            series = [(dict(zip(self.labels, key)), list(values)) for key, values in self.values.items()]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                samples.append(("_bucket", dict(labels, le="+Inf" if bound == float("inf") else repr(bound)), cumulative))
+            samples.append(("_sum", labels, values[-1]))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.last_published = 0.0
+
+    def register(self, metric: Metric) -> Metric:
+        # Modules may be reloaded or registered twice; keep the first instance so references stay valid
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), function: Optional[Callable] = None) -> Gauge:
+        gauge = self.register(Gauge(name, help, labels))
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def snapshot(self) -> Dict:
+        return {
+            metric.name: {"kind": metric.kind, "help": metric.help, "samples": metric.samples()}
+            for metric in self.metrics.values()
+        }
+
+
+def render(snapshots: Dict[str, Dict]) -> str:
+    """Render {process: snapshot} as Prometheus text, one family per metric with a process label"""
+    families: Dict[str, Dict] = {}
+    for process, snapshot in sorted(snapshots.items()):
+        for name, family in snapshot.items():
+            merged = families.setdefault(name, {"kind": family["kind"], "help": family["help"], "samples": []})
+            for suffix, labels, value in family["samples"]:
+                merged["samples"].append((suffix, dict(labels, process=process), value))
+
+    lines = []
+    for name, family in families.items():
+        # Text format 0.0.4 matches samples to HELP/TYPE by exact name, so a counter is described as its _total series
+        described = f"{name}_total" if family["kind"] == "counter" else name
+        lines.append(f"# HELP {described} {family['help']}")
+        lines.append(f"# TYPE {described} {family['kind']}")
+        for suffix, labels, value in family["samples"]:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Every stage of a call shares one histogram, so a dashboard can stack them into a waterfall
+STAGE_SECONDS = registry.histogram("echolink_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+STAGE_ERRORS = registry.counter("echolink_stage_errors", "Pipeline stages that raised", ("stage",))
+
+
+@contextmanager
+def stage(name: str, uid: Optional[str] = None, **attrs):
+    """Time a pipeline stage; failures are timed too and also counted.
+
+    Inside a traced call, or with a uid, the stage is also recorded as a span with attrs attached.
+    """
+    started = time.perf_counter()
+    completed = False
+    try:
+        with span(name, uid, **attrs):
+            yield
+        completed = True
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        completed = True
+        raise
+    finally:
+        # A cancelled stage (e.g. a losing hedged request) says nothing about the stage's latency
+        if completed:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record a stage measured across callbacks rather than inside one block"""
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def publish(process: str, force: bool = False) -> None:
+    """Write this process's snapshot for the server to merge, at most every METRICS_PUBLISH_INTERVAL"""
+    now = time.monotonic()
+    if not force and now - registry.last_published < METRICS_PUBLISH_INTERVAL:
+        return
+    registry.last_published = now
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{process}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Error publishing metrics for {process}: {e}")
+
+
+def collect(process: str) -> str:
+    """Prometheus text for this process plus every other process's recent snapshot"""
+    snapshots = {process: registry.snapshot()}
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        other, extension = os.path.splitext(name)
+        path = os.path.join(METRICS_DIR, name)
+        if extension != ".json" or other == process:
+            continue
+        try:
+            if time.time() - os.path.getmtime(path) > METRICS_STALE_AFTER:
+                continue
+            with open(path) as f:
+                snapshots[other] = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading metrics snapshot {name}: {e}")
+    return render(snapshots)
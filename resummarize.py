@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from groq import RateLimitError
+
+from storage import CONVERSATION_DB, Storage
+from summarizer import (SUMMARY_MODEL, SYSTEM_PROMPT, SummarizationService, is_fallback_summary,
+                        normalize_summary, prompt_version)
+
+DEFAULT_CHECKPOINT = "resummarize_checkpoint.json"
+REFINE_CHECKPOINT = "refine_checkpoint.json"
+
+
+class RateLimiter:
+    """Token bucket limiting how many requests start per minute"""
+
+    def __init__(self, requests_per_minute: float):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for a while after the provider reports a rate limit"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+def load_checkpoint(path: str) -> Dict:
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"last_rowid": 0, "processed": 0, "updated": 0, "failed": []}
+
+
+def save_checkpoint(path: str, checkpoint: Dict) -> None:
+    # Write to a temporary file first so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def fetch_batch(storage: Storage, last_rowid: int, batch_size: int, refine: bool = False) -> List[Tuple]:
+    # Keyset pagination keeps each read O(batch) no matter how far into the table we are
+    where = "rowid > ? AND needs_refinement = 1" if refine else "rowid > ?"
+    return storage.query(
+        f"SELECT rowid, uid, conversation FROM conversations WHERE {where} ORDER BY rowid LIMIT ?",
+        (last_rowid, batch_size))
+
+
+async def resummarize_row(service: SummarizationService, limiter: RateLimiter, row: Tuple,
+                          max_retries: int) -> Optional[Tuple]:
+    """Return (summary, criticality, isSpam, rowid) for a row, or None if it could not be summarized"""
+    rowid, uid, conversation = row
+    if not conversation or not str(conversation).strip():
+        return None
+
+    for attempt in range(max_retries + 1):
+        await limiter.acquire()
+        try:
+            result = await service.summarize(str(conversation), fallback=False)
+        except RateLimitError as e:
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            delay = float(retry_after) if retry_after else min(60.0, 2.0 ** attempt)
+            print(f"Rate limited on {uid}, backing off {delay:.1f}s (attempt {attempt + 1})")
+            limiter.pause(delay)
+            continue
+        except Exception as e:
+            print(f"Error re-summarizing {uid}: {e}")
+            return None
+
+        if is_fallback_summary(result):
+            print(f"Model returned an unusable response for {uid}, keeping the existing record")
+            return None
+        json_data, is_spam = normalize_summary(result)
+        return (json_data.get("summary") or "Unknown", json_data["criticality"], is_spam, rowid)
+
+    print(f"Giving up on {uid} after {max_retries + 1} rate limited attempts")
+    return None
+
+
+async def resummarize(db_path: str, checkpoint_path: str, batch_size: int, concurrency: int,
+                      requests_per_minute: float, max_retries: int, limit: Optional[int], refine: bool = False) -> None:
+    checkpoint = load_checkpoint(checkpoint_path)
+    version = prompt_version(SYSTEM_PROMPT)
+    if checkpoint.get("prompt_version") not in (None, version) or checkpoint.get("model") not in (None, SUMMARY_MODEL):
+        print("Warning: checkpoint was written for a different prompt or model; use --reset to start over")
+    checkpoint["prompt_version"] = version
+    checkpoint["model"] = SUMMARY_MODEL
+
+    service = SummarizationService(max_concurrency=concurrency)
+    limiter = RateLimiter(requests_per_minute)
+    # WAL lets the UI and the voice pipeline keep using the database while this runs
+    storage = Storage(db_path)
+
+    total = storage.query_one("SELECT COUNT(*) FROM conversations WHERE rowid > ?"
+                              + (" AND needs_refinement = 1" if refine else ""), (checkpoint["last_rowid"],))[0]
+    print(f"Re-summarizing {total} {'preliminary ' if refine else ''}rows with {SUMMARY_MODEL} (prompt {version}), "
+          f"starting after rowid {checkpoint['last_rowid']}")
+
+    started = time.monotonic()
+    processed = 0
+    try:
+        while limit is None or processed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            rows = fetch_batch(storage, checkpoint["last_rowid"], size, refine)
+            if not rows:
+                break
+
+            results = await asyncio.gather(*(resummarize_row(service, limiter, row, max_retries) for row in rows))
+            updates = [result for result in results if result]
+
+            # One transaction per batch; the checkpoint only moves once the batch is committed
+            storage.update_analysis(updates)
+
+            checkpoint["last_rowid"] = rows[-1][0]
+            checkpoint["processed"] += len(rows)
+            checkpoint["updated"] += len(updates)
+            checkpoint["failed"].extend(row[1] for row, result in zip(rows, results) if not result)
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            processed += len(rows)
+            elapsed = time.monotonic() - started
+            print(f"{processed}/{total} rows ({len(updates)} updated in this batch), "
+                  f"{processed / elapsed:.2f} rows/sec")
+    finally:
+        await service.close()
+        storage.close()
+
+    elapsed = time.monotonic() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Done: {processed} rows in {elapsed:.1f}s ({rate:.2f} rows/sec), "
+          f"{len(checkpoint['failed'])} failed rows recorded in {checkpoint_path}")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Re-summarize stored conversations with the current prompt and model")
+    parser.add_argument("--db", default=CONVERSATION_DB, help="Path to the conversations database")
+    parser.add_argument("--checkpoint", default=None,
+                        help=f"Checkpoint file used to resume (default {DEFAULT_CHECKPOINT}, or {REFINE_CHECKPOINT} with --refine)")
+    parser.add_argument("--reset", action="store_true", help="Ignore any existing checkpoint and start from the first row")
+    parser.add_argument("--batch-size", type=int, default=50, help="Rows per committed batch")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum summaries in flight")
+    parser.add_argument("--requests-per-minute", type=float, default=30, help="Request rate limit")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per row after rate limit errors")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many rows")
+    parser.add_argument("--refine", action="store_true",
+                        help="Only summarize preliminary records stored when the LLM missed the processing deadline")
+    args = parser.parse_args()
+    args.checkpoint = args.checkpoint or (REFINE_CHECKPOINT if args.refine else DEFAULT_CHECKPOINT)
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    asyncio.run(resummarize(args.db, args.checkpoint, args.batch_size, args.concurrency,
+                            args.requests_per_minute, args.max_retries, args.limit, args.refine))
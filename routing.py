@@ -0,0 +1,156 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Weight of the newest sample in the latency and error rate moving averages
+EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.2"))
+# A hedged request goes out once the primary has taken longer than this percentile of its recent latencies
+HEDGE_PERCENTILE = float(os.getenv("ROUTER_HEDGE_PERCENTILE", "0.9"))
+# Hedge deadline used until a model has enough samples for a percentile, and its lower bound
+HEDGE_DELAY = float(os.getenv("ROUTER_HEDGE_DELAY", "8"))
+MIN_HEDGE_DELAY = float(os.getenv("ROUTER_MIN_HEDGE_DELAY", "1"))
+MIN_PERCENTILE_SAMPLES = 10
+LATENCY_WINDOW = 100
+
+
+class ModelStats:
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.wins = 0
+        self.cancelled = 0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.requests += 1
+        self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if not ok:
+            self.errors += 1
+            return
+        self.recent.append(latency)
+        self.latency = latency if self.latency is None else self.latency + EWMA_ALPHA * (latency - self.latency)
+
+    def record_cancelled(self, elapsed: float) -> None:
+        """Count a request cancelled after elapsed seconds, whose latency is only known to be at least that.
+
+        The lower bound can only raise the latency average, so a model that keeps losing hedges ranks
+        lower; it never lowers it and stays out of the samples behind the hedge percentile.
+        """
+        self.cancelled += 1
+        if self.latency is not None and elapsed > self.latency:
+            self.latency += EWMA_ALPHA * (elapsed - self.latency)
+
+    def score(self) -> float:
+        """Expected cost of sending a request here; lower is better"""
+        if self.latency is None:
+            return math.inf
+        return self.latency / max(0.05, 1.0 - self.error_rate)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if len(self.recent) < MIN_PERCENTILE_SAMPLES:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self) -> Dict:
+        return {
+            "ewma_latency": self.latency,
+            "ewma_error_rate": self.error_rate,
+            "requests": self.requests,
+            "errors": self.errors,
+            "hedges": self.hedges,
+            "wins": self.wins,
+            "cancelled": self.cancelled,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+        }
+
+
+class ModelRouter:
+    """Latency-aware routing with hedged requests across interchangeable models.
+
+    Models are ranked by their EWMA latency inflated by their EWMA error rate,
+    with unmeasured models tried after measured ones in configuration order. A
+    request goes to the best model; if it fails, the next model is tried at once,
+    and if it is still running after the primary's percentile deadline a hedged
+    request is sent to the next model. The first valid response wins and the
+    other request is cancelled.
+    """
+
+    def __init__(self, models: Sequence[str], hedge_percentile: float = HEDGE_PERCENTILE,
+                 hedge_delay: float = HEDGE_DELAY, max_attempts: int = 2):
+        self.models = list(models)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.max_attempts = max(1, min(max_attempts, len(self.models)))
+        self.stats = {model: ModelStats() for model in self.models}
+
+    def ranked(self) -> List[str]:
+        order = {model: position for position, model in enumerate(self.models)}
+        return sorted(self.models, key=lambda model: (self.stats[model].score(), order[model]))
+
+    def deadline(self, model: str) -> float:
+        percentile = self.stats[model].percentile(self.hedge_percentile)
+        return max(MIN_HEDGE_DELAY, percentile if percentile is not None else self.hedge_delay)
+
+    async def run(self, attempt: Callable[[str], Awaitable]) -> Tuple[object, str]:
+        """Call attempt(model) with hedging and failover; return (result, winning model).
+
+        attempt must raise if the response is unusable, so that a failed or invalid
+        response moves on to the next model instead of winning.
+        """
+        candidates = self.ranked()[:self.max_attempts]
+        pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+        last_error: Optional[BaseException] = None
+
+        def launch() -> None:
+            model = candidates.pop(0)
+            task = asyncio.create_task(attempt(model))
+            pending[task] = (model, time.monotonic())
+
+        launch()
+        primary = next(iter(pending.values()))[0]
+        deadline = time.monotonic() + self.deadline(primary)
+        try:
+            while pending:
+                timeout = max(0.0, deadline - time.monotonic()) if candidates else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The primary is slower than usual: hedge with the next model
+                    self.stats[candidates[0]].hedges += 1
+                    print(f"Hedging request to {candidates[0]} after {self.deadline(primary):.1f}s")
+                    launch()
+                    continue
+                for task in done:
+                    model, started = pending.pop(task)
+                    error = task.exception()
+                    self.stats[model].record(time.monotonic() - started, error is None)
+                    if error is None:
+                        self.stats[model].wins += 1
+                        return task.result(), model
+                    print(f"Request to {model} failed: {error}")
+                    last_error = error
+                if candidates and len(pending) == 0:
+                    # Fail over straight away rather than waiting for the hedge deadline
+                    launch()
+        finally:
+            for task, (model, started) in pending.items():
+                task.cancel()
+                self.stats[model].record_cancelled(time.monotonic() - started)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        raise last_error or RuntimeError("No model available")
+
+    def error_rate(self) -> float:
+        """EWMA error rate of the healthiest measured model; high only when every model is failing"""
+        rates = [stats.error_rate for stats in self.stats.values() if stats.requests]
+        return min(rates) if rates else 0.0
+
+    def snapshot(self) -> Dict:
+        return {model: self.stats[model].snapshot() for model in self.ranked()}
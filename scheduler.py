@@ -0,0 +1,120 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from metrics import observe
+from tracing import record
+
+PRIORITY_CLASSES = ("HIGH", "MEDIUM", "LOW")
+
+# Aging: a request is ordered by its enqueue time plus its class offset, so a LOW call that
+# has waited longer than the offset difference overtakes a HIGH call that just arrived
+PRIORITY_OFFSETS = {
+    "HIGH": 0.0,
+    "MEDIUM": float(os.getenv("SCHEDULER_MEDIUM_OFFSET", "30")),
+    "LOW": float(os.getenv("SCHEDULER_LOW_OFFSET", "90")),
+}
+
+
+def priority_class(priority) -> str:
+    """Map a criticality value to a scheduler class, treating anything unknown as MEDIUM"""
+    priority = str(priority or "").strip().upper()
+    return priority if priority in PRIORITY_CLASSES else "MEDIUM"
+
+
+class ClassStats:
+    def __init__(self):
+        self.depth = 0
+        self.served = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_total = 0.0
+
+    def snapshot(self) -> Dict:
+        return {
+            "depth": self.depth,
+            "served": self.served,
+            "avg_wait": self.wait_total / self.served if self.served else 0.0,
+            "max_wait": self.wait_max,
+            "avg_service": self.service_total / self.served if self.served else 0.0,
+        }
+
+
+class PriorityScheduler:
+    """Admission queue that hands out max_concurrency slots in priority order.
+
+    Waiting requests are kept in a heap keyed by enqueue time plus their class
+    offset, so probable HIGH calls reach the LLM first while LOW calls still age
+    their way to the front instead of starving.
+    """
+
+    def __init__(self, max_concurrency: int, offsets: Dict[str, float] = PRIORITY_OFFSETS):
+        self.max_concurrency = max_concurrency
+        self.offsets = offsets
+        self.running = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.classes = {name: ClassStats() for name in PRIORITY_CLASSES}
+
+    @asynccontextmanager
+    async def slot(self, priority="MEDIUM"):
+        """Wait for a slot in priority order and hold it for the duration of the block"""
+        name = priority_class(priority)
+        stats = self.classes[name]
+        enqueued = time.monotonic()
+
+        if self.running < self.max_concurrency and not self.waiting:
+            self.running += 1
+        else:
+            granted = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiting, (enqueued + self.offsets.get(name, 0.0), next(self.sequence), name, granted))
+            stats.depth += 1
+            try:
+                await granted
+            except asyncio.CancelledError:
+                if granted.done() and not granted.cancelled():
+                    # The slot was handed over just as we were cancelled; pass it on
+                    self._release()
+                else:
+                    # Still queued; the entry is skipped when it reaches the top of the heap
+                    stats.depth -= 1
+                raise
+
+        waited = time.monotonic() - enqueued
+        observe("summary_queue", waited)
+        record("summary_queue", time.time() - waited, waited, priority=name)
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            stats.served += 1
+            stats.service_total += time.monotonic() - started
+            self._release()
+
+    def _release(self) -> None:
+        while self.waiting:
+            _, _, name, granted = heapq.heappop(self.waiting)
+            if granted.done():
+                continue
+            # Hand the slot straight to the next request, so running stays the same
+            self.classes[name].depth -= 1
+            granted.set_result(None)
+            return
+        self.running -= 1
+
+    def depth(self) -> int:
+        """Requests waiting for a slot"""
+        return sum(stats.depth for stats in self.classes.values())
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "max_concurrency": self.max_concurrency,
+            "classes": {name: stats.snapshot() for name, stats in self.classes.items()},
+        }
@@ -1,26 +1,40 @@
-from fastapi import FastAPI
-from sqlite3 import connect
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+import metrics
+from storage import get_storage
 
 app = FastAPI()
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than raw path, so unknown paths cannot blow up the series count
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    if path != "/metrics":
+        metrics.observe(f"http {request.method} {path}", time.perf_counter() - started)
+    return response
+
+@app.get("/metrics")
+def get_metrics():
+    # Prometheus text for this server plus the snapshots published by the voice supervisor, UI and agents
+    return PlainTextResponse(metrics.collect("server"), media_type="text/plain; version=0.0.4")
+
 @app.get("/conversations")
 def get_conversations():
-    conn = connect("conversation.db")
-    c = conn.cursor()
-    c.execute("SELECT * FROM conversations")
-    conversations = c.fetchall()
-    conn.close()
+    with metrics.stage("db_fetch"):
+        conversations = get_storage().fetch_conversations()
     return {"conversations": conversations}
 
 @app.post("/conversation")
 def add_conversation(data: dict):
-    conn = connect("conversation.db")
-    c = conn.cursor()
-    c.execute("INSERT INTO conversations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", 
-              (data['uid'], data['conversation'], data['timestamp'], 
-               data['summary'], data['criticality'], data['isSpam'], 
-               data['user'], data['location']))
-    conn.commit()
-    conn.close()
+    with metrics.stage("db_insert"):
+        get_storage().insert_conversation(
+            (data['uid'], data['conversation'], data['timestamp'],
+             data['summary'], data['criticality'], data['isSpam'],
+             data['user'], data['location']))
     return {"status": "success"}
-
@@ -0,0 +1,285 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", "conversation.db")
+# How long a writer waits for another connection's lock before giving up
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Column order of the conversations table; callers index rows positionally
+CONVERSATION_COLUMNS = ("uid", "conversation", "timestamp", "summary", "criticality", "isSpam", "user", "location")
+# Typed columns derived from the ones above, appended by migration 2 so positions 0-7 never move
+DERIVED_COLUMNS = ("ts_epoch", "criticality_level", "is_spam", "department", "word_count")
+_COLUMN_LIST = ", ".join(CONVERSATION_COLUMNS)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+CRITICALITY_LEVELS = {"LOW": 1, "MEDIUM": 2, "HIGH": 3}
+# Rows per transaction when backfilling derived columns, so writers are never blocked for long
+BACKFILL_BATCH_SIZE = 500
+
+# Statements are kept as constants so sqlite3's per-connection statement cache reuses them
+CREATE_CONVERSATIONS = '''CREATE TABLE IF NOT EXISTS conversations
+              (uid text, conversation text, timestamp text, summary text, criticality text, isSpam bool, user text, location text)'''
+INSERT_CONVERSATION = (f"INSERT INTO conversations ({_COLUMN_LIST}, {', '.join(DERIVED_COLUMNS)}, needs_refinement) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+# Rewrites a call's analysis in place; the call's original timestamp is kept
+UPDATE_CONVERSATION = ("UPDATE conversations SET conversation = ?, summary = ?, criticality = ?, isSpam = ?, user = ?, "
+                       "location = ?, criticality_level = ?, is_spam = ?, department = ?, word_count = ?, "
+                       "needs_refinement = ? WHERE uid = ?")
+SELECT_CONVERSATIONS = f"SELECT {_COLUMN_LIST} FROM conversations ORDER BY ts_epoch DESC"
+SELECT_CONVERSATION = f"SELECT {_COLUMN_LIST} FROM conversations WHERE uid = ?"
+# Active calls queue: calls since a cutoff or still preliminary, most critical first, newest first within a level
+SELECT_ACTIVE_CONVERSATIONS = (f"SELECT {_COLUMN_LIST} FROM conversations WHERE ts_epoch >= ? OR needs_refinement = 1 "
+                               "ORDER BY criticality_level DESC, ts_epoch DESC LIMIT ?")
+UPDATE_ANALYSIS = ("UPDATE conversations SET summary = ?, criticality = ?, isSpam = ?, "
+                   "criticality_level = ?, is_spam = ?, needs_refinement = 0 WHERE rowid = ?")
+SELECT_UNTYPED = ("SELECT rowid, timestamp, criticality, isSpam, conversation FROM conversations "
+                  "WHERE ts_epoch IS NULL AND rowid > ? ORDER BY rowid LIMIT ?")
+UPDATE_DERIVED = "UPDATE conversations SET ts_epoch = ?, criticality_level = ?, is_spam = ?, word_count = ? WHERE rowid = ?"
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    # WAL makes NORMAL durable across application crashes; only power loss can drop the last commits
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA mmap_size=67108864",
+)
+
+
+def timestamp_epoch(timestamp: Optional[str]) -> Optional[int]:
+    """Convert the local-time text timestamp stored with each call to epoch seconds"""
+    try:
+        return int(time.mktime(datetime.strptime(str(timestamp), TIMESTAMP_FORMAT).timetuple()))
+    except (TypeError, ValueError):
+        return None
+
+
+def criticality_level(criticality: Optional[str]) -> int:
+    """Map HIGH/MEDIUM/LOW to 3/2/1, and anything else to 0"""
+    return CRITICALITY_LEVELS.get(str(criticality or "").strip().upper(), 0)
+
+
+def spam_flag(is_spam) -> int:
+    return 1 if str(is_spam).strip().lower() in ("1", "true") else 0
+
+
+def word_count(conversation: Optional[str]) -> int:
+    return len(str(conversation).split()) if conversation else 0
+
+
+def derived_values(timestamp, criticality, is_spam, conversation) -> Tuple:
+    return (timestamp_epoch(timestamp), criticality_level(criticality), spam_flag(is_spam), word_count(conversation))
+
+
+def _create_conversations(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_CONVERSATIONS)
+
+
+def _add_derived_columns(conn: sqlite3.Connection) -> None:
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+    for name, column_type in zip(DERIVED_COLUMNS, ("integer", "integer", "integer", "text", "integer")):
+        # ADD COLUMN only touches the schema, so this is instant even on large tables
+        if name not in existing:
+            conn.execute(f"ALTER TABLE conversations ADD COLUMN {name} {column_type}")
+
+
+def _create_indexes(conn: sqlite3.Connection) -> None:
+    # fetch_conversations: newest first
+    conn.execute("CREATE INDEX IF NOT EXISTS conversations_ts ON conversations (ts_epoch DESC)")
+    # update_analytics: every aggregate over a time window is answered from this index alone
+    conn.execute('''CREATE INDEX IF NOT EXISTS conversations_analytics
+                    ON conversations (ts_epoch, criticality_level, is_spam, word_count, location)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS conversations_uid ON conversations (uid)")
+
+
+def _add_refinement_flag(conn: sqlite3.Connection) -> None:
+    # Set on records committed from local triage when the LLM missed the processing deadline
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+    if "needs_refinement" not in existing:
+        conn.execute("ALTER TABLE conversations ADD COLUMN needs_refinement integer NOT NULL DEFAULT 0")
+    # Partial index: only the few preliminary rows are indexed, already in rowid order
+    conn.execute('''CREATE INDEX IF NOT EXISTS conversations_needs_refinement
+                    ON conversations (needs_refinement) WHERE needs_refinement = 1''')
+
+
+# Schema migrations in order; PRAGMA user_version records how many have been applied
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _create_conversations),
+    (2, _add_derived_columns),
+    (3, _create_indexes),
+    (4, _add_refinement_flag),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+class Storage:
+    """Shared access to the conversations database.
+
+    Each thread gets one persistent connection, opened on first use in WAL mode, so
+    the UI and the API server can read while the voice pipeline writes instead of
+    stalling on "database is locked". Connections are reused for the life of the
+    process and closed together by close().
+    """
+
+    def __init__(self, path: str = CONVERSATION_DB):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections: List[sqlite3.Connection] = []
+        self.schema_ready = False
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=128,
+                                   check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            with self.lock:
+                self.connections.append(conn)
+                if not self.schema_ready:
+                    self.migrate(conn)
+                    self.backfill(conn)
+                    self.schema_ready = True
+            self.local.conn = conn
+        return conn
+
+    def migrate(self, conn: sqlite3.Connection) -> int:
+        """Apply pending migrations in place and return the schema version"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in MIGRATIONS:
+            if target <= version:
+                continue
+            # BEGIN IMMEDIATE serializes concurrent migrators; re-check the version once we hold the lock
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if target > version:
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version = {target}")
+                    version = target
+                    print(f"Migrated conversations database to version {target}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return version
+
+    def backfill(self, conn: sqlite3.Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+        """Fill the typed columns of rows written before migration 2, one short transaction per batch"""
+        last_rowid = 0
+        filled = 0
+        while True:
+            rows = conn.execute(SELECT_UNTYPED, (last_rowid, batch_size)).fetchall()
+            if not rows:
+                break
+            with conn:
+                conn.executemany(UPDATE_DERIVED, [
+                    derived_values(timestamp, criticality, is_spam, conversation) + (rowid,)
+                    for rowid, timestamp, criticality, is_spam, conversation in rows])
+            last_rowid = rows[-1][0]
+            filled += len(rows)
+        if filled:
+            print(f"Backfilled typed columns for {filled} conversations")
+        return filled
+
+    @contextmanager
+    def transaction(self):
+        """Commit the enclosed statements together, or roll them all back on error"""
+        conn = self.connection()
+        with conn:
+            yield conn
+
+    def query(self, sql: str, params: Sequence = ()) -> List[Tuple]:
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: Sequence = ()) -> Optional[Tuple]:
+        return self.connection().execute(sql, params).fetchone()
+
+    def execute(self, sql: str, params: Sequence = ()) -> int:
+        with self.transaction() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def executemany(self, sql: str, rows: Iterable[Sequence]) -> int:
+        with self.transaction() as conn:
+            return conn.executemany(sql, rows).rowcount
+
+    def insert_conversation(self, values: Sequence, department: str = "Unknown",
+                            needs_refinement: bool = False) -> None:
+        """Insert a row given in CONVERSATION_COLUMNS order, filling in the typed columns"""
+        uid, conversation, timestamp, summary, criticality, is_spam, user, location = values
+        ts_epoch, level, spam, words = derived_values(timestamp, criticality, is_spam, conversation)
+        self.execute(INSERT_CONVERSATION,
+                     tuple(values) + (ts_epoch, level, spam, department, words, int(needs_refinement)))
+
+    def save_conversation(self, values: Sequence, department: str = "Unknown", needs_refinement: bool = False,
+                          replace: bool = True) -> bool:
+        """Store a call once per uid: update its existing row if there is one, otherwise insert it.
+
+        With replace=False an existing row is left alone. Returns True if a row was written.
+        """
+        uid, conversation, timestamp, summary, criticality, is_spam, user, location = values
+        ts_epoch, level, spam, words = derived_values(timestamp, criticality, is_spam, conversation)
+        conn = self.connection()
+        # BEGIN IMMEDIATE so the pipeline and the UI's deadline fallback cannot both insert the same call
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM conversations WHERE uid = ?", (uid,)).fetchone():
+                if not replace:
+                    conn.rollback()
+                    return False
+                conn.execute(UPDATE_CONVERSATION, (conversation, summary, criticality, is_spam, user, location,
+                                                   level, spam, department, words, int(needs_refinement), uid))
+            else:
+                conn.execute(INSERT_CONVERSATION, tuple(values) + (ts_epoch, level, spam, department, words,
+                                                                   int(needs_refinement)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return True
+
+    def update_analysis(self, rows: Iterable[Tuple]) -> int:
+        """Rewrite summary, criticality and isSpam for (summary, criticality, isSpam, rowid) tuples"""
+        return self.executemany(UPDATE_ANALYSIS, [
+            (summary, criticality, is_spam, criticality_level(criticality), spam_flag(is_spam), rowid)
+            for summary, criticality, is_spam, rowid in rows])
+
+    def fetch_conversations(self) -> List[Tuple]:
+        return self.query(SELECT_CONVERSATIONS)
+
+    def fetch_conversation(self, uid: str) -> Optional[Tuple]:
+        return self.query_one(SELECT_CONVERSATION, (uid,))
+
+    def fetch_active_conversations(self, since_epoch: int, limit: int) -> List[Tuple]:
+        """Up to limit calls made since since_epoch or awaiting refinement, ordered by criticality"""
+        return self.query(SELECT_ACTIVE_CONVERSATIONS, (since_epoch, limit))
+
+    def close(self) -> None:
+        with self.lock:
+            for conn in self.connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self.connections = []
+        self.local = threading.local()
+
+
+storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """Return the process-wide storage for the conversations database"""
+    global storage
+    with _storage_lock:
+        if storage is None:
+            storage = Storage()
+        return storage
@@ -0,0 +1,115 @@
+import json
+from typing import Callable, Dict, Iterable, Optional
+
+
+class IncrementalJSONParser:
+    """Incremental parser for a JSON object streamed from an LLM in arbitrary chunks.
+
+    Text before the first '{' and after the matching '}' is ignored, which repairs the
+    usual "Here is the JSON: {...}" responses without rescanning the whole reply. Each
+    top-level field is decoded as soon as its value is complete; on_field is called
+    for every field, and on_watch once all watched fields are available.
+    """
+
+    def __init__(self, watch: Iterable[str] = (), on_field: Optional[Callable] = None,
+                 on_watch: Optional[Callable] = None):
+        self.watch = set(watch)
+        self.on_field = on_field
+        self.on_watch = on_watch
+        self.watch_fired = False
+        self.fields: Dict = {}
+        self.buffer = []
+        self.stack = []
+        self.started = False
+        self.complete = False
+        self.in_string = False
+        self.escape = False
+        self.expect_key = True
+        self.key = None
+        self.key_start = None
+        self.value_start = None
+
+    def feed(self, text: str) -> None:
+        for char in text:
+            if self.complete:
+                return
+            if not self.started:
+                if char != '{':
+                    continue
+                self.started = True
+
+            position = len(self.buffer)
+            self.buffer.append(char)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if len(self.stack) == 1 and self.expect_key and self.key_start is not None:
+                        self.key = self._decode(self.key_start, position + 1)
+                        self.key_start = None
+                continue
+
+            if char == '"':
+                self.in_string = True
+                if len(self.stack) == 1 and self.expect_key:
+                    self.key_start = position
+            elif char in '{[':
+                self.stack.append(char)
+            elif char in '}]':
+                if len(self.stack) == 1:
+                    self._end_value(position)
+                if self.stack:
+                    self.stack.pop()
+                if not self.stack:
+                    self.complete = True
+            elif len(self.stack) == 1:
+                if char == ':':
+                    self.expect_key = False
+                    self.value_start = position + 1
+                elif char == ',':
+                    self._end_value(position)
+
+    def _decode(self, start: int, end: int):
+        return json.loads("".join(self.buffer[start:end]))
+
+    def _end_value(self, position: int) -> None:
+        if self.key is not None and self.value_start is not None:
+            raw = "".join(self.buffer[self.value_start:position]).strip()
+            if raw:
+                try:
+                    self._set_field(self.key, json.loads(raw))
+                except json.JSONDecodeError:
+                    print(f"Skipping malformed value for field {self.key}: {raw[:50]}")
+        self.key = None
+        self.value_start = None
+        self.expect_key = True
+
+    def _set_field(self, key: str, value) -> None:
+        self.fields[key] = value
+        if self.on_field:
+            self.on_field(key, value)
+        if self.on_watch and not self.watch_fired and self.watch and self.watch.issubset(self.fields):
+            self.watch_fired = True
+            self.on_watch({field: self.fields[field] for field in self.watch})
+
+    def finish(self) -> Optional[Dict]:
+        """Return the parsed object, closing a truncated response where possible"""
+        if not self.started:
+            return None
+        if self.complete:
+            try:
+                return json.loads("".join(self.buffer))
+            except json.JSONDecodeError:
+                return dict(self.fields) if self.fields else None
+
+        # Truncated stream: finish the open string and containers, then try again
+        repaired = "".join(self.buffer) + ('"' if self.in_string else "")
+        repaired += "".join('}' if opener == '{' else ']' for opener in reversed(self.stack))
+        try:
+            return json.loads(repaired)
+        except json.JSONDecodeError:
+            return dict(self.fields) if self.fields else None
@@ -0,0 +1,428 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Sequence, Tuple
+
+from admission import AdmissionController
+from compaction import compact_transcript
+from metrics import observe, stage
+from routing import ModelRouter
+from scheduler import PriorityScheduler
+from stream_json import IncrementalJSONParser
+from summary_cache import SummaryCache, cache_key
+from tracing import span
+from transcript import TranscriptLog
+
+if TYPE_CHECKING:
+    # groq and httpx take longer to import than the rest of the voice process; they load on the first summary
+    from groq import AsyncGroq, Groq
+
+SUMMARY_MODEL = 'llama3-8b-8192'
+# Interchangeable Groq models the async service routes between, primary first
+SUMMARY_MODELS = [model.strip() for model in
+                  os.getenv("SUMMARY_MODELS", f"{SUMMARY_MODEL},llama-3.1-8b-instant").split(",") if model.strip()]
+# Bump when the prompt semantics change; cached summaries are keyed on it
+PROMPT_VERSION = "1"
+
+SYSTEM_PROMPT = """You must analyze the conversation carefully and respond with a valid JSON object containing exactly these fields:
+{
+  "summary": "A brief summary of the conversation",
+  "criticality": "Criticality of the emergency call using these guidelines: HIGH (immediate life-threatening situations, major fires, violent crimes in progress), MEDIUM (non-life threatening injuries, property damage, ongoing but non-violent crimes), LOW (minor incidents, information requests, non-emergency situations)",
+  "isSpam": "True if the call appears to be a prank, contains no actual emergency, is deliberately misleading, or the caller is not serious. False for genuine emergency calls",
+  "department": "Department name (Fire, Police, Medical, or combination if multiple services needed)",
+  "user": "User name (Unknown if not provided)",
+  "location": "User location (Unknown if not provided)"
+}
+Carefully examine the conversation context to accurately determine criticality and spam status. Do not default to HIGH criticality unless truly warranted by the situation described. Do not include any other text or formatting."""
+
+ROLLING_PROMPT = SYSTEM_PROMPT + """
+The call is still in progress. You will receive the current analysis as JSON followed by the newest part of the transcript.
+Return the updated JSON object with the same fields. Keep details from the current analysis unless the new transcript corrects or adds to them, and write the summary for the whole call so far."""
+
+# Fields reported through on_early as soon as they have streamed in
+EARLY_FIELDS = ("criticality", "isSpam")
+
+# Minimum amount of new transcript text before a rolling update is worth an LLM call
+ROLLING_MIN_CHARS = int(os.getenv("ROLLING_MIN_CHARS", "200"))
+
+# Maximum number of summaries in flight at once, and HTTP connections kept alive for them
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_KEEPALIVE = int(os.getenv("SUMMARY_KEEPALIVE", "8"))
+
+client = None
+service = None
+cache = None
+
+
+def get_client() -> "Groq":
+    """Create the Groq client on first use"""
+    global client
+    if client is None:
+        from groq import Groq
+        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    return client
+
+
+def preload_clients() -> None:
+    """Import the Groq client modules ahead of the first summary; call off the startup path"""
+    import groq  # noqa: F401
+    import httpx  # noqa: F401
+
+
+def get_cache() -> SummaryCache:
+    """Open the shared summary cache on first use"""
+    global cache
+    if cache is None:
+        cache = SummaryCache()
+    return cache
+
+
+def prompt_version(system_prompt: str) -> str:
+    # Include a hash of the prompt so any wording change also invalidates cached summaries
+    return f"{PROMPT_VERSION}-{hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()[:12]}"
+
+
+def cached_summary(conversation_text: str, system_prompt: str,
+                   models: Sequence[str] = (SUMMARY_MODEL, *SUMMARY_MODELS)) -> Optional[Dict]:
+    """A cached summary of the transcript by any of models, which are all allowed to answer it"""
+    version = prompt_version(system_prompt)
+    try:
+        return get_cache().get_any([cache_key(conversation_text, model, version) for model in dict.fromkeys(models)])
+    except Exception as e:
+        print(f"Error reading summary cache: {e}")
+        return None
+
+
+def store_summary(conversation_text: str, system_prompt: str, result: Dict, model: str) -> None:
+    """Cache result under the model that actually produced it"""
+    # Fallback records describe a failure, not the transcript, so they are never cached
+    if is_fallback_summary(result):
+        return
+    version = prompt_version(system_prompt)
+    try:
+        get_cache().put(cache_key(conversation_text, model, version), result, model, version)
+    except Exception as e:
+        print(f"Error writing summary cache: {e}")
+
+
+def is_fallback_summary(result: Dict) -> bool:
+    return str(result.get("summary", "")).startswith(("Error processing", "Unable to"))
+
+
+def normalize_summary(json_data: Dict):
+    """Return (json_data, is_spam) with criticality normalized to HIGH/MEDIUM/LOW"""
+    # Convert string "True"/"False" to boolean for isSpam
+    try:
+        is_spam = True if str(json_data["isSpam"]).lower() == "true" else False
+    except (KeyError, AttributeError) as e:
+        print(f"Error processing isSpam value: {e}")
+        is_spam = True  # Default to True for safety
+
+    try:
+        # Ensure criticality is one of the expected values
+        valid_criticalities = ["HIGH", "MEDIUM", "LOW"]
+        if json_data.get("criticality", "").upper() not in valid_criticalities:
+            print(f"Invalid criticality value: {json_data.get('criticality')}")
+            json_data["criticality"] = "LOW"  # Default to low if invalid
+        else:
+            # Normalize to uppercase
+            json_data["criticality"] = json_data["criticality"].upper()
+    except Exception as e:
+        print(f"Error processing criticality: {e}")
+        json_data["criticality"] = "LOW"  # Default to low
+
+    return json_data, is_spam
+
+
+def default_summary(summary: str) -> Dict:
+    return {
+        "summary": summary,
+        "criticality": "LOW",
+        "isSpam": "True",
+        "department": "Unknown",
+        "user": "Unknown",
+        "location": "Unknown"
+    }
+
+
+def parse_summary_response(response_content: str) -> Dict:
+    """Parse the model's JSON response, repairing responses with surrounding or truncated text"""
+    parser = IncrementalJSONParser()
+    parser.feed(response_content)
+    return finish_summary(parser)
+
+
+def finish_summary(parser: IncrementalJSONParser) -> Dict:
+    with stage("json_repair"):
+        json_data = parser.finish()
+    if json_data is None:
+        print("Could not extract JSON, creating default response...")
+        return default_summary("Unable to determine details from conversation")
+    if not isinstance(json_data, dict):
+        print("Response JSON is not an object, using default JSON data")
+        return default_summary("Unable to parse conversation details")
+    print("Successfully parsed JSON data")
+    return json_data
+
+
+def compact_for_summary(conversation_text: str, uid: str = "") -> Tuple[str, Dict]:
+    """Strip tags and filler and fit the transcript to the summary model's token budget"""
+    compacted, report = compact_transcript(conversation_text, SUMMARY_MODEL)
+    call = f" for call {uid}" if uid else ""
+    print(f"Compacted transcript{call}: {report['original_tokens']} -> {report['compacted_tokens']} tokens "
+          f"(saved {report['saved_tokens']}, {report['omitted_utterances']} utterances omitted)")
+    return compacted, report
+
+
+def summarize_transcript(conversation_text: str, system_prompt: str = SYSTEM_PROMPT) -> Dict:
+    """Summarize a transcript with a single LLM call, falling back to a default record on errors"""
+    cached = cached_summary(conversation_text, system_prompt)
+    if cached is not None:
+        print("Using cached summary")
+        return cached
+    try:
+        with stage("groq_round_trip"):
+            chat_summary = get_client().chat.completions.create(messages=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": conversation_text
+                }
+            ], model=SUMMARY_MODEL, stream=False)
+
+        print("Received response from model:", chat_summary.choices[0].message.content)
+        result = parse_summary_response(chat_summary.choices[0].message.content)
+        store_summary(conversation_text, system_prompt, result, SUMMARY_MODEL)
+        return result
+    except Exception as model_error:
+        print(f"Error generating summary with model: {model_error}")
+        print("Using default JSON data due to model error")
+        return default_summary("Error processing conversation")
+
+
+class InvalidResponseError(ValueError):
+    """The model answered, but not with a JSON object"""
+
+
+class EarlyFields:
+    """Forward early fields to a callback once, whichever hedged request streams them first"""
+
+    def __init__(self, callback: Callable):
+        self.callback = callback
+        self.fired = False
+
+    def __call__(self, fields: Dict) -> None:
+        if not self.fired:
+            self.fired = True
+            self.callback(fields)
+
+
+class SummarizationService:
+    """Async summarization over a pooled, keep-alive HTTP client.
+
+    At most max_concurrency summaries run at once; the rest wait in a priority queue,
+    so probable HIGH calls are summarized first. Each summary is routed to the
+    fastest healthy model, with a hedged request to the next one when it is slow. submit() returns a future that
+    callers can await or attach a done callback to, so several calls ending
+    together are summarized in parallel.
+    """
+
+    def __init__(self, max_concurrency: int = SUMMARY_CONCURRENCY, max_keepalive: int = SUMMARY_KEEPALIVE):
+        self.max_concurrency = max_concurrency
+        self.max_keepalive = max_keepalive
+        self.scheduler = PriorityScheduler(max_concurrency)
+        self.router = ModelRouter(SUMMARY_MODELS)
+        self.admission = AdmissionController(self.scheduler.depth, self.router.error_rate)
+        self.http_client = None
+        self.client = None
+        self.loop = None
+        self.in_flight = 0
+
+    def _get_client(self) -> "AsyncGroq":
+        if self.client is None:
+            import httpx
+            from groq import AsyncGroq
+            self.http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max(self.max_concurrency, self.max_keepalive),
+                                    max_keepalive_connections=self.max_keepalive,
+                                    keepalive_expiry=120),
+                timeout=httpx.Timeout(60.0, connect=5.0),
+            )
+            self.client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), http_client=self.http_client)
+            self.loop = asyncio.get_running_loop()
+        return self.client
+
+    async def summarize(self, conversation_text: str, system_prompt: str = SYSTEM_PROMPT,
+                        fallback: bool = True, on_early: Optional[Callable] = None,
+                        priority: str = "MEDIUM") -> Dict:
+        """Summarize a transcript, falling back to a default record on errors unless fallback is False.
+
+        The response is streamed through an incremental JSON parser; on_early is called with
+        criticality and isSpam as soon as both are complete, before the summary text finishes.
+        priority is the caller's best guess at the call's criticality and orders the queue.
+        """
+        cached = cached_summary(conversation_text, system_prompt)
+        if cached is not None:
+            print("Using cached summary")
+            if on_early:
+                on_early({field: cached.get(field) for field in EARLY_FIELDS})
+            return cached
+        self._get_client()
+        with span("summarize", priority=priority) as attrs:
+            async with self.scheduler.slot(priority):
+                self.in_flight += 1
+                try:
+                    early = EarlyFields(on_early) if on_early else None
+                    result, model = await self.router.run(
+                        lambda model: self._request(model, conversation_text, system_prompt, early))
+                    print(f"Summary produced by {model}")
+                    attrs["model"] = model
+                    store_summary(conversation_text, system_prompt, result, model)
+                    return result
+                except InvalidResponseError as e:
+                    if not fallback:
+                        raise
+                    print(f"Could not extract JSON ({e}), creating default response...")
+                    return default_summary("Unable to determine details from conversation")
+                except Exception as model_error:
+                    if not fallback:
+                        raise
+                    print(f"Error generating summary with model: {model_error}")
+                    print("Using default JSON data due to model error")
+                    return default_summary("Error processing conversation")
+                finally:
+                    self.in_flight -= 1
+
+    async def _request(self, model: str, conversation_text: str, system_prompt: str,
+                       early: Optional["EarlyFields"]) -> Dict:
+        """Stream one completion from model and return the parsed JSON object"""
+        parser = IncrementalJSONParser(watch=EARLY_FIELDS if early else (), on_watch=early)
+        started = time.perf_counter()
+        with stage("groq_round_trip", model=model):
+            stream = await self.client.chat.completions.create(messages=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": conversation_text
+                }
+            ], model=model, stream=True)
+
+            first_token = True
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        observe("groq_first_token", time.perf_counter() - started)
+                        first_token = False
+                    parser.feed(chunk.choices[0].delta.content)
+                    if parser.complete:
+                        # Anything after the closing brace is commentary we do not need
+                        break
+
+        print(f"Received response from {model}:", "".join(parser.buffer))
+        with stage("json_repair"):
+            result = parser.finish()
+        if not isinstance(result, dict):
+            # Raise so the router fails over to another model instead of accepting this response
+            raise InvalidResponseError(f"{model} did not return a JSON object")
+        return result
+
+    def submit(self, conversation_text: str, system_prompt: str = SYSTEM_PROMPT,
+               callback: Optional[Callable] = None, on_early: Optional[Callable] = None,
+               priority: str = "MEDIUM") -> asyncio.Future:
+        """Schedule a summary on the running loop and return its future"""
+        future = asyncio.ensure_future(self.summarize(conversation_text, system_prompt, on_early=on_early,
+                                                      priority=priority))
+        if callback:
+            future.add_done_callback(callback)
+        return future
+
+    def submit_threadsafe(self, conversation_text: str, system_prompt: str = SYSTEM_PROMPT, priority: str = "MEDIUM"):
+        """Schedule a summary from another thread; returns a concurrent.futures.Future"""
+        if self.loop is None:
+            raise RuntimeError("Summarization service has not been started on an event loop")
+        return asyncio.run_coroutine_threadsafe(
+            self.summarize(conversation_text, system_prompt, priority=priority), self.loop)
+
+    async def close(self) -> None:
+        if self.http_client is not None:
+            await self.http_client.aclose()
+        self.http_client = None
+        self.client = None
+
+
+def get_service() -> SummarizationService:
+    """Return the process-wide summarization service"""
+    global service
+    if service is None:
+        service = SummarizationService()
+    return service
+
+
+class RollingSummarizer:
+    """Keeps a running summary of a live call up to date as transcript chunks arrive.
+
+    Each update sends only the transcript bytes appended since the previous update,
+    together with the current analysis, and merges the result into the running state.
+    At hang-up, finalize() only has to process the last small delta.
+    """
+
+    def __init__(self, uid: str, min_chars: int = ROLLING_MIN_CHARS, service: Optional[SummarizationService] = None):
+        self.uid = uid
+        self.transcript = TranscriptLog(uid)
+        self.min_chars = min_chars
+        self.service = service or get_service()
+        self.offset = 0
+        self.state: Optional[Dict] = None
+        self.updates = 0
+        self.tokens_saved = 0
+        # Queue priority for this call's updates; callers refresh it as triage improves
+        self.priority = "MEDIUM"
+        self.lock = asyncio.Lock()
+
+    async def update(self, force: bool = False) -> bool:
+        """Merge the newest transcript chunk into the running state; returns True if it changed"""
+        async with self.lock:
+            chunk, offset = self.transcript.read_from(self.offset)
+            if not chunk.strip() or (len(chunk) < self.min_chars and not force):
+                return False
+            chunk, report = compact_for_summary(chunk, self.uid)
+            if not chunk.strip():
+                # Nothing but tags and filler; skip it without an LLM call
+                self.offset = offset
+                return False
+
+            if self.state is None:
+                result = await self.service.summarize(chunk, priority=self.priority)
+            else:
+                message = f"Current analysis:\n{json.dumps(self.state)}\n\nNew transcript:\n{chunk}"
+                result = await self.service.summarize(message, ROLLING_PROMPT, priority=self.priority)
+
+            if is_fallback_summary(result):
+                # Leave the offset alone so the chunk is retried on the next update
+                print(f"Rolling summary update failed for call {self.uid}")
+                return False
+
+            self.state = result
+            self.offset = offset
+            self.updates += 1
+            self.tokens_saved += report["saved_tokens"]
+            print(f"Rolling summary for call {self.uid} updated ({self.updates} updates, offset {self.offset})")
+            return True
+
+    async def finalize(self) -> Optional[Dict]:
+        """Process whatever is left of the transcript and return the final analysis"""
+        await self.update(force=True)
+        async with self.lock:
+            chunk, _ = self.transcript.read_from(self.offset)
+            if chunk.strip():
+                # The final delta could not be merged; callers should summarize the full transcript
+                return None
+            return dict(self.state) if self.state else None
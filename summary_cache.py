@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+SUMMARY_CACHE_DB = os.getenv("SUMMARY_CACHE_DB", "summary_cache.db")
+# Maximum number of summaries kept on disk and in memory
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "5000"))
+SUMMARY_CACHE_MEMORY_ENTRIES = int(os.getenv("SUMMARY_CACHE_MEMORY_ENTRIES", "256"))
+# Seconds between last_access updates on disk for a summary that keeps being served from memory
+SUMMARY_CACHE_TOUCH_INTERVAL = float(os.getenv("SUMMARY_CACHE_TOUCH_INTERVAL", "60"))
+
+
+def cache_key(transcript: str, model: str, prompt_version: str) -> str:
+    """Content address of a summary: transcript hash, model name and prompt version"""
+    transcript_hash = hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\0{prompt_version}\0{transcript_hash}".encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """Persistent, size-bounded LRU cache of summary JSON keyed by content address.
+
+    A small in-memory LRU sits in front of the SQLite table, so repeated lookups in
+    the same process rarely touch the disk. The table is shared between processes;
+    memory hits still refresh a row's last_access, at most once per touch_interval,
+    so a summary that stays hot in one process is not the first evicted by another.
+    """
+
+    def __init__(self, path: str = SUMMARY_CACHE_DB, max_entries: int = SUMMARY_CACHE_MAX_ENTRIES,
+                 memory_entries: int = SUMMARY_CACHE_MEMORY_ENTRIES,
+                 touch_interval: float = SUMMARY_CACHE_TOUCH_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.touch_interval = touch_interval
+        # key -> (summary, time last_access was last written to disk)
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.inserts_since_evict = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS summary_cache
+                             (key text PRIMARY KEY, model text, prompt_version text,
+                              summary text, created_at real, last_access real)''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS summary_cache_last_access ON summary_cache (last_access)")
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.get_any([key])
+
+    def get_any(self, keys: Sequence[str]) -> Optional[Dict]:
+        """The summary under the first key that has one, counted as a single lookup"""
+        with self.lock:
+            now = time.time()
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    value, touched = self.memory[key]
+                    if now - touched >= self.touch_interval:
+                        self._touch(key, now)
+                        self.memory[key] = (value, now)
+                    return dict(value)
+
+            rows = dict(self.conn.execute(f"SELECT key, summary FROM summary_cache WHERE key IN "
+                                          f"({', '.join('?' * len(keys))})", tuple(keys)).fetchall())
+            key = next((key for key in keys if key in rows), None)
+            if key is None:
+                self.misses += 1
+                return None
+
+            self._touch(key, now)
+            self.hits += 1
+            value = json.loads(rows[key])
+            self._remember(key, value, now)
+            return dict(value)
+
+    def put(self, key: str, value: Dict, model: str = "", prompt_version: str = "") -> None:
+        now = time.time()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO summary_cache VALUES (?, ?, ?, ?, ?, ?)",
+                              (key, model, prompt_version, json.dumps(value), now, now))
+            self.conn.commit()
+            self._remember(key, dict(value), now)
+
+            # Evict in batches rather than counting rows on every insert
+            self.inserts_since_evict += 1
+            if self.inserts_since_evict >= max(1, self.max_entries // 20):
+                self._evict()
+
+    def _touch(self, key: str, now: float) -> None:
+        self.conn.execute("UPDATE summary_cache SET last_access = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+
+    def _remember(self, key: str, value: Dict, touched: float) -> None:
+        self.memory[key] = (value, touched)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        self.inserts_since_evict = 0
+        count = self.conn.execute("SELECT COUNT(*) FROM summary_cache").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # Trim a little below the limit so the next eviction is not one insert away
+        excess = count - int(self.max_entries * 0.95)
+        self.conn.execute('''DELETE FROM summary_cache WHERE key IN
+                             (SELECT key FROM summary_cache ORDER BY last_access LIMIT ?)''', (excess,))
+        self.conn.commit()
+        self.evictions += excess
+        print(f"Evicted {excess} least recently used summaries from cache")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
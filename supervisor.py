@@ -0,0 +1,317 @@
+import asyncio
+import contextvars
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from hume import HumeVoiceClient, MicrophoneInterface
+
+from control import ControlServer, CONTROL_SOCKET
+from metrics import observe, registry, stage
+from tracing import record, span
+from storage import criticality_level
+from transcript import TranscriptLog, TranscriptTee, current_transcript
+from triage import TriageScanner
+
+# Finished sessions kept around so the UI can still query their final state
+MAX_FINISHED_SESSIONS = 100
+
+CALLS = registry.counter("echolink_calls", "Calls by final state", ("state",))
+
+
+class CallSession:
+    """State and lifecycle of a single Hume EVI session.
+
+    Lifecycle: connecting -> active -> ending -> processing -> completed,
+    or failed from any state.
+    """
+
+    def __init__(self, uid: str):
+        self.uid = uid
+        self.state = "connecting"
+        self.muted = False
+        self.error = None
+        self.history = [("connecting", datetime.now())]
+        self.end_event = asyncio.Event()
+        self.done_event = asyncio.Event()
+        self.mic_interface = None
+        self.transcript = TranscriptLog(uid)
+        self.task = None
+        self.background = None
+        # Preliminary criticality/isSpam, available before the full summary has streamed in
+        self.analysis: Dict = {}
+        # Local keyword triage of the live transcript, available before any LLM call
+        self.triage = TriageScanner()
+        self.triage_offset = 0
+        # perf_counter() marks for the stage metrics
+        self.connected_at = None
+        self.end_requested_at = None
+
+    def set_state(self, state: str) -> None:
+        self.state = state
+        self.history.append((state, datetime.now()))
+        print(f"Call {self.uid} is now {state}")
+        if state in ("completed", "failed"):
+            CALLS.inc(state=state)
+            self.done_event.set()
+
+    @property
+    def finished(self) -> bool:
+        return self.done_event.is_set()
+
+    def update_triage(self) -> Dict:
+        """Feed the caller lines appended since the last check into the triage scanner"""
+        text, self.triage_offset = self.transcript.read_from(self.triage_offset)
+        if text:
+            self.triage.feed_caller(text)
+        return self.triage.result()
+
+    def priority(self, triage: Optional[Dict] = None) -> Dict:
+        """Best current criticality: the LLM's once it has streamed in, the local triage until then"""
+        triage = triage or self.update_triage()
+        if self.analysis.get("criticality"):
+            return {"criticality": str(self.analysis["criticality"]).upper(), "source": "llm"}
+        return {"criticality": triage["criticality"], "department": triage["department"], "source": "triage"}
+
+    def status(self) -> Dict:
+        triage = self.update_triage()
+        started_at = self.history[0][1]
+        ended_at = self.history[-1][1] if self.finished else datetime.now()
+        return {
+            "uid": self.uid,
+            "state": self.state,
+            "muted": self.muted,
+            "error": self.error,
+            "utterances": self.transcript.utterance_count(),
+            "analysis": self.analysis,
+            "triage": triage,
+            "priority": self.priority(triage),
+            "duration": (ended_at - started_at).total_seconds(),
+            "history": [(state, at.isoformat()) for state, at in self.history],
+        }
+
+
+class CallSupervisor:
+    """Runs many EVI sessions as asyncio tasks in one long-lived process.
+
+    The Hume client, imports and environment are set up once; each call only pays
+    for its own socket connection. Calls are started and controlled through the
+    control channel with "start", "end", "mute", "unmute", "status" and "wait".
+    """
+
+    def __init__(self, on_session_started: Optional[Callable] = None,
+                 on_session_ended: Optional[Callable] = None,
+                 api_key: Optional[str] = None, config_id: Optional[str] = None,
+                 control_path: str = CONTROL_SOCKET):
+        self.client = HumeVoiceClient(api_key or os.getenv("HUME_API_KEY"))
+        self.config_id = config_id or os.getenv("CONFIG_ID")
+        # on_session_started runs as a background task for the live call,
+        # on_session_ended runs once the audio has stopped
+        self.on_session_started = on_session_started
+        self.on_session_ended = on_session_ended
+        self.sessions: Dict[str, CallSession] = {}
+        self.control = ControlServer(control_path)
+        self.stopped = asyncio.Event()
+
+        self.control.register("start", self.handle_start)
+        self.control.register("end", self.handle_end)
+        self.control.register("mute", self.handle_mute)
+        self.control.register("unmute", self.handle_mute)
+        self.control.register("status", self.handle_status)
+        self.control.register("wait", self.handle_wait)
+        self.control.register("shutdown", self.handle_shutdown)
+
+    async def serve(self) -> None:
+        """Serve control commands until a shutdown command is received"""
+        original_stdout = sys.stdout
+        # Route each session's chat client output into its own transcript log
+        sys.stdout = TranscriptTee(stream=original_stdout)
+        await self.control.start()
+        try:
+            await self.stopped.wait()
+        finally:
+            await self.shutdown()
+            sys.stdout = original_stdout
+
+    async def shutdown(self) -> None:
+        for session in list(self.sessions.values()):
+            session.end_event.set()
+        tasks = [session.task for session in self.sessions.values() if session.task]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await self.control.close()
+
+    def start_session(self, uid: str) -> CallSession:
+        if uid in self.sessions and not self.sessions[uid].finished:
+            return self.sessions[uid]
+        session = CallSession(uid)
+        self.sessions[uid] = session
+        session.task = asyncio.create_task(self._run_session(session), name=f"call-{uid}")
+        self._prune_finished()
+        return session
+
+    def _prune_finished(self) -> None:
+        finished = [uid for uid, session in self.sessions.items() if session.finished]
+        for uid in finished[:max(0, len(finished) - MAX_FINISHED_SESSIONS)]:
+            del self.sessions[uid]
+
+    async def _run_session(self, session: CallSession) -> None:
+        # Everything the call does, including its background and summary tasks, nests under this span
+        with span("call", uid=session.uid) as attrs:
+            await self._run_call(session)
+            attrs["state"] = session.state
+
+    async def _run_call(self, session: CallSession) -> None:
+        # Tasks spawned by the chat client inherit this context, so their output lands in this call's log
+        token = current_transcript.set(session.transcript.open())
+        connect_started = time.perf_counter()
+        connect_started_epoch = time.time()
+        try:
+            async with self.client.connect(config_id=self.config_id) as socket:
+                try:
+                    session.mic_interface = await MicrophoneInterface.start(socket, allow_user_interrupt=True)
+                    session.connected_at = time.perf_counter()
+                    observe("hume_connect", session.connected_at - connect_started)
+                    record("hume_connect", connect_started_epoch, session.connected_at - connect_started)
+                    if not session.end_event.is_set():
+                        session.set_state("active")
+                    if self.on_session_started:
+                        # Run outside this call's transcript context so its output is not captured
+                        context = contextvars.copy_context()
+                        context.run(current_transcript.set, None)
+                        session.background = asyncio.create_task(self.on_session_started(session), context=context)
+                    await session.end_event.wait()
+                finally:
+                    await self._stop_audio(session, socket)
+        except asyncio.CancelledError:
+            print(f"Call {session.uid} cancelled")
+            session.error = "cancelled"
+        except Exception as e:
+            print(f"Error during call {session.uid}: {e}")
+            session.error = str(e)
+        finally:
+            current_transcript.reset(token)
+            # Waits for the writer thread to sync this call's last utterances, so not on the event loop
+            await asyncio.to_thread(session.transcript.close)
+            now, now_epoch = time.perf_counter(), time.time()
+            if session.connected_at:
+                record("live", now_epoch - (now - session.connected_at), now - session.connected_at,
+                       utterances=session.transcript.utterance_count())
+            if session.connected_at and session.transcript.first_append_at:
+                observe("first_utterance", session.transcript.first_append_at - session.connected_at)
+            if session.end_requested_at:
+                observe("hangup", now - session.end_requested_at)
+                record("hangup", now_epoch - (now - session.end_requested_at), now - session.end_requested_at)
+            # Release anything waiting for the call to end, including after errors
+            session.end_event.set()
+
+        if session.background:
+            # Let the live-call task finish its current step before processing
+            try:
+                await session.background
+            except Exception as e:
+                print(f"Error in background task for call {session.uid}: {e}")
+
+        if session.error:
+            session.set_state("failed")
+            return
+
+        session.set_state("processing")
+        try:
+            if self.on_session_ended:
+                with stage("processing"):
+                    result = self.on_session_ended(session)
+                    if asyncio.iscoroutine(result):
+                        await result
+            session.set_state("completed")
+        except Exception as e:
+            print(f"Error processing call {session.uid}: {e}")
+            session.error = str(e)
+            session.set_state("failed")
+
+    async def _stop_audio(self, session: CallSession, socket) -> None:
+        if session.state != "ending":
+            session.set_state("ending")
+        if session.mic_interface:
+            try:
+                await session.mic_interface.stop()
+                await socket.close()
+            except:
+                # If normal stop fails, force close the socket
+                try:
+                    socket._ws.close()
+                except:
+                    pass
+            print(f"Microphone and socket stopped for call {session.uid}")
+
+    def _get_session(self, request: Dict) -> CallSession:
+        uid = request.get("uid")
+        if uid not in self.sessions:
+            raise KeyError(f"Unknown call: {uid}")
+        return self.sessions[uid]
+
+    def handle_start(self, request):
+        uid = request.get("uid")
+        if not uid:
+            raise ValueError("start requires a uid")
+        return self.start_session(uid).status()
+
+    def handle_end(self, request):
+        session = self._get_session(request)
+        if session.state in ("connecting", "active"):
+            session.set_state("ending")
+        session.end_requested_at = session.end_requested_at or time.perf_counter()
+        session.end_event.set()
+        return {"uid": session.uid, "state": session.state}
+
+    async def handle_mute(self, request):
+        session = self._get_session(request)
+        muted = request.get("command") == "mute"
+        supported = await set_muted(session.mic_interface, muted)
+        if supported:
+            session.muted = muted
+        return {"uid": session.uid, "muted": session.muted, "supported": supported}
+
+    def handle_status(self, request):
+        if request.get("uid"):
+            return self._get_session(request).status()
+        # Live calls first, most critical first, then oldest first within a level
+        statuses = sorted((session.status() for session in self.sessions.values()),
+                          key=lambda status: (status["state"] in ("completed", "failed"),
+                                              -criticality_level(status["priority"]["criticality"]),
+                                              status["history"][0][1]))
+        return {
+            "sessions": statuses,
+            "active": sum(1 for session in self.sessions.values() if not session.finished),
+        }
+
+    async def handle_wait(self, request):
+        """Block the client until the call has been fully processed, or for at most "seconds" if given"""
+        session = self._get_session(request)
+        seconds = request.get("seconds")
+        try:
+            await asyncio.wait_for(session.done_event.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        return session.status()
+
+    def handle_shutdown(self, request):
+        self.stopped.set()
+        return {"active": sum(1 for session in self.sessions.values() if not session.finished)}
+
+
+async def set_muted(mic_interface, muted: bool) -> bool:
+    """Mute or unmute the microphone if the interface supports it"""
+    if mic_interface is None:
+        return False
+    method = getattr(mic_interface, "mute" if muted else "unmute", None)
+    if method is None:
+        print("Microphone interface does not support muting")
+        return False
+    result = method()
+    if asyncio.iscoroutine(result):
+        await result
+    print("Microphone muted" if muted else "Microphone unmuted")
+    return True
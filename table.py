@@ -1,23 +1,19 @@
-import sqlite3
 from tabulate import tabulate
 
-# Connect to the SQLite database
-connection = sqlite3.connect('conversation.db')
+from storage import get_storage
 
-# Create a cursor object
-cursor = connection.cursor()
-
-# Fetch column names
-cursor.execute("PRAGMA table_info(conversations);")
-columns = [column[1] for column in cursor.fetchall()]
+# Open the shared storage for the SQLite database
+storage = get_storage()
 
 # Fetch all rows
-cursor.execute("SELECT * FROM conversations;")
-rows = cursor.fetchall()
+rows = storage.query("SELECT * FROM conversations;")
+
+# Fetch column names
+columns = [column[1] for column in storage.query("PRAGMA table_info(conversations);")]
 
 # Print column names and table contents using tabulate
 print("\nFormatted Contents of 'conversations' Table:")
 print(tabulate(rows, headers=columns, tablefmt="grid"))
 
 # Close the connection
-connection.close()
+storage.close()
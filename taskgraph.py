@@ -0,0 +1,78 @@
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+
+class TaskGraph:
+    """Runs named callables in dependency order on a bounded thread pool.
+
+    A node starts as soon as every node it depends on has finished, so independent
+    nodes overlap and the graph takes about as long as its slowest path instead of
+    the sum of its nodes. Each node is called with {dependency: result} for the
+    dependencies that succeeded; a node that raises is recorded in the errors and
+    its dependents still run with what is left.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, Tuple[Callable[[Dict[str, Any]], Any], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, function: Callable[[Dict[str, Any]], Any], after: Iterable[str] = ()) -> None:
+        if name in self.nodes:
+            raise ValueError(f"Task {name} is already in the graph")
+        self.nodes[name] = (function, tuple(after))
+
+    def order(self) -> List[str]:
+        """Return the nodes in a valid run order, raising ValueError on unknown dependencies or cycles"""
+        remaining = {}
+        for name, (_, after) in self.nodes.items():
+            unknown = [dependency for dependency in after if dependency not in self.nodes]
+            if unknown:
+                raise ValueError(f"Task {name} depends on unknown tasks {unknown}")
+            remaining[name] = set(after)
+
+        ordered = []
+        ready = [name for name, after in remaining.items() if not after]
+        while ready:
+            name = ready.pop(0)
+            ordered.append(name)
+            for other, after in remaining.items():
+                if name in after:
+                    after.discard(name)
+                    if not after:
+                        ready.append(other)
+        if len(ordered) != len(self.nodes):
+            raise ValueError(f"Tasks {sorted(set(self.nodes) - set(ordered))} form a cycle")
+        return ordered
+
+    def run(self, max_workers: int) -> Tuple[Dict[str, Any], Dict[str, BaseException]]:
+        """Run every node with at most max_workers at once; returns (results, errors) by node name"""
+        self.order()
+        results: Dict[str, Any] = {}
+        errors: Dict[str, BaseException] = {}
+        waiting = {name: set(after) for name, (_, after) in self.nodes.items()}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="taskgraph") as pool:
+            def start(name: str) -> None:
+                del waiting[name]
+                function, after = self.nodes[name]
+                upstream = {dependency: results[dependency] for dependency in after if dependency in results}
+                # Each node runs in a copy of the caller's context, so its spans join the caller's trace
+                context = contextvars.copy_context()
+                running[pool.submit(context.run, function, upstream)] = name
+
+            for name in [name for name, after in waiting.items() if not after]:
+                start(name)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        errors[name] = e
+                    for other in [other for other, after in waiting.items() if name in after]:
+                        waiting[other].discard(name)
+                        if not waiting[other]:
+                            start(other)
+        return results, errors
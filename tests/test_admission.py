@@ -0,0 +1,87 @@
+import threading
+
+from admission import FULL, LOCAL_ONLY, REDUCED, AdmissionController, InFlight
+
+
+class Backlog:
+    def __init__(self):
+        self.depth = 0
+        self.error_rate = 0.0
+
+
+def controller(backlog):
+    return AdmissionController(lambda: backlog.depth, lambda: backlog.error_rate, reduced_depth=4, local_depth=12,
+                               recover_ratio=0.5)
+
+
+def levels(admission, backlog, depths):
+    result = []
+    for depth in depths:
+        backlog.depth = depth
+        result.append(admission.level())
+    return result
+
+
+def test_levels_rise_at_their_thresholds():
+    backlog = Backlog()
+    assert levels(controller(backlog), backlog, [0, 3, 4, 11, 12]) == [FULL, FULL, REDUCED, REDUCED, LOCAL_ONLY]
+
+
+def test_a_jump_in_depth_skips_straight_to_local_only():
+    backlog = Backlog()
+    assert levels(controller(backlog), backlog, [0, 20]) == [FULL, LOCAL_ONLY]
+
+
+def test_hysteresis_keeps_a_level_until_depth_is_well_below_it():
+    backlog = Backlog()
+    admission = controller(backlog)
+    # Hovering around the reduced threshold does not flap back to full
+    assert levels(admission, backlog, [4, 3, 4, 3, 2]) == [REDUCED] * 5
+    assert levels(admission, backlog, [1]) == [FULL]
+
+    # Local-only is left below 6, reduced below 2
+    assert levels(admission, backlog, [12, 11, 6, 5, 3, 2, 1]) == [
+        LOCAL_ONLY, LOCAL_ONLY, LOCAL_ONLY, REDUCED, REDUCED, REDUCED, FULL]
+
+
+def test_failing_models_shed_optional_work_with_a_short_queue():
+    backlog = Backlog()
+    admission = controller(backlog)
+    backlog.error_rate = 0.8
+    assert admission.level() == REDUCED
+    backlog.error_rate = 0.1
+    assert admission.level() == FULL
+
+
+def test_admit_counts_per_level_and_snapshot():
+    backlog = Backlog()
+    admission = controller(backlog)
+    for depth in (0, 0, 5, 15):
+        backlog.depth = depth
+        admission.admit()
+    snapshot = admission.snapshot()
+    assert snapshot["admitted"] == {"full": 2, "reduced": 1, "local-only": 1}
+    assert snapshot["name"] == "local-only" and snapshot["depth"] == 15
+    assert snapshot["thresholds"] == {"reduced": 4, "local-only": 12}
+
+
+def test_in_flight_counts_running_work_across_threads():
+    running = InFlight()
+    inside = threading.Barrier(5)
+    seen = []
+
+    def work():
+        with running:
+            inside.wait()
+            seen.append(running())
+            inside.wait()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    inside.wait()
+    seen.append(running())
+    inside.wait()
+    for thread in threads:
+        thread.join()
+    assert seen == [4] * 5 and running() == 0
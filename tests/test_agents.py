@@ -0,0 +1,112 @@
+import json
+import types
+
+import pytest
+
+import agents
+from agents import FIELD_GROUPS, REPORT_TASK, SINGLE_SHOT, CoreCallAnalysisAgents
+
+ANSWER = {
+    "summary": "Kitchen fire at 42 Park Street", "key_points": ["fire", "caller safe"], "critical_info": None,
+    "level": 4, "relative_score": 0.8, "time_sensitivity": "high", "justification": "Active fire",
+    "immediate_actions": ["dispatch engine"], "primary_department": "FIRE", "secondary_departments": ["MEDICAL"],
+    "confidence": 0.9, "notes": "Caller outside", "required_resources": ["engine"], "name": "Ann",
+    "phone": None, "emergency_type": "fire", "key_details": ["kitchen"], "location": "42 Park Street",
+    "landmarks": [], "area_type": "residential", "additional_context": None, "news": [], "news_timestamp": None,
+    "relevance_scores": [], "probability": 0.05, "indicators": [], "spam_confidence": 0.9,
+}
+
+
+class StubCompletion:
+    """Stands in for litellm.completion: answers with the queued JSON objects and records the requested fields"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requested = []
+
+    def __call__(self, model, messages, **kwargs):
+        schema = json.loads(messages[-1]["content"].split("Schema: ", 1)[1].split("\n", 1)[0])
+        self.requested.append(schema["required"])
+        usage = types.SimpleNamespace(prompt_tokens=1000, completion_tokens=200, prompt_tokens_details=None)
+        message = types.SimpleNamespace(content=json.dumps(self.answers.pop(0)))
+        return types.SimpleNamespace(usage=usage, choices=[types.SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def completion(monkeypatch):
+    litellm = pytest.importorskip("litellm")
+
+    def use(*answers):
+        stub = StubCompletion(*answers)
+        monkeypatch.setattr(litellm, "completion", stub)
+        return stub
+
+    return use
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    # The crew is only built for the fallback, which these tests replace
+    monkeypatch.setattr(CoreCallAnalysisAgents, "setup_agents", lambda self: None)
+    return CoreCallAnalysisAgents(mode=SINGLE_SHOT)
+
+
+def test_valid_answer_takes_one_request(analyzer, completion):
+    stub = completion(ANSWER)
+    result = analyzer.analyze_single_shot("You: there is a fire")
+    assert len(stub.requested) == 1
+    assert (result["primary_department"], result["secondary_departments"]) == ("FIRE", ["MEDICAL"])
+    assert result["analysis_usage"]["requests"] == 1 and result["analysis_mode"] == SINGLE_SHOT
+
+
+def test_invalid_group_is_asked_again_once(analyzer, completion):
+    stub = completion(dict(ANSWER, level=9), {field: ANSWER[field] for field in FIELD_GROUPS["assess_urgency"]})
+    result = analyzer.analyze_single_shot("You: there is a fire")
+    assert stub.requested[1] == list(FIELD_GROUPS["assess_urgency"])
+    assert result["level"] == 4 and result["analysis_usage"]["requests"] == 2
+
+
+def test_skipped_optional_group_falls_back_to_defaults(analyzer, completion):
+    stub = completion(dict(ANSWER, news="none found"))
+    result = analyzer.analyze_single_shot("You: there is a fire", skip=agents.OPTIONAL_AGENTS)
+    assert len(stub.requested) == 1
+    assert result["news"] == [] and result["relevance_scores"] == []
+
+
+def test_more_confident_followup_replaces_routing(analyzer, completion):
+    routing = {field: ANSWER[field] for field in FIELD_GROUPS["route_department"]}
+    stub = completion(dict(ANSWER, primary_department="POLICE", confidence=0.3),
+                      dict(routing, confidence=0.8))
+    result = analyzer.analyze_single_shot("You: there is a fire")
+    assert stub.requested[1] == list(FIELD_GROUPS["route_department"])
+    assert (result["primary_department"], result["confidence"]) == ("FIRE", 0.8)
+
+
+@pytest.mark.parametrize("followups", [1, 2])
+def test_low_confidence_routing_falls_back_to_the_crew(analyzer, completion, monkeypatch, tmp_path, followups):
+    monkeypatch.setattr(agents, "SINGLE_SHOT_FOLLOWUPS", followups)
+    routing = {field: ANSWER[field] for field in FIELD_GROUPS["route_department"]}
+    stub = completion(dict(ANSWER, confidence=0.3), *[dict(routing, confidence=0.4)] * followups)
+
+    crew_report = {"summary": "From the crew", "level": 4}
+    crew_tasks = []
+
+    def create_tasks(prompt_text, skip=()):
+        crew_tasks.append(prompt_text)
+        return [types.SimpleNamespace(description=agents.transcript_block(prompt_text) + "Summarize")]
+
+    graph = types.SimpleNamespace(run=lambda concurrency: (
+        {REPORT_TASK: types.SimpleNamespace(raw=json.dumps(crew_report))}, {}))
+    monkeypatch.setattr(analyzer, "create_tasks", create_tasks)
+    monkeypatch.setattr(analyzer, "build_task_graph", lambda tasks, names: graph)
+    monkeypatch.setattr(analyzer, "enhance_location_data", lambda results, text, simulator_data: None)
+
+    transcript = tmp_path / "call-1"
+    transcript.write_text("You: there is a fire at 42 Park Street\n")
+    result = analyzer._analyze_conversation(str(transcript))
+
+    # One first pass, then exactly SINGLE_SHOT_FOLLOWUPS rounds for the routing group only
+    assert len(stub.requested) == 1 + followups
+    assert all(fields == list(FIELD_GROUPS["route_department"]) for fields in stub.requested[1:])
+    assert len(crew_tasks) == 1
+    assert result["summary"] == "From the crew" and result["degradation"] == "full"
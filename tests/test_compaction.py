@@ -0,0 +1,59 @@
+from compaction import compact_transcript, estimate_tokens, token_budget
+
+
+def transcript(lines):
+    return "\n".join(lines) + "\n"
+
+
+def test_cleanup_strips_tags_timestamps_and_repeats():
+    text = transcript([
+        "[10:00:01] EVI: What is your emergency?",
+        "You: help help help help <USER_INTERRUPTION> my house is on   fire",
+        "You: help help help help <USER_INTERRUPTION> my house is on   fire",
+        "<USER_INTERRUPTION>",
+        "[10:00:09] EVI: Where are you?",
+    ])
+    compacted, report = compact_transcript(text, budget=1000)
+    assert compacted == ("EVI: What is your emergency?\n"
+                         "You: help help my house is on fire\n"
+                         "EVI: Where are you?")
+    assert report["omitted_utterances"] == 0
+    assert report["compacted_tokens"] < report["original_tokens"]
+
+
+def test_under_budget_keeps_every_utterance():
+    text = transcript([f"You: sentence number {i}" for i in range(5)])
+    compacted, report = compact_transcript(text, budget=1000)
+    assert compacted.count("You:") == 5 and report["saved_tokens"] == 0
+
+
+def test_operator_lines_are_dropped_before_caller_speech():
+    text = transcript([
+        "EVI: " + "Please stay calm and stay on the line while I get help to you. " * 4,
+        "You: There is a fire in the kitchen",
+        "EVI: Okay.",
+        "You: My son is still inside",
+    ])
+    budget = estimate_tokens("You: There is a fire in the kitchen\nEVI: Okay.\nYou: My son is still inside") + 1
+    compacted, report = compact_transcript(text, budget=budget)
+    assert "stay calm" not in compacted
+    assert "You: There is a fire in the kitchen" in compacted and "You: My son is still inside" in compacted
+    assert "omitted" not in compacted
+    assert report["compacted_tokens"] <= budget
+
+
+def test_caller_speech_is_dropped_from_the_middle_with_a_marker():
+    lines = [f"You: caller utterance number {i:02d} with some detail" for i in range(40)]
+    compacted, report = compact_transcript(transcript(lines), budget=150)
+    kept = compacted.splitlines()
+    assert kept[0] == lines[0] and kept[-1] == lines[-1]
+    assert any(line.startswith("[... ") and line.endswith(" utterances omitted ...]") for line in kept)
+    assert report["compacted_tokens"] <= 150
+    assert report["omitted_utterances"] == 40 - (len(kept) - 1)
+
+
+def test_budgets_per_model():
+    assert token_budget("llama3-8b-8192") == 6000
+    assert token_budget("unknown-model") == token_budget()
+    compacted, report = compact_transcript(transcript(["You: hello"]), model="llama3-8b-8192")
+    assert report["model"] == "llama3-8b-8192" and report["budget"] == 6000
@@ -0,0 +1,47 @@
+import asyncio
+import os
+
+from control import ControlServer, send_command
+
+
+def run_with_server(tmp_path, handlers, client):
+    """Start a server with handlers, run the blocking client in a thread and return its result"""
+    path = str(tmp_path / "control.sock")
+
+    async def scenario():
+        server = ControlServer(path)
+        for command, handler in handlers.items():
+            server.register(command, handler)
+        await server.start()
+        try:
+            return await asyncio.to_thread(client, path)
+        finally:
+            await server.close()
+
+    result = asyncio.run(scenario())
+    assert not os.path.exists(path)
+    return result
+
+
+def test_sync_and_async_handlers(tmp_path):
+    async def mute(request):
+        return {"muted": request["muted"]}
+
+    replies = run_with_server(tmp_path, {"status": lambda request: {"state": "active"}, "mute": mute},
+                              lambda path: (send_command("status", path), send_command("mute", path, muted=True)))
+    assert replies == ({"ok": True, "state": "active"}, {"ok": True, "muted": True})
+
+
+def test_unknown_command_and_handler_error(tmp_path):
+    def fail(request):
+        raise RuntimeError("no such call")
+
+    replies = run_with_server(tmp_path, {"end": fail},
+                              lambda path: (send_command("bogus", path), send_command("end", path)))
+    assert replies == ({"ok": False, "error": "Unknown command: bogus"}, {"ok": False, "error": "no such call"})
+
+
+def test_stale_socket_file_is_replaced(tmp_path):
+    (tmp_path / "control.sock").write_text("left over by a crashed process")
+    reply = run_with_server(tmp_path, {"status": lambda request: None}, lambda path: send_command("status", path))
+    assert reply == {"ok": True}
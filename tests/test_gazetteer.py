@@ -0,0 +1,87 @@
+import csv
+
+import pytest
+
+from gazetteer import Gazetteer, build_index
+
+PLACES = [
+    {"name": "Park Street", "lat": "22.5526", "lon": "88.3520", "kind": "street", "context": "Kolkata", "importance": "0.6"},
+    # The same street split into two ways; it is reported once, at the better entry
+    {"name": "Park Street", "lat": "22.5530", "lon": "88.3540", "kind": "street", "context": "Kolkata", "importance": "0.2"},
+    {"name": "Park Street", "lat": "13.0600", "lon": "80.2500", "kind": "street", "context": "Chennai", "importance": "0.4"},
+    {"name": "Golden Gate Bridge", "lat": "37.8199", "lon": "-122.4783", "kind": "bridge", "context": "San Francisco",
+     "importance": "0.9"},
+    {"name": "Central Park", "lat": "40.7829", "lon": "-73.9654", "kind": "park", "context": "New York", "importance": "0.8"},
+    {"name": "São Paulo Cathedral", "lat": "-23.5511", "lon": "-46.6344", "kind": "church", "context": "", "importance": ""},
+    {"name": "", "lat": "1", "lon": "1"},
+    {"name": "No Coordinates", "lat": "", "lon": "2"},
+]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["name", "lat", "lon", "kind", "context", "importance"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def index(tmp_path):
+    write_csv(tmp_path / "places.csv", PLACES)
+    path = str(tmp_path / "gazetteer.idx")
+    assert build_index(str(tmp_path / "places.csv"), path) == 6
+    gazetteer = Gazetteer(path)
+    yield gazetteer
+    gazetteer.close()
+
+
+def test_exact_name_match(index):
+    best = index.search("Golden Gate Bridge")[0]
+    assert best["name"] == "Golden Gate Bridge" and best["score"] == 1.0
+    assert (best["latitude"], best["longitude"]) == (37.8199, -122.4783)
+
+
+def test_typos_and_case_still_match(index):
+    assert index.search("golden gat brige")[0]["name"] == "Golden Gate Bridge"
+    assert index.search("CENTRAL PARK!")[0]["name"] == "Central Park"
+    assert index.search("sao paulo cathedral")[0]["name"] == "São Paulo Cathedral"
+
+
+def test_context_picks_between_places_with_one_name(index):
+    assert index.search("Park Street Chennai")[0]["context"] == "Chennai"
+    assert index.search("park street, kolkata")[0]["context"] == "Kolkata"
+
+
+def test_split_places_are_reported_once_at_their_best_entry(index):
+    matches = index.search("Park Street Kolkata", limit=5)
+    kolkata = [match for match in matches if match["context"] == "Kolkata"]
+    assert len(kolkata) == 1 and kolkata[0]["latitude"] == 22.5526
+
+
+def test_unrelated_and_empty_queries_find_nothing(index):
+    assert index.search("Eiffel Tower") == []
+    assert index.search("") == [] and index.search("?!") == []
+    assert index.geocode("Eiffel Tower") is None
+
+
+def test_geocode_result_shape(index):
+    assert index.geocode("golden gate bridge san francisco") == {
+        "address": "Golden Gate Bridge, San Francisco", "latitude": 37.8199, "longitude": -122.4783,
+        "kind": "bridge", "score": 1.0}
+
+
+def test_empty_index(tmp_path):
+    write_csv(tmp_path / "empty.csv", [])
+    path = str(tmp_path / "empty.idx")
+    assert build_index(str(tmp_path / "empty.csv"), path) == 0
+    gazetteer = Gazetteer(path)
+    assert gazetteer.count == 0
+    assert gazetteer.search("Park Street") == [] and gazetteer.geocode("Park Street") is None
+    gazetteer.close()
+
+
+def test_rejects_files_that_are_not_an_index(tmp_path):
+    path = tmp_path / "not.idx"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError, match="not a version"):
+        Gazetteer(str(path))
@@ -0,0 +1,109 @@
+import types
+
+import pytest
+
+import geocache
+from geocache import GeocodeCache, normalize_location
+
+PARK_STREET = {"address": "Park Street, Kolkata", "latitude": 22.55, "longitude": 88.35}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(geocache, "time", types.SimpleNamespace(time=clock))
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "geocode_cache.db")
+
+
+def last_access(cache, location):
+    return cache.conn.execute("SELECT last_access FROM geocode_cache WHERE key = ?",
+                              (normalize_location(location),)).fetchone()[0]
+
+
+def test_normalize_location():
+    assert normalize_location("  Park   Street,\tKOLKATA! ") == "park street kolkata"
+
+
+def test_positive_and_negative_entries(path, clock):
+    cache = GeocodeCache(path)
+    assert cache.get("Park Street") is None
+    cache.put("Park Street", PARK_STREET)
+    cache.put("Nowhere Lane", None)
+
+    assert cache.get("park street.") == PARK_STREET
+    assert cache.get("NOWHERE LANE") == {}
+    assert cache.stats()["negative_hits"] == 1 and cache.stats()["misses"] == 1
+
+    # Another process sees both through the table
+    other = GeocodeCache(path)
+    assert other.get("Park Street") == PARK_STREET and other.get("Nowhere Lane") == {}
+
+
+def test_positive_and_negative_ttls(path, clock):
+    cache = GeocodeCache(path, ttl=100, negative_ttl=10)
+    cache.put("Park Street", PARK_STREET)
+    cache.put("Nowhere Lane", None)
+    clock.now += 11
+    assert cache.get("Nowhere Lane") is None
+    assert cache.get("Park Street") == PARK_STREET
+    clock.now += 90
+    assert cache.get("Park Street") is None
+    assert cache.stats()["expired"] == 2
+
+
+def test_memory_entry_expires_but_a_refreshed_row_is_found(path, clock):
+    cache = GeocodeCache(path, ttl=100)
+    cache.put("Park Street", PARK_STREET)
+    clock.now += 50
+    # Another process geocoded it again, so the row outlives this process's memory entry
+    GeocodeCache(path, ttl=100).put("Park Street", PARK_STREET)
+    clock.now += 60
+    assert cache.get("Park Street") == PARK_STREET
+    assert cache.memory_hits == 0
+
+
+def test_lru_eviction_removes_expired_rows_first(path, clock):
+    cache = GeocodeCache(path, ttl=1000, negative_ttl=1, max_entries=20, memory_entries=0)
+    cache.put("gone", None)
+    clock.now += 2
+    for i in range(19):
+        clock.now += 1
+        cache.put(f"place {i}", PARK_STREET)
+    assert cache.get("gone") is None and cache.evictions >= 1
+
+    clock.now += 1
+    cache.get("place 0")
+    for i in range(19, 22):
+        clock.now += 1
+        cache.put(f"place {i}", PARK_STREET)
+    # place 0 was used again, so the next oldest rows went instead
+    assert cache.get("place 0") == PARK_STREET
+    assert cache.get("place 1") is None
+    assert cache.get("place 21") == PARK_STREET
+    assert cache.conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0] <= 20
+
+
+def test_memory_hits_refresh_disk_last_access(path, clock):
+    cache = GeocodeCache(path, touch_interval=60)
+    cache.put("Park Street", PARK_STREET)
+    written = last_access(cache, "Park Street")
+    clock.now += 30
+    cache.get("Park Street")
+    assert last_access(cache, "Park Street") == written
+    clock.now += 31
+    cache.get("Park Street")
+    assert cache.memory_hits == 2
+    assert last_access(cache, "Park Street") == clock.now
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from geocache import GeocodeCache
+from geocoding import GeocodingService, TokenBucket
+
+OFFSETS = {"HIGH": 0.0, "MEDIUM": 30.0, "LOW": 90.0}
+
+
+class Geocoder:
+    """Blocking lookup that records call order and can be held until released"""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, location):
+        self.calls.append(location)
+        self.release.wait(5)
+        if location in self.fail:
+            raise ConnectionError("Nominatim unavailable")
+        if location.startswith("Nowhere"):
+            return None
+        return {"address": location, "latitude": 1.0, "longitude": 2.0}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode_cache.db"))
+    yield cache
+    cache.close()
+
+
+def service(cache, lookup, rate=1000.0):
+    return GeocodingService(lookup, cache, rate=rate, burst=1, offsets=OFFSETS)
+
+
+def test_results_and_misses_are_cached(cache):
+    lookup = Geocoder()
+
+    async def scenario():
+        geocoder = service(cache, lookup)
+        first = await geocoder.geocode("Park Street")
+        missing = await geocoder.geocode("Nowhere Lane")
+        again = await geocoder.geocode("park street!")
+        return geocoder, first, missing, again
+
+    geocoder, first, missing, again = asyncio.run(scenario())
+    assert first == again == {"address": "Park Street", "latitude": 1.0, "longitude": 2.0}
+    assert missing is None
+    assert lookup.calls == ["Park Street", "Nowhere Lane"]
+    assert cache.get("Nowhere Lane") == {}
+    assert geocoder.snapshot()["lookups"] == 2
+
+
+def test_concurrent_requests_for_one_place_share_a_lookup(cache):
+    lookup = Geocoder()
+
+    async def scenario():
+        geocoder = service(cache, lookup)
+        results = await asyncio.gather(*(geocoder.geocode(name) for name in
+                                         ("Park Street", "park street", "PARK STREET.", "Park  Street")))
+        return geocoder, results
+
+    geocoder, results = asyncio.run(scenario())
+    assert lookup.calls == ["Park Street"]
+    assert all(result == results[0] for result in results)
+    assert geocoder.coalesced == 3
+
+
+def test_waiting_lookups_run_in_priority_order(cache):
+    lookup = Geocoder()
+    lookup.release.clear()
+
+    async def scenario():
+        geocoder = service(cache, lookup)
+        # The first lookup holds the worker while the others queue behind it
+        tasks = [asyncio.create_task(geocoder.geocode("first", "MEDIUM"))]
+        await asyncio.sleep(0.05)
+        for location, priority in (("low", "LOW"), ("medium", "MEDIUM"), ("high", "HIGH"), ("unknown", "urgent")):
+            tasks.append(asyncio.create_task(geocoder.geocode(location, priority)))
+        await asyncio.sleep(0.01)
+        assert geocoder.depth() == 4
+        lookup.release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert lookup.calls == ["first", "high", "medium", "unknown", "low"]
+
+
+def test_urgent_duplicate_moves_a_queued_lookup_up(cache):
+    lookup = Geocoder()
+    lookup.release.clear()
+
+    async def scenario():
+        geocoder = service(cache, lookup)
+        tasks = [asyncio.create_task(geocoder.geocode("first", "HIGH"))]
+        await asyncio.sleep(0.05)
+        tasks.append(asyncio.create_task(geocoder.geocode("medium", "MEDIUM")))
+        tasks.append(asyncio.create_task(geocoder.geocode("backfill", "LOW")))
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(geocoder.geocode("Backfill", "HIGH")))
+        await asyncio.sleep(0.01)
+        lookup.release.set()
+        await asyncio.gather(*tasks)
+        return geocoder
+
+    geocoder = asyncio.run(scenario())
+    assert lookup.calls == ["first", "backfill", "medium"]
+    assert geocoder.coalesced == 1
+
+
+def test_errors_reach_every_waiter_and_are_not_cached(cache):
+    lookup = Geocoder(fail={"Park Street"})
+
+    async def scenario():
+        geocoder = service(cache, lookup)
+        results = await asyncio.gather(geocoder.geocode("Park Street"), geocoder.geocode("park street"),
+                                       return_exceptions=True)
+        return geocoder, results
+
+    geocoder, results = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert geocoder.errors == 1 and cache.get("Park Street") is None
+
+
+def test_a_caller_giving_up_does_not_cancel_the_shared_lookup(cache):
+    lookup = Geocoder()
+    lookup.release.clear()
+
+    async def scenario():
+        geocoder = service(cache, lookup)
+        impatient = asyncio.create_task(geocoder.geocode("Park Street"))
+        patient = asyncio.create_task(geocoder.geocode("Park Street"))
+        await asyncio.sleep(0.05)
+        impatient.cancel()
+        lookup.release.set()
+        return await patient
+
+    assert asyncio.run(scenario())["address"] == "Park Street"
+    assert cache.get("Park Street")["address"] == "Park Street"
+
+
+def test_lookups_are_rate_limited(cache):
+    lookup = Geocoder()
+
+    async def scenario():
+        geocoder = service(cache, lookup, rate=20.0)
+        started = time.perf_counter()
+        await asyncio.gather(*(geocoder.geocode(f"place {i}") for i in range(4)))
+        return time.perf_counter() - started
+
+    # One token up front, then one every 50 ms
+    assert asyncio.run(scenario()) >= 0.14
+    assert len(lookup.calls) == 4
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert 0 < bucket.take() <= 0.1
+    bucket.refund()
+    assert bucket.take() == 0
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import types
+
+import pytest
+
+pytest.importorskip("hume")
+
+import main
+from storage import Storage
+from transcript import TranscriptLog
+from triage import local_analysis
+
+UID = "call-1"
+LLM_SUMMARY = {"summary": "House fire on Park Street", "criticality": "HIGH", "isSpam": False,
+               "department": "Fire", "user": "Ann", "location": "42 Park Street"}
+
+
+class StubService:
+    """Summarization service whose summaries finish only when the test releases them"""
+
+    def __init__(self, result=LLM_SUMMARY):
+        self.result = result
+        self.release = asyncio.Event()
+        self.admission = types.SimpleNamespace(admit=lambda: 0, level=lambda: 0)
+
+    async def summarize(self, text, on_early=None, priority=None):
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    # Transcripts and summary_complete.txt are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    storage = Storage(str(tmp_path / "conversation.db"))
+    monkeypatch.setattr(main, "get_storage", lambda: storage)
+    monkeypatch.setattr(main, "PROCESSING_DEADLINE", 0.05)
+    monkeypatch.setattr(main, "summarize_transcript", lambda text: pytest.fail("summarized without a deadline"))
+    with TranscriptLog(UID) as log:
+        log.append("You: there is a fire at 42 Park Street")
+        log.append("EVI: help is on the way")
+    yield storage
+    storage.close()
+
+
+def use_service(monkeypatch, service):
+    monkeypatch.setattr(main, "get_service", lambda: service)
+    return service
+
+
+def session():
+    return types.SimpleNamespace(uid=UID, analysis={}, priority=lambda: {"criticality": "HIGH"})
+
+
+def stored(storage):
+    return storage.query_one("SELECT summary, criticality, needs_refinement FROM conversations WHERE uid = ?",
+                             (UID,))
+
+
+def completion_signal():
+    if not os.path.exists("summary_complete.txt"):
+        return None
+    with open("summary_complete.txt") as f:
+        return f.read()
+
+
+def test_missed_deadline_stores_flagged_triage_then_refines(storage, monkeypatch):
+    service = use_service(monkeypatch, StubService())
+
+    async def scenario():
+        await main.process_session(session())
+        triage = local_analysis(TranscriptLog(UID).read_all())
+        assert stored(storage) == (triage["summary"], triage["criticality"], 1)
+        assert completion_signal() == UID
+        os.remove("summary_complete.txt")
+
+        service.release.set()
+        await asyncio.gather(*main.pending_refinements)
+
+    asyncio.run(scenario())
+    assert stored(storage) == ("House fire on Park Street", "HIGH", 0)
+    # The UI already moved on with the triage record, so the refinement does not signal it again
+    assert completion_signal() is None
+
+
+def test_failed_late_summary_leaves_record_flagged(storage, monkeypatch):
+    service = use_service(monkeypatch, StubService(RuntimeError("model unavailable")))
+
+    async def scenario():
+        await main.process_session(session())
+        service.release.set()
+        await asyncio.gather(*main.pending_refinements)
+
+    asyncio.run(scenario())
+    assert stored(storage)[2] == 1
+
+
+@pytest.mark.parametrize("result", [RuntimeError("rolling summary failed"), None])
+def test_summary_without_result_inside_deadline_stores_triage(storage, monkeypatch, result):
+    service = use_service(monkeypatch, StubService(result))
+    service.release.set()
+    asyncio.run(main.process_session(session()))
+    summary, criticality, needs_refinement = stored(storage)
+    assert summary.startswith("[Preliminary]") and needs_refinement == 1
+    assert completion_signal() == UID
+
+
+def test_summary_inside_deadline_is_stored_unflagged(storage, monkeypatch):
+    service = use_service(monkeypatch, StubService())
+    service.release.set()
+    asyncio.run(main.process_session(session()))
+    assert stored(storage) == ("House fire on Park Street", "HIGH", 0)
+    assert completion_signal() == UID
+
+
+def test_flagged_records_are_picked_up_by_refine(storage, monkeypatch):
+    resummarize = pytest.importorskip("resummarize")
+    use_service(monkeypatch, StubService())
+    asyncio.run(main.process_session(session()))
+    assert [row[1] for row in resummarize.fetch_batch(storage, 0, 10, refine=True)] == [UID]
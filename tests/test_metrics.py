@@ -0,0 +1,30 @@
+from metrics import Registry, render
+
+
+def test_counter_family_is_named_after_its_total_series():
+    registry = Registry()
+    registry.counter("echolink_calls", "Calls by final state", ("state",)).inc(state="completed")
+    registry.gauge("echolink_active_calls", "Calls not yet processed").set(2)
+    lines = render({"supervisor": registry.snapshot()}).splitlines()
+    assert lines == [
+        "# HELP echolink_calls_total Calls by final state",
+        "# TYPE echolink_calls_total counter",
+        'echolink_calls_total{state="completed",process="supervisor"} 1',
+        "# HELP echolink_active_calls Calls not yet processed",
+        "# TYPE echolink_active_calls gauge",
+        'echolink_active_calls{process="supervisor"} 2',
+    ]
+
+
+def test_histogram_samples_share_the_family_name():
+    registry = Registry()
+    registry.histogram("echolink_stage_seconds", "Stage time", ("stage",), buckets=(0.1, 1.0)).observe(0.5, stage="db")
+    lines = render({"server": registry.snapshot()}).splitlines()
+    assert lines[:2] == ["# HELP echolink_stage_seconds Stage time", "# TYPE echolink_stage_seconds histogram"]
+    assert lines[2:] == [
+        'echolink_stage_seconds_bucket{stage="db",le="0.1",process="server"} 0',
+        'echolink_stage_seconds_bucket{stage="db",le="1.0",process="server"} 1',
+        'echolink_stage_seconds_bucket{stage="db",le="+Inf",process="server"} 1',
+        'echolink_stage_seconds_sum{stage="db",process="server"} 0.5',
+        'echolink_stage_seconds_count{stage="db",process="server"} 1',
+    ]
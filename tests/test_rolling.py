@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+import summarizer
+from summarizer import ROLLING_PROMPT, SYSTEM_PROMPT, RollingSummarizer, default_summary
+from transcript import TranscriptLog
+
+UID = "call-1"
+
+
+class StubService:
+    """Returns the queued results in order and records every request"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.requests = []
+
+    async def summarize(self, text, system_prompt=SYSTEM_PROMPT, priority="MEDIUM"):
+        self.requests.append((text, system_prompt, priority))
+        return self.results.pop(0)
+
+
+def summary(text, criticality="MEDIUM"):
+    return {"summary": text, "criticality": criticality, "isSpam": False, "department": "Fire",
+            "user": "Unknown", "location": "Unknown"}
+
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    # The summarizer reads the call's transcript from the working directory
+    monkeypatch.chdir(tmp_path)
+    log = TranscriptLog(UID).open()
+    yield log
+    log.close()
+
+
+def test_updates_send_only_the_new_chunk(log):
+    service = StubService(summary("Smoke in a kitchen"), summary("Kitchen fire spreading", "HIGH"))
+    rolling = RollingSummarizer(UID, min_chars=40, service=service)
+    rolling.priority = "HIGH"
+
+    log.append("You: I can smell smoke in my kitchen")
+    assert not asyncio.run(rolling.update())
+    assert service.requests == []
+
+    log.append("You: and now there are flames near the stove")
+    assert asyncio.run(rolling.update())
+    text, prompt, priority = service.requests[0]
+    assert (prompt, priority) == (SYSTEM_PROMPT, "HIGH")
+    assert "smell smoke" in text and "flames" in text
+
+    log.append("You: it is spreading to the living room")
+    assert asyncio.run(rolling.update(force=True))
+    text, prompt, _ = service.requests[1]
+    assert prompt == ROLLING_PROMPT
+    assert text.startswith('Current analysis:\n{"summary": "Smoke in a kitchen"')
+    assert "living room" in text and "flames" not in text
+    assert rolling.state["criticality"] == "HIGH" and rolling.updates == 2
+
+
+def test_failed_update_is_retried_with_the_same_chunk(log):
+    service = StubService(default_summary("Error processing conversation"), summary("Fire on Park Street"))
+    rolling = RollingSummarizer(UID, min_chars=0, service=service)
+    log.append("You: there is a fire on Park Street")
+
+    assert not asyncio.run(rolling.update())
+    assert rolling.offset == 0 and rolling.state is None
+    assert asyncio.run(rolling.update())
+    assert service.requests[0][0] == service.requests[1][0]
+    assert rolling.state["summary"] == "Fire on Park Street"
+
+
+def test_filler_only_chunk_is_skipped_without_a_request(log, monkeypatch):
+    monkeypatch.setattr(summarizer, "compact_for_summary", lambda text, uid: ("", {"saved_tokens": 0}))
+    service = StubService()
+    rolling = RollingSummarizer(UID, min_chars=0, service=service)
+    log.append("<INTERRUPTION>")
+    assert not asyncio.run(rolling.update())
+    assert rolling.offset > 0 and service.requests == []
+
+
+def test_finalize_merges_the_last_delta(log):
+    service = StubService(summary("Fire"), summary("Fire, caller is Ann", "HIGH"))
+    rolling = RollingSummarizer(UID, min_chars=1000, service=service)
+    log.append("You: there is a fire")
+    asyncio.run(rolling.update(force=True))
+    log.append("You: my name is Ann")
+    assert asyncio.run(rolling.finalize()) == summary("Fire, caller is Ann", "HIGH")
+
+
+def test_finalize_gives_up_when_the_last_delta_fails(log):
+    service = StubService(summary("Fire"), default_summary("Error processing conversation"))
+    rolling = RollingSummarizer(UID, min_chars=0, service=service)
+    log.append("You: there is a fire")
+    asyncio.run(rolling.update())
+    log.append("You: my name is Ann")
+    # The caller summarizes the whole transcript instead of using a state that misses the end of the call
+    assert asyncio.run(rolling.finalize()) is None
+
+
+def test_finalize_without_any_transcript_returns_none(log):
+    rolling = RollingSummarizer(UID, service=StubService())
+    assert asyncio.run(rolling.finalize()) is None
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import routing
+from routing import ModelRouter
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(routing, "MIN_HEDGE_DELAY", 0.01)
+
+
+def seed(router, model, latency, samples=routing.MIN_PERCENTILE_SAMPLES):
+    for _ in range(samples):
+        router.stats[model].record(latency, True)
+
+
+def run(router, delays, errors=()):
+    """Route one request where model m answers after delays[m] seconds, or raises if it is in errors"""
+    started = []
+
+    async def attempt(model):
+        started.append(model)
+        await asyncio.sleep(delays[model])
+        if model in errors:
+            raise RuntimeError(f"{model} is down")
+        return f"answer from {model}"
+
+    result = asyncio.run(router.run(attempt))
+    return result, started
+
+
+def test_unmeasured_models_keep_configuration_order():
+    router = ModelRouter(["a", "b", "c"])
+    assert router.ranked() == ["a", "b", "c"]
+    seed(router, "c", 0.5)
+    assert router.ranked() == ["c", "a", "b"]
+
+
+def test_fails_over_at_once_when_the_primary_errors():
+    router = ModelRouter(["a", "b"], hedge_delay=10)
+    result, started = run(router, {"a": 0.0, "b": 0.0}, errors={"a"})
+    assert result == ("answer from b", "b")
+    assert started == ["a", "b"]
+    assert router.stats["a"].errors == 1 and router.stats["a"].error_rate > 0
+    assert router.ranked() == ["b", "a"]
+
+
+def test_raises_the_last_error_when_every_model_fails():
+    router = ModelRouter(["a", "b"], hedge_delay=10)
+    with pytest.raises(RuntimeError, match="b is down"):
+        run(router, {"a": 0.0, "b": 0.0}, errors={"a", "b"})
+
+
+def test_hedge_wins_when_the_primary_is_slow():
+    router = ModelRouter(["a", "b"], hedge_delay=0.02)
+    result, started = run(router, {"a": 1.0, "b": 0.01})
+    assert result == ("answer from b", "b")
+    assert started == ["a", "b"]
+    assert router.stats["b"].hedges == 1 and router.stats["b"].wins == 1
+    # The cancelled primary is known to be slower than the hedge, but leaves no latency sample
+    assert router.stats["a"].cancelled == 1 and not router.stats["a"].recent
+
+
+def test_cancelled_hedges_do_not_make_the_slower_model_primary():
+    router = ModelRouter(["a", "b"])
+    # Enough fast samples that a's p90 stays at 0.05s while its slower answers below are added
+    seed(router, "a", 0.05, samples=50)
+    seed(router, "b", 0.3)
+    for _ in range(5):
+        # a runs past its p90, so b is hedged and cancelled shortly after a answers
+        result, started = run(router, {"a": 0.1, "b": 0.3})
+        assert result == ("answer from a", "a") and started == ["a", "b"]
+
+    assert router.ranked() == ["a", "b"]
+    b = router.stats["b"]
+    assert b.cancelled == 5 and b.latency == pytest.approx(0.3)
+    assert len(b.recent) == routing.MIN_PERCENTILE_SAMPLES and min(b.recent) == pytest.approx(0.3)
+
+
+def test_cancelled_primary_can_only_rank_lower():
+    router = ModelRouter(["a", "b"])
+    seed(router, "a", 0.01)
+    seed(router, "b", 0.02)
+    run(router, {"a": 0.2, "b": 0.02})
+    assert router.stats["a"].latency > 0.01
+    router.stats["a"].record_cancelled(0.001)
+    assert router.stats["a"].latency > 0.01
+
+
+def test_error_rate_is_the_healthiest_models():
+    router = ModelRouter(["a", "b"])
+    assert router.error_rate() == 0.0
+    router.stats["a"].record(0.0, False)
+    router.stats["b"].record(0.1, True)
+    assert router.error_rate() == 0.0
+    router.stats["b"].record(0.0, False)
+    assert router.error_rate() > 0.0
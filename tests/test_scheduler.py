@@ -0,0 +1,150 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+import scheduler
+from scheduler import PriorityScheduler, priority_class
+
+OFFSETS = {"HIGH": 0.0, "MEDIUM": 30.0, "LOW": 90.0}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only the scheduler's view of time is faked; the event loop keeps the real clock
+    monkeypatch.setattr(scheduler, "time", types.SimpleNamespace(monotonic=clock, time=time.time))
+    return clock
+
+
+async def hold(scheduler, release):
+    """Take the only slot and keep it until release is set"""
+    held = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot("HIGH"):
+            held.set()
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await held.wait()
+    return task
+
+
+async def enqueue(scheduler, order, label, priority):
+    async def request():
+        async with scheduler.slot(priority):
+            order.append(label)
+
+    task = asyncio.create_task(request())
+    # Let it reach the queue before the next request is made
+    await asyncio.sleep(0)
+    return task
+
+
+def test_priority_class():
+    assert [priority_class(value) for value in ("high", " Low ", "critical", None)] == ["HIGH", "LOW", "MEDIUM", "MEDIUM"]
+
+
+def test_waiting_requests_run_in_priority_order(clock):
+    async def scenario():
+        queue = PriorityScheduler(1, OFFSETS)
+        release, order = asyncio.Event(), []
+        holder = await hold(queue, release)
+        tasks = [await enqueue(queue, order, label, label) for label in ("LOW", "MEDIUM", "HIGH")]
+        assert queue.depth() == 3
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        return queue, order
+
+    queue, order = asyncio.run(scenario())
+    assert order == ["HIGH", "MEDIUM", "LOW"]
+    assert queue.running == 0 and queue.depth() == 0
+    assert queue.stats()["classes"]["LOW"]["served"] == 1
+
+
+def test_aged_low_request_overtakes_new_high_one(clock):
+    async def scenario():
+        queue = PriorityScheduler(1, OFFSETS)
+        release, order = asyncio.Event(), []
+        holder = await hold(queue, release)
+        tasks = [await enqueue(queue, order, "old LOW", "LOW")]
+        # Waited longer than the 90s gap between LOW and HIGH
+        clock.now += 91
+        tasks.append(await enqueue(queue, order, "new HIGH", "HIGH"))
+        clock.now += 1
+        tasks.append(await enqueue(queue, order, "newer MEDIUM", "MEDIUM"))
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["old LOW", "new HIGH", "newer MEDIUM"]
+
+
+def test_cancelled_waiter_is_skipped_and_frees_nothing(clock):
+    async def scenario():
+        queue = PriorityScheduler(1, OFFSETS)
+        release, order = asyncio.Event(), []
+        holder = await hold(queue, release)
+        cancelled = await enqueue(queue, order, "cancelled", "HIGH")
+        waiting = await enqueue(queue, order, "LOW", "LOW")
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert queue.depth() == 1 and queue.running == 1
+        release.set()
+        await asyncio.gather(holder, waiting)
+        return queue, order
+
+    queue, order = asyncio.run(scenario())
+    assert order == ["LOW"]
+    assert queue.running == 0 and queue.waiting == []
+
+
+def test_cancel_after_handover_passes_the_slot_on(clock):
+    async def scenario():
+        queue = PriorityScheduler(1, OFFSETS)
+        release, order = asyncio.Event(), []
+        holder = await hold(queue, release)
+        first = await enqueue(queue, order, "first", "HIGH")
+        second = await enqueue(queue, order, "second", "MEDIUM")
+        # The holder hands its slot to first, which is cancelled before it gets to run
+        release.set()
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.gather(holder, second, return_exceptions=True)
+        return queue, order, first
+
+    queue, order, first = asyncio.run(scenario())
+    assert first.cancelled()
+    assert order == ["second"]
+    assert queue.running == 0
+
+
+def test_concurrency_limit(clock):
+    async def scenario():
+        queue = PriorityScheduler(2, OFFSETS)
+        active = peak = 0
+
+        async def request():
+            nonlocal active, peak
+            async with queue.slot("MEDIUM"):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.001)
+                active -= 1
+
+        await asyncio.gather(*(request() for _ in range(6)))
+        return peak, queue
+
+    peak, queue = asyncio.run(scenario())
+    assert peak == 2 and queue.running == 0
+    assert queue.stats()["classes"]["MEDIUM"]["served"] == 6
@@ -0,0 +1,153 @@
+import sqlite3
+import threading
+
+import pytest
+
+from storage import (CONVERSATION_COLUMNS, CREATE_CONVERSATIONS, DERIVED_COLUMNS, SCHEMA_VERSION, Storage,
+                     criticality_level, spam_flag, timestamp_epoch)
+
+CALL = ("call-1", "You: fire on main street", "2024-05-01 10:00:00", "Fire", "HIGH", False, "Ann", "Main St")
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = Storage(str(tmp_path / "conversation.db"))
+    yield storage
+    storage.close()
+
+
+def test_connections_use_wal_and_are_per_thread(storage):
+    conn = storage.connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert storage.connection() is conn
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(storage.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+    assert len(storage.connections) == 2
+
+
+def test_insert_and_fetch_keep_column_positions(storage):
+    storage.insert_conversation(CALL, "Fire")
+    later = ("call-2",) + CALL[1:2] + ("2024-05-01 11:00:00",) + CALL[3:]
+    storage.insert_conversation(later)
+    assert storage.fetch_conversation("call-1") == CALL[:5] + (0,) + CALL[6:]
+    assert [row[0] for row in storage.fetch_conversations()] == ["call-2", "call-1"]
+
+
+def test_transaction_rolls_back_on_error(storage):
+    with pytest.raises(sqlite3.IntegrityError):
+        with storage.transaction() as conn:
+            conn.execute("INSERT INTO conversations (uid) VALUES ('partial')")
+            raise sqlite3.IntegrityError("abort")
+    assert storage.fetch_conversation("partial") is None
+
+
+def test_readers_see_writes_from_another_connection(tmp_path):
+    path = str(tmp_path / "conversation.db")
+    writer, reader = Storage(path), Storage(path)
+    try:
+        reader.fetch_conversations()
+        writer.insert_conversation(CALL)
+        assert reader.fetch_conversation("call-1")[0] == "call-1"
+    finally:
+        writer.close()
+        reader.close()
+
+
+def legacy_database(path, rows):
+    """A conversations table as the app created it before versioned migrations"""
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_CONVERSATIONS)
+    conn.executemany("INSERT INTO conversations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_migrates_legacy_table_and_backfills_typed_columns(tmp_path):
+    path = str(tmp_path / "conversation.db")
+    legacy_database(path, [
+        CALL,
+        ("call-2", "", "not a timestamp", "Prank", "low", "True", "Unknown", "Unknown"),
+    ])
+    storage = Storage(path)
+    try:
+        conn = storage.connection()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION == 4
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(conversations)")]
+        assert tuple(columns) == CONVERSATION_COLUMNS + DERIVED_COLUMNS + ("needs_refinement",)
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(conversations)")}
+        assert {"conversations_ts", "conversations_analytics", "conversations_uid",
+                "conversations_needs_refinement"} <= indexes
+
+        rows = conn.execute("SELECT uid, ts_epoch, criticality_level, is_spam, word_count, needs_refinement "
+                            "FROM conversations ORDER BY rowid").fetchall()
+        assert rows == [("call-1", timestamp_epoch(CALL[2]), 3, 0, 5, 0), ("call-2", None, 1, 1, 0, 0)]
+    finally:
+        storage.close()
+
+
+def test_migrations_are_applied_once(tmp_path):
+    path = str(tmp_path / "conversation.db")
+    storage = Storage(path)
+    storage.connection()
+    conn = sqlite3.connect(path)
+    # A second process finds the schema current and applies nothing
+    assert storage.migrate(conn) == SCHEMA_VERSION
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    conn.close()
+    storage.close()
+
+
+def test_backfill_runs_in_batches_and_only_on_untyped_rows(tmp_path):
+    path = str(tmp_path / "conversation.db")
+    legacy_database(path, [(f"call-{i}",) + CALL[1:] for i in range(7)])
+    storage = Storage(path)
+    conn = sqlite3.connect(path)
+    storage.migrate(conn)
+    assert storage.backfill(conn, batch_size=3) == 7
+    assert storage.backfill(conn, batch_size=3) == 0
+    assert conn.execute("SELECT COUNT(*) FROM conversations WHERE ts_epoch IS NULL").fetchone()[0] == 0
+    conn.close()
+
+
+def test_derived_values():
+    assert criticality_level(" high ") == 3 and criticality_level("urgent") == 0 and criticality_level(None) == 0
+    assert [spam_flag(value) for value in (True, "true", 1, False, "no", None)] == [1, 1, 1, 0, 0, 0]
+    assert timestamp_epoch("2024-05-01 10:00:00") is not None and timestamp_epoch(None) is None
+
+
+def test_active_conversations_are_the_most_critical_recent_or_preliminary(storage):
+    rows = [("low", "2024-05-01 10:05:00", "LOW", False), ("high", "2024-05-01 10:00:00", "HIGH", False),
+            ("old-high", "2024-04-01 10:00:00", "HIGH", False), ("old-preliminary", "2024-04-01 09:00:00", "MEDIUM", True),
+            ("medium", "2024-05-01 10:10:00", "MEDIUM", False), ("newer-high", "2024-05-01 10:20:00", "HIGH", False)]
+    for uid, timestamp, criticality, preliminary in rows:
+        storage.save_conversation((uid, "text", timestamp, "summary", criticality, False, "user", "place"),
+                                  needs_refinement=preliminary)
+    since = timestamp_epoch("2024-05-01 00:00:00")
+    assert [row[0] for row in storage.fetch_active_conversations(since, 10)] == [
+        "newer-high", "high", "medium", "old-preliminary", "low"]
+    assert [row[0] for row in storage.fetch_active_conversations(since, 2)] == ["newer-high", "high"]
+
+
+def test_save_conversation_updates_in_place_and_keeps_the_timestamp(storage):
+    preliminary = CALL[:3] + ("[Preliminary] fire", "MEDIUM", False) + CALL[6:]
+    assert storage.save_conversation(preliminary, "Fire", needs_refinement=True)
+    refined = CALL[:2] + ("2024-05-01 10:05:00",) + CALL[3:]
+    assert storage.save_conversation(refined, "Fire")
+
+    rows = storage.query("SELECT timestamp, summary, criticality, criticality_level, needs_refinement "
+                         "FROM conversations WHERE uid = ?", ("call-1",))
+    assert rows == [("2024-05-01 10:00:00", "Fire", "HIGH", 3, 0)]
+
+
+def test_save_conversation_without_replace_leaves_an_existing_row(storage):
+    assert storage.save_conversation(CALL, "Fire")
+    error = CALL[:3] + ("Error processing conversation", "LOW", True) + CALL[6:]
+    assert not storage.save_conversation(error, needs_refinement=True, replace=False)
+    assert storage.fetch_conversation("call-1")[3:6] == ("Fire", "HIGH", 0)
+
+    assert storage.save_conversation(("call-2",) + error[1:], needs_refinement=True, replace=False)
+    assert storage.query_one("SELECT needs_refinement FROM conversations WHERE uid = 'call-2'") == (1,)
@@ -0,0 +1,69 @@
+import pytest
+
+from stream_json import IncrementalJSONParser
+
+RESPONSE = ('Sure! Here is the JSON:\n{"criticality": "HIGH", "isSpam": false, '
+            '"nested": {"a": [1, "}"]}, "summary": "Fire \\"big\\", at x", "n": 3} trailing text')
+
+
+def feed(parser, text, step):
+    for i in range(0, len(text), step):
+        parser.feed(text[i:i + step])
+    return parser.finish()
+
+
+@pytest.mark.parametrize("step", [1, 3, 7, len(RESPONSE)])
+def test_parses_wrapped_object_in_any_chunking(step):
+    fields, watched = [], []
+    parser = IncrementalJSONParser(watch=("criticality", "isSpam"), on_field=lambda key, value: fields.append(key),
+                                   on_watch=watched.append)
+    result = feed(parser, RESPONSE, step)
+    assert result == {"criticality": "HIGH", "isSpam": False, "nested": {"a": [1, "}"]},
+                      "summary": 'Fire "big", at x', "n": 3}
+    assert fields == ["criticality", "isSpam", "nested", "summary", "n"]
+    assert watched == [{"criticality": "HIGH", "isSpam": False}]
+
+
+def test_early_fields_fire_before_the_object_ends():
+    watched = []
+    parser = IncrementalJSONParser(watch=("criticality", "isSpam"), on_watch=watched.append)
+    parser.feed('{"criticality": "LOW", "isSpam": true, "summary": "Prank ca')
+    assert watched == [{"criticality": "LOW", "isSpam": True}]
+    assert parser.fields == {"criticality": "LOW", "isSpam": True}
+    assert not parser.complete
+
+
+def test_watch_fires_once_only_when_every_field_arrived():
+    watched = []
+    parser = IncrementalJSONParser(watch=("criticality", "isSpam"), on_watch=watched.append)
+    parser.feed('{"criticality": "HIGH", "summary": "x"')
+    assert watched == []
+    parser.feed(', "isSpam": false, "criticality": "LOW"}')
+    assert watched == [{"criticality": "HIGH", "isSpam": False}]
+
+
+def test_repairs_truncated_string_and_containers():
+    parser = IncrementalJSONParser()
+    parser.feed('{"summary": "Car crash on the hig')
+    assert parser.finish() == {"summary": "Car crash on the hig"}
+
+    parser = IncrementalJSONParser()
+    parser.feed('{"location": {"street": "Main", "tags": ["a", "b"')
+    assert parser.finish() == {"location": {"street": "Main", "tags": ["a", "b"]}}
+
+
+def test_truncation_after_a_key_keeps_the_completed_fields():
+    parser = IncrementalJSONParser()
+    parser.feed('{"summary": "x", "criticality": "LOW", "user"')
+    assert parser.finish() == {"summary": "x", "criticality": "LOW"}
+
+
+def test_no_object_and_malformed_values():
+    parser = IncrementalJSONParser()
+    parser.feed("I cannot help with that.")
+    assert parser.finish() is None
+
+    parser = IncrementalJSONParser()
+    parser.feed('{"criticality": HIGH, "isSpam": false}')
+    assert parser.fields == {"isSpam": False}
+    assert parser.finish() == {"isSpam": False}
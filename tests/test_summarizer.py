@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+import summarizer
+from summary_cache import SummaryCache, cache_key
+
+TRANSCRIPT = "You: There is a fire at 42 Park Street\n"
+SUMMARY = {"summary": "Fire", "criticality": "HIGH", "isSpam": False, "department": "Fire",
+           "user": "Unknown", "location": "42 Park Street"}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = SummaryCache(str(tmp_path / "summary_cache.db"))
+    monkeypatch.setattr(summarizer, "cache", cache)
+    yield cache
+    cache.close()
+
+
+def test_summary_is_cached_under_the_model_that_produced_it(cache):
+    fallback_model = "llama-3.1-8b-instant"
+    summarizer.store_summary(TRANSCRIPT, summarizer.SYSTEM_PROMPT, SUMMARY, fallback_model)
+    version = summarizer.prompt_version(summarizer.SYSTEM_PROMPT)
+    assert cache.get(cache_key(TRANSCRIPT, fallback_model, version)) == SUMMARY
+    assert cache.get(cache_key(TRANSCRIPT, summarizer.SUMMARY_MODEL, version)) is None
+
+
+def test_lookup_accepts_any_allowed_model_as_one_lookup(cache):
+    summarizer.store_summary(TRANSCRIPT, summarizer.SYSTEM_PROMPT, SUMMARY, "llama-3.1-8b-instant")
+    cache.memory.clear()
+    assert summarizer.cached_summary(TRANSCRIPT, summarizer.SYSTEM_PROMPT,
+                                     [summarizer.SUMMARY_MODEL, "llama-3.1-8b-instant"]) == SUMMARY
+    assert summarizer.cached_summary(TRANSCRIPT, summarizer.SYSTEM_PROMPT, [summarizer.SUMMARY_MODEL]) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lookup_is_keyed_on_prompt_and_skips_fallback_records(cache):
+    summarizer.store_summary(TRANSCRIPT, summarizer.SYSTEM_PROMPT, SUMMARY, summarizer.SUMMARY_MODEL)
+    assert summarizer.cached_summary(TRANSCRIPT, summarizer.SYSTEM_PROMPT) == SUMMARY
+    assert summarizer.cached_summary(TRANSCRIPT, summarizer.ROLLING_PROMPT) is None
+
+    summarizer.store_summary("You: hello\n", summarizer.SYSTEM_PROMPT,
+                             summarizer.default_summary("Error processing conversation"), summarizer.SUMMARY_MODEL)
+    assert summarizer.cached_summary("You: hello\n", summarizer.SYSTEM_PROMPT) is None
+
+
+@pytest.mark.parametrize("error", [summarizer.InvalidResponseError("no JSON object"), RuntimeError("timeout")])
+def test_errors_raise_without_fallback(cache, monkeypatch, error):
+    service = summarizer.SummarizationService()
+    monkeypatch.setattr(service, "_get_client", lambda: None)
+
+    async def fail(request):
+        raise error
+
+    monkeypatch.setattr(service.router, "run", fail)
+    assert summarizer.is_fallback_summary(asyncio.run(service.summarize(TRANSCRIPT)))
+    with pytest.raises(type(error)):
+        asyncio.run(service.summarize(TRANSCRIPT, fallback=False))
+    assert service.in_flight == 0
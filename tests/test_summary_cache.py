@@ -0,0 +1,64 @@
+from summary_cache import SummaryCache, cache_key
+
+
+def last_access(cache, key):
+    return cache.conn.execute("SELECT last_access FROM summary_cache WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_key_covers_transcript_model_and_prompt():
+    key = cache_key("You: fire", "model-a", "v1")
+    assert key == cache_key("You: fire", "model-a", "v1")
+    assert len({key, cache_key("You: fire!", "model-a", "v1"), cache_key("You: fire", "model-b", "v1"),
+                cache_key("You: fire", "model-a", "v2")}) == 4
+
+
+def test_hits_from_memory_and_from_another_process(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = SummaryCache(path)
+    writer.put("k", {"summary": "fire"}, "model-a", "v1")
+    assert writer.get("k") == {"summary": "fire"}
+    assert writer.get("missing") is None
+
+    reader = SummaryCache(path)
+    assert reader.get("k") == {"summary": "fire"}
+    reader.get("k")
+    assert reader.stats()["hits"] == 2 and reader.stats()["memory_hits"] == 1
+    assert writer.stats()["misses"] == 1
+
+
+def test_returned_values_are_copies(tmp_path):
+    cache = SummaryCache(str(tmp_path / "cache.db"))
+    cache.put("k", {"summary": "fire"})
+    cache.get("k")["summary"] = "changed"
+    assert cache.get("k") == {"summary": "fire"}
+
+
+def test_evicts_least_recently_used_rows(tmp_path):
+    cache = SummaryCache(str(tmp_path / "cache.db"), max_entries=20, memory_entries=0)
+    for i in range(20):
+        cache.put(f"k{i}", {"i": i})
+    # k0 is used again, so k1 is now the oldest
+    cache.get("k0")
+    cache.put("k20", {"i": 20})
+
+    assert cache.evictions == 2
+    assert cache.get("k0") == {"i": 0}
+    assert cache.get("k1") is None and cache.get("k2") is None
+    assert cache.get("k20") == {"i": 20}
+
+
+def test_memory_hits_refresh_disk_last_access(tmp_path):
+    cache = SummaryCache(str(tmp_path / "cache.db"), touch_interval=0)
+    cache.put("hot", {"summary": "fire"})
+    written = last_access(cache, "hot")
+    cache.get("hot")
+    assert cache.memory_hits == 1
+    assert last_access(cache, "hot") > written
+
+
+def test_memory_hits_within_touch_interval_skip_the_disk(tmp_path):
+    cache = SummaryCache(str(tmp_path / "cache.db"), touch_interval=3600)
+    cache.put("hot", {"summary": "fire"})
+    written = last_access(cache, "hot")
+    cache.get("hot")
+    assert last_access(cache, "hot") == written
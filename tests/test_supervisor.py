@@ -0,0 +1,156 @@
+import asyncio
+import contextlib
+
+import pytest
+
+pytest.importorskip("hume")
+
+import supervisor
+from control import send_command
+from supervisor import CallSupervisor
+
+
+class FakeSocket:
+    async def close(self):
+        pass
+
+
+class FakeClient:
+    """Stands in for HumeVoiceClient; every connect() succeeds at once"""
+
+    @contextlib.asynccontextmanager
+    async def connect(self, config_id=None):
+        yield FakeSocket()
+
+
+class FakeMicrophone:
+    def __init__(self):
+        self.muted = False
+
+    @classmethod
+    async def start(cls, socket, allow_user_interrupt=True):
+        # Started inside the call's task, so this lands in that call's transcript like the chat client's output
+        print("[12:00:00] You: there is a fire")
+        return cls()
+
+    def mute(self):
+        self.muted = True
+
+    def unmute(self):
+        self.muted = False
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def call_supervisor(tmp_path, monkeypatch):
+    # Transcripts are written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(supervisor, "MicrophoneInterface", FakeMicrophone)
+    processed = []
+
+    async def process(session):
+        processed.append(session.uid)
+
+    call_supervisor = CallSupervisor(on_session_ended=process, api_key="test",
+                                     control_path=str(tmp_path / "control.sock"))
+    call_supervisor.client = FakeClient()
+    call_supervisor.processed = processed
+    return call_supervisor
+
+
+def run_with_supervisor(call_supervisor, client):
+    """Serve the supervisor, run the blocking client in a thread, then shut down and return its result"""
+    path = call_supervisor.control.path
+
+    async def scenario():
+        serving = asyncio.create_task(call_supervisor.serve())
+        while call_supervisor.control.server is None:
+            await asyncio.sleep(0.01)
+        try:
+            return await asyncio.to_thread(client, lambda command, **fields: send_command(command, path, **fields))
+        finally:
+            await asyncio.to_thread(send_command, "shutdown", path)
+            await serving
+
+    return asyncio.run(scenario())
+
+
+def wait_until_active(send, uid):
+    for _ in range(100):
+        if send("wait", uid=uid, seconds=0.05)["state"] == "active":
+            return
+    pytest.fail(f"call {uid} never became active")
+
+
+def test_concurrent_calls_are_controlled_independently(call_supervisor):
+    def client(send):
+        send("start", uid="a")
+        send("start", uid="b")
+        wait_until_active(send, "a")
+        wait_until_active(send, "b")
+        muted = send("mute", uid="a")
+
+        send("end", uid="a")
+        a = send("wait", uid="a")
+        b = send("status", uid="b")
+        overview = send("status")
+        send("end", uid="b")
+        return muted, a, b, overview, send("wait", uid="b")
+
+    muted, a, b, overview, b_done = run_with_supervisor(call_supervisor, client)
+    assert (muted["muted"], muted["supported"]) == (True, True)
+    assert call_supervisor.sessions["a"].mic_interface.muted and not call_supervisor.sessions["b"].mic_interface.muted
+    assert a["state"] == "completed" and [state for state, _ in a["history"]] == [
+        "connecting", "active", "ending", "processing", "completed"]
+    # Ending one call leaves the other one live
+    assert b["state"] == "active" and overview["active"] == 1
+    assert b_done["state"] == "completed"
+    assert call_supervisor.processed == ["a", "b"]
+    # Each call's output went to its own transcript
+    assert a["utterances"] == 1 and b_done["utterances"] == 1
+
+
+def test_wait_with_seconds_returns_while_the_call_is_live(call_supervisor):
+    def client(send):
+        send("start", uid="a")
+        wait_until_active(send, "a")
+        return send("wait", uid="a", seconds=0.05)
+
+    assert run_with_supervisor(call_supervisor, client)["state"] == "active"
+    # Shutdown ends and processes calls that are still live
+    assert call_supervisor.processed == ["a"]
+
+
+def test_commands_for_unknown_calls_fail(call_supervisor):
+    def client(send):
+        return send("end", uid="missing"), send("start")
+
+    unknown, no_uid = run_with_supervisor(call_supervisor, client)
+    assert not unknown["ok"] and "Unknown call: missing" in unknown["error"]
+    assert no_uid == {"ok": False, "error": "start requires a uid"}
+
+
+def test_failed_connection_marks_only_that_call_failed(call_supervisor):
+    class FlakyClient(FakeClient):
+        def connect(self, config_id=None):
+            if not hasattr(self, "failed"):
+                self.failed = True
+                raise ConnectionError("handshake failed")
+            return super().connect(config_id)
+
+    call_supervisor.client = FlakyClient()
+
+    def client(send):
+        send("start", uid="a")
+        failed = send("wait", uid="a")
+        send("start", uid="b")
+        wait_until_active(send, "b")
+        send("end", uid="b")
+        return failed, send("wait", uid="b")
+
+    failed, completed = run_with_supervisor(call_supervisor, client)
+    assert (failed["state"], failed["error"]) == ("failed", "handshake failed")
+    assert completed["state"] == "completed"
+    assert call_supervisor.processed == ["b"]
@@ -0,0 +1,105 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from taskgraph import TaskGraph
+
+
+def test_order_respects_dependencies():
+    graph = TaskGraph()
+    graph.add("report", lambda upstream: None, after=("location", "department"))
+    graph.add("location", lambda upstream: None, after=("transcript",))
+    graph.add("department", lambda upstream: None)
+    graph.add("transcript", lambda upstream: None)
+    order = graph.order()
+    assert sorted(order) == ["department", "location", "report", "transcript"]
+    assert order.index("transcript") < order.index("location") < order.index("report")
+    assert order.index("department") < order.index("report")
+
+
+def test_rejects_duplicates_unknown_dependencies_and_cycles():
+    graph = TaskGraph()
+    graph.add("a", lambda upstream: None)
+    with pytest.raises(ValueError, match="already"):
+        graph.add("a", lambda upstream: None)
+
+    graph.add("b", lambda upstream: None, after=("missing",))
+    with pytest.raises(ValueError, match="unknown"):
+        graph.order()
+
+    graph = TaskGraph()
+    graph.add("a", lambda upstream: None, after=("b",))
+    graph.add("b", lambda upstream: None, after=("a",))
+    with pytest.raises(ValueError, match="cycle"):
+        graph.run(2)
+
+
+def test_dependents_get_upstream_results_after_they_finish():
+    finished = []
+
+    def node(name, value):
+        def run(upstream):
+            time.sleep(0.01)
+            finished.append(name)
+            return value, dict(upstream)
+        return run
+
+    graph = TaskGraph()
+    graph.add("a", node("a", 1))
+    graph.add("b", node("b", 2))
+    graph.add("c", node("c", 3), after=("a", "b"))
+    results, errors = graph.run(4)
+    assert errors == {}
+    assert results["c"] == (3, {"a": (1, {}), "b": (2, {})})
+    assert finished[-1] == "c"
+
+
+def test_failed_nodes_are_reported_and_dependents_run_with_the_rest():
+    def fail(upstream):
+        raise RuntimeError("rate limited")
+
+    graph = TaskGraph()
+    graph.add("ok", lambda upstream: "fine")
+    graph.add("bad", fail)
+    graph.add("report", lambda upstream: sorted(upstream), after=("ok", "bad"))
+    results, errors = graph.run(2)
+    assert results == {"ok": "fine", "report": ["ok"]}
+    assert list(errors) == ["bad"] and str(errors["bad"]) == "rate limited"
+
+
+def test_concurrency_is_capped_and_independent_nodes_overlap():
+    lock = threading.Lock()
+    running = peak = 0
+
+    def work(upstream):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    graph = TaskGraph()
+    for i in range(6):
+        graph.add(f"n{i}", work)
+    started = time.perf_counter()
+    results, errors = graph.run(3)
+    elapsed = time.perf_counter() - started
+    assert len(results) == 6 and not errors
+    assert peak == 3
+    # Two waves of three rather than six in a row
+    assert elapsed < 0.25
+
+
+def test_nodes_run_in_a_copy_of_the_callers_context():
+    request = contextvars.ContextVar("request", default=None)
+    request.set("call-1")
+    graph = TaskGraph()
+    graph.add("read", lambda upstream: request.get())
+    graph.add("write", lambda upstream: request.set("changed"))
+    results, _ = graph.run(2)
+    assert results["read"] == "call-1"
+    assert request.get() == "call-1"
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+import tracing
+from tracing import load_trace, record, span
+
+
+@pytest.fixture(autouse=True)
+def trace_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def shape(uid):
+    return [(item["name"], item["depth"]) for item in load_trace(uid)]
+
+
+def test_nested_spans_load_as_a_tree_in_start_order():
+    with span("call", uid="u1") as attrs:
+        with span("connect"):
+            pass
+        with span("summarize", priority="HIGH"):
+            with span("request"):
+                pass
+        attrs["state"] = "completed"
+
+    spans = load_trace("u1")
+    assert [(item["name"], item["depth"]) for item in spans] == [
+        ("call", 0), ("connect", 1), ("summarize", 1), ("request", 2)]
+    assert spans[0]["attrs"] == {"state": "completed"} and spans[2]["attrs"] == {"priority": "HIGH"}
+    assert spans[0]["offset"] == 0 and all(item["offset"] >= 0 for item in spans)
+
+
+def test_spans_outside_a_trace_are_skipped(trace_dir):
+    with span("library_call") as attrs:
+        attrs["ignored"] = True
+    record("stage", time.time(), 0.1)
+    assert os.listdir(trace_dir) == []
+
+
+def test_errors_are_recorded_and_reraised():
+    with pytest.raises(ValueError):
+        with span("call", uid="u1"):
+            with span("parse"):
+                raise ValueError("bad json")
+    assert [item["error"] for item in load_trace("u1")] == ["ValueError", "ValueError"]
+
+
+def test_record_and_tasks_join_the_callers_trace():
+    async def scenario():
+        with span("call", uid="u1"):
+            record("hume_connect", time.time() - 0.5, 0.5, attempt=1)
+
+            async def child():
+                with span("child_task"):
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(asyncio.create_task(child()),
+                                 asyncio.to_thread(lambda: record("in_thread", time.time(), 0)))
+
+    asyncio.run(scenario())
+    connect = next(item for item in load_trace("u1") if item["name"] == "hume_connect")
+    assert connect["attrs"] == {"attempt": 1} and connect["duration"] == 500
+    assert sorted(shape("u1")) == [("call", 0), ("child_task", 1), ("hume_connect", 1), ("in_thread", 1)]
+
+
+def test_spans_of_other_calls_are_roots_of_their_own_trace():
+    with span("call", uid="u1"):
+        with span("geocode", uid="u2"):
+            pass
+    assert shape("u1") == [("call", 0)]
+    assert shape("u2") == [("geocode", 0)]
+
+
+def test_torn_lines_and_orphans_survive_a_crash(trace_dir):
+    with span("call", uid="u1"):
+        with span("summarize"):
+            with span("request"):
+                pass
+    lines = (trace_dir / "u1.jsonl").read_text().splitlines()
+    # Lose the summarize span, as if the process died while it was open, and tear the last write
+    (trace_dir / "u1.jsonl").write_text(lines[0] + "\n" + lines[2] + '\n{"i": "torn')
+    assert shape("u1") == [("call", 0), ("request", 0)]
+    assert load_trace("missing") == []
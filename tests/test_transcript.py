@@ -0,0 +1,98 @@
+import contextvars
+import io
+import os
+
+import pytest
+
+from transcript import TranscriptLog, TranscriptTee, get_writer
+
+
+def test_append_and_read_by_offset(tmp_path):
+    with TranscriptLog("call", str(tmp_path)) as log:
+        log.append("You: there is a fire")
+        log.append("EVI: where are you?\nplease say")
+        assert log.utterance_count() == 2
+        assert log.utterance(1) == "EVI: where are you? please say"
+
+        text, offset = log.read_from(0)
+        assert text == "You: there is a fire\nEVI: where are you? please say\n"
+        log.append("You: main street")
+        assert log.read_from(offset) == ("You: main street\n", offset + len("You: main street\n"))
+
+
+def test_append_later_is_on_disk_after_flush(tmp_path):
+    log = TranscriptLog("call", str(tmp_path)).open()
+    for i in range(50):
+        log.append_later(f"You: line {i}")
+    log.flush()
+    assert log.utterance_count() == 50
+    assert log.utterance(49) == "You: line 49"
+    log.close()
+    assert log.read_all().count("\n") == 50
+
+
+def test_tee_copies_only_utterance_lines(tmp_path):
+    class Sink:
+        def __init__(self):
+            self.text = ""
+
+        def write(self, text):
+            self.text += text
+
+    log = TranscriptLog("call", str(tmp_path)).open()
+    sink = Sink()
+    tee = TranscriptTee(log, sink)
+    tee.write("[12:00:01] You: help\nconnecting...\nEVI: what")
+    tee.write(" happened?\n")
+    log.close()
+    assert sink.text == "[12:00:01] You: help\nconnecting...\nEVI: what happened?\n"
+    assert log.read_all() == "You: help\nEVI: what happened?\n"
+
+
+def test_closed_log_refuses_late_writes(tmp_path):
+    log = TranscriptLog("call", str(tmp_path))
+    with pytest.raises(ValueError):
+        log.append_later("You: before the call started")
+    log.open()
+    log.append_later("You: help")
+    log.close()
+
+    with pytest.raises(ValueError):
+        log.append_later("You: after hang-up")
+    # The tee drops output that arrives after hang-up instead of reopening the log
+    TranscriptTee(log, io.StringIO()).write("EVI: goodbye\n")
+    # A write already queued for the writer thread fails instead of reopening the log
+    with log.written:
+        log.queued += 1
+    get_writer().submit(log, b"You: stray\n", contextvars.copy_context())
+    log.flush()
+    assert log.log_fd is None and log.index_fd is None
+    assert log.read_all() == "You: help\n"
+
+
+def test_recover_rebuilds_truncated_index(tmp_path):
+    with TranscriptLog("call", str(tmp_path)) as log:
+        for i in range(4):
+            log.append(f"You: line {i}")
+    entry = TranscriptLog.INDEX_ENTRY.size
+    # Lose the last entry and a half of the one before, as a crash between log and index writes would
+    with open(log.index_path, "r+b") as f:
+        f.truncate(2 * entry + entry // 2)
+
+    with TranscriptLog("call", str(tmp_path)) as recovered:
+        assert recovered.utterance_count() == 4
+        assert [recovered.utterance(i) for i in range(4)] == [f"You: line {i}" for i in range(4)]
+
+
+def test_recover_terminates_torn_final_line(tmp_path):
+    with TranscriptLog("call", str(tmp_path)) as log:
+        log.append("You: first")
+    with open(log.log_path, "ab") as f:
+        f.write(b"You: half writ")
+
+    with TranscriptLog("call", str(tmp_path)) as recovered:
+        assert recovered.utterance_count() == 2
+        recovered.append("You: next")
+        assert recovered.utterance(1) == "You: half writ"
+        assert recovered.utterance(2) == "You: next"
+    assert os.path.getsize(log.index_path) == 3 * TranscriptLog.INDEX_ENTRY.size
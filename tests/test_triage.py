@@ -0,0 +1,63 @@
+from triage import TriageMatcher, TriageScanner, local_analysis, triage
+
+
+def test_weighted_hits():
+    result = triage("There's a fire and my neighbour is not breathing")
+    assert result["criticality"] == "HIGH"
+    assert result["matches"] == ["fire", "not breathing"]
+    assert result["department"] == "Medical, Fire"
+
+    assert triage("someone stole my bike, it was stolen")["criticality"] == "MEDIUM"
+    assert triage("somebody fell")["criticality"] == "LOW"
+
+
+def test_misses_stay_low():
+    for text in ("I'd like to know your opening hours", "The firefly gunmetal paint", "shotgun wedding", ""):
+        result = triage(text)
+        assert result == {"criticality": "LOW", "department": "Unknown", "score": 0, "matches": []}
+
+
+def test_matches_fall_on_word_boundaries():
+    assert triage("Fire!")["matches"] == ["fire"]
+    assert triage("it's on-fire")["matches"] == ["fire", "on fire"]
+    assert triage("he was shot")["matches"] == ["shot"]
+    assert triage("he was shotgunned")["matches"] == []
+
+
+def test_phrases_split_across_chunks_still_match():
+    scanner = TriageScanner()
+    for chunk in ("my dad is not bre", "athing and there is a g", "un"):
+        scanner.feed(chunk)
+    assert scanner.result()["matches"] == ["gun", "not breathing"]
+
+
+def test_feed_caller_ignores_the_operator():
+    scanner = TriageScanner()
+    scanner.feed_caller("EVI: Is anyone injured? Is there a fire or a weapon?\n"
+                        "[10:00:02] You: No, I just locked myself out.\n")
+    assert scanner.result()["criticality"] == "LOW"
+    assert scanner.result()["matches"] == []
+
+    scanner.feed_caller("EVI: Are you safe?\nYou: A man with a knife <USER_INTERRUPTION> is outside\n")
+    assert scanner.result()["matches"] == ["knife"]
+
+
+def test_custom_lexicon():
+    matcher = TriageMatcher([("flood", 5, "Fire"), ("water", 1, "Fire")])
+    scanner = TriageScanner(matcher)
+    scanner.feed("flood water everywhere")
+    assert scanner.result()["criticality"] == "HIGH" and scanner.result()["score"] == 6
+
+
+def test_local_analysis_uses_only_caller_speech():
+    transcript = ("EVI: Hello, what is your emergency? Is anyone hurt, is there a fire?\n"
+                  "You: Hi, my name is Priya Nair. There has been a car accident at 42 Park Street.\n"
+                  "EVI: Is anyone unconscious?\n"
+                  "You: No, everyone is okay.\n")
+    record = local_analysis(transcript)
+    assert record["criticality"] == "MEDIUM"
+    assert record["department"] == "Police"
+    assert record["user"] == "Priya Nair"
+    assert record["location"] == "42 Park Street"
+    assert record["summary"].startswith("[Preliminary] Hi, my name is Priya Nair.")
+    assert record["isSpam"] == "False" and record["needs_refinement"]
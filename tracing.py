@@ -0,0 +1,126 @@
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# One append-only file of finished spans per call uid
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+
+# (uid, span id) of the innermost open span; tasks and threads started inside a span inherit it
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id() -> str:
+    return os.urandom(4).hex()
+
+
+def _write(uid: str, record: Dict) -> None:
+    """Append one span as a compact JSON line.
+
+    Keys: i span id, p parent id, n name, t start (epoch seconds), d duration (ms),
+    a attributes, e error type. Spans are written when they finish, so a file is
+    in end order; load_trace() puts them back into a tree.
+    """
+    try:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        # A single short write with O_APPEND, so spans from several processes never interleave
+        with open(os.path.join(TRACE_DIR, f"{uid}.jsonl"), "a") as f:
+            f.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+    except OSError as e:
+        print(f"Error writing trace span for {uid}: {e}")
+
+
+def _parent_for(uid: str) -> Optional[str]:
+    parent = current_span.get()
+    return parent[1] if parent and parent[0] == uid else None
+
+
+@contextmanager
+def span(name: str, uid: Optional[str] = None, **attrs):
+    """Trace a block as a child of the current span.
+
+    With no uid the span joins the current trace, and is skipped if there is none,
+    so library code can be instrumented without knowing which call it serves.
+    Yields the attribute dict, which the block may add to.
+    """
+    parent = current_span.get()
+    uid = uid or (parent[0] if parent else None)
+    if uid is None:
+        yield attrs
+        return
+
+    record = {"i": _new_id(), "p": _parent_for(uid), "n": name, "t": round(time.time(), 6)}
+    token = current_span.set((uid, record["i"]))
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        record["e"] = type(e).__name__
+        raise
+    finally:
+        record["d"] = round((time.perf_counter() - started) * 1000, 3)
+        try:
+            current_span.reset(token)
+        except ValueError:
+            # Finished in a different context than it started in; the parent is restored by its own owner
+            pass
+        if attrs:
+            record["a"] = attrs
+        _write(uid, {key: value for key, value in record.items() if value is not None})
+
+
+def record(name: str, start: float, duration: float, uid: Optional[str] = None, **attrs) -> None:
+    """Trace a stage measured across callbacks; start is epoch seconds, duration seconds"""
+    parent = current_span.get()
+    uid = uid or (parent[0] if parent else None)
+    if uid is None:
+        return
+    span_record = {"i": _new_id(), "p": _parent_for(uid), "n": name, "t": round(start, 6),
+                   "d": round(duration * 1000, 3)}
+    if attrs:
+        span_record["a"] = attrs
+    _write(uid, {key: value for key, value in span_record.items() if value is not None})
+
+
+def load_trace(uid: str) -> List[Dict]:
+    """Return the call's spans depth-first, each with its depth and offset (ms) from the first span"""
+    spans = []
+    try:
+        with open(os.path.join(TRACE_DIR, f"{uid}.jsonl")) as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash
+                    continue
+    except FileNotFoundError:
+        return []
+    if not spans:
+        return []
+
+    ids = {item["i"] for item in spans}
+    children: Dict[Optional[str], List[Dict]] = {}
+    for item in spans:
+        # Spans whose parent was never written (still open, or in a crashed process) become roots
+        parent = item.get("p") if item.get("p") in ids else None
+        children.setdefault(parent, []).append(item)
+    origin = min(item["t"] for item in spans)
+
+    ordered = []
+
+    def visit(parent: Optional[str], depth: int) -> None:
+        for item in sorted(children.get(parent, []), key=lambda item: item["t"]):
+            ordered.append({
+                "name": item["n"],
+                "depth": depth,
+                "offset": (item["t"] - origin) * 1000,
+                "duration": item.get("d", 0.0),
+                "attrs": item.get("a", {}),
+                "error": item.get("e"),
+            })
+            visit(item["i"], depth + 1)
+
+    visit(None, 0)
+    return ordered
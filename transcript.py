@@ -0,0 +1,300 @@
+import contextvars
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+import time
+
+from tracing import record, span
+
+# Directory holding one append-only transcript segment per call uid
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", "transcripts")
+
+# Lines printed by the Hume chat client, optionally prefixed with a "[HH:MM:SS] " timestamp
+UTTERANCE_PATTERN = re.compile(r'^(?:\[\d{2}:\d{2}:\d{2}\]\s*)?((?:You|EVI):.*|<[A-Z_]+>)$')
+
+# Transcript log of the call whose task is currently running (set per session task)
+current_transcript = contextvars.ContextVar("current_transcript", default=None)
+
+writer = None
+writer_lock = threading.Lock()
+
+
+class TranscriptLog:
+    """Append-only transcript segment for a single call.
+
+    Utterances are appended to <uid>.log and synced to disk before append() returns,
+    so a crash mid-call loses at most the utterance being written; append_later()
+    hands the write to the transcript writer thread instead. <uid>.idx holds a
+    fixed-size (offset, length) entry per utterance. It is only synced on close,
+    since recover() rebuilds any entries a crash lost from the log. Readers keep
+    their own byte offset and only read the bytes written since their last visit.
+    """
+
+    INDEX_ENTRY = struct.Struct("<QI")
+
+    def __init__(self, uid: str, directory: str = TRANSCRIPT_DIR):
+        self.uid = uid
+        self.directory = directory
+        self.log_path = os.path.join(directory, f"{uid}.log")
+        self.index_path = os.path.join(directory, f"{uid}.idx")
+        self.log_fd = None
+        self.index_fd = None
+        # perf_counter() of the first utterance appended through this instance
+        self.first_append_at = None
+        # Utterances handed to the writer thread and not yet synced, guarded by the condition
+        self.queued = 0
+        self.written = threading.Condition()
+        # append_later() refuses writes until open() and again from close() on, so the writer never reopens the log
+        self.closed = True
+
+    def open(self) -> "TranscriptLog":
+        """Open the segment for appending, recovering the index after a crash"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.log_fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.index_fd = os.open(self.index_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self.recover()
+        with self.written:
+            self.closed = False
+        return self
+
+    def close(self) -> None:
+        """Wait for queued utterances, sync the index and close; blocks, so async callers use a thread"""
+        with self.written:
+            self.closed = True
+            self.written.wait_for(lambda: self.queued == 0)
+        if self.index_fd is not None:
+            _sync(self.index_fd)
+        for fd in (self.log_fd, self.index_fd):
+            if fd is not None:
+                os.close(fd)
+        self.log_fd = None
+        self.index_fd = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def append(self, text: str) -> int:
+        """Append one utterance and return its byte offset in the log"""
+        data = _encode(text)
+        if self.log_fd is None:
+            self.open()
+        with span("transcript_chunk", bytes=len(data)):
+            offset = self._write(data)
+            _sync(self.log_fd)
+        if self.first_append_at is None:
+            self.first_append_at = time.perf_counter()
+        return offset
+
+    def append_later(self, text: str) -> None:
+        """Queue one utterance for the writer thread, which syncs it shortly after; never blocks on the disk.
+
+        Raises ValueError if the log is not open.
+        """
+        with self.written:
+            if self.closed:
+                raise ValueError(f"Transcript {self.uid} is not open")
+            self.queued += 1
+        if self.first_append_at is None:
+            self.first_append_at = time.perf_counter()
+        # The context carries the caller's span, so the write is traced as part of its call
+        get_writer().submit(self, _encode(text), contextvars.copy_context())
+
+    def flush(self) -> None:
+        """Wait until every utterance queued with append_later() is on disk"""
+        with self.written:
+            self.written.wait_for(lambda: self.queued == 0)
+
+    def _write(self, data: bytes) -> int:
+        if self.log_fd is None:
+            raise ValueError(f"Transcript {self.uid} is not open")
+        offset = os.lseek(self.log_fd, 0, os.SEEK_END)
+        os.write(self.log_fd, data)
+        os.write(self.index_fd, self.INDEX_ENTRY.pack(offset, len(data)))
+        return offset
+
+    def recover(self) -> None:
+        """Bring the index in line with the log after an unclean shutdown"""
+        log_size = os.path.getsize(self.log_path)
+        index_size = os.path.getsize(self.index_path)
+
+        # Drop a torn trailing index entry
+        if index_size % self.INDEX_ENTRY.size:
+            index_size -= index_size % self.INDEX_ENTRY.size
+            os.ftruncate(self.index_fd, index_size)
+
+        # The log is the source of truth: index any complete lines written after the last entry
+        indexed_end = 0
+        if index_size:
+            with open(self.index_path, "rb") as f:
+                f.seek(index_size - self.INDEX_ENTRY.size)
+                offset, length = self.INDEX_ENTRY.unpack(f.read(self.INDEX_ENTRY.size))
+                indexed_end = offset + length
+
+        if indexed_end >= log_size:
+            return
+
+        with open(self.log_path, "rb") as f:
+            f.seek(indexed_end)
+            tail = f.read()
+        offset = indexed_end
+        for line in tail.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                # Terminate a torn final write so the next append starts on a fresh line
+                os.write(self.log_fd, b"\n")
+                _sync(self.log_fd)
+                line += b"\n"
+            os.write(self.index_fd, self.INDEX_ENTRY.pack(offset, len(line)))
+            offset += len(line)
+        _sync(self.index_fd)
+        print(f"Recovered {offset - indexed_end} unindexed bytes for transcript {self.uid}")
+
+    def read_from(self, offset: int = 0):
+        """Return (text, new_offset) for the complete lines written since offset"""
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return "", offset
+
+        # Only hand out whole lines; a partially written line is picked up next time
+        end = data.rfind(b"\n") + 1
+        return data[:end].decode("utf-8", errors="replace"), offset + end
+
+    def read_all(self) -> str:
+        return self.read_from(0)[0]
+
+    def utterance_count(self) -> int:
+        try:
+            return os.path.getsize(self.index_path) // self.INDEX_ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    def utterance(self, position: int) -> str:
+        """Read a single utterance by position using the offset index"""
+        with open(self.index_path, "rb") as f:
+            f.seek(position * self.INDEX_ENTRY.size)
+            entry = f.read(self.INDEX_ENTRY.size)
+        if len(entry) < self.INDEX_ENTRY.size:
+            raise IndexError(f"Transcript {self.uid} has no utterance {position}")
+        offset, length = self.INDEX_ENTRY.unpack(entry)
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            return f.read(length).decode("utf-8", errors="replace").rstrip("\n")
+
+
+class TranscriptTee:
+    """Wrap stdout and copy the chat client's utterance lines into a TranscriptLog.
+
+    When no log is given, the log is looked up from current_transcript, so several
+    sessions running as asyncio tasks in one process each write to their own log.
+    """
+
+    def __init__(self, log: TranscriptLog = None, stream=None):
+        self.log = log
+        self.stream = stream or sys.stdout
+        self.pending = {}
+
+    def write(self, text: str) -> int:
+        self.stream.write(text)
+        log = self.log or current_transcript.get()
+        if log is None:
+            return len(text)
+
+        pending = self.pending.get(log.uid, "") + text
+        while "\n" in pending:
+            line, pending = pending.split("\n", 1)
+            match = UTTERANCE_PATTERN.match(line.strip())
+            if match:
+                # The write and sync happen on the writer thread; this runs on the event loop
+                try:
+                    log.append_later(match.group(1))
+                except ValueError:
+                    # Output after the call's log was closed is not part of its transcript
+                    pass
+        if pending:
+            self.pending[log.uid] = pending
+        else:
+            self.pending.pop(log.uid, None)
+        return len(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class TranscriptWriter:
+    """Thread that makes queued utterances durable off the event loop.
+
+    Every utterance queued since the last batch is written in arrival order, then
+    each log the batch touched is synced once (group commit), so a slow disk delays
+    this thread rather than the audio and control handling of every call.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.__stderr__
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, log: TranscriptLog, data: bytes, context: contextvars.Context) -> None:
+        self.queue.put((log, data, context))
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch) -> None:
+        started, started_epoch = time.perf_counter(), time.time()
+        touched = {}
+        for log, data, _ in batch:
+            try:
+                log._write(data)
+                touched[id(log)] = log
+            except (OSError, ValueError) as e:
+                self.stream.write(f"Error appending to transcript {log.uid}: {e}\n")
+        for log in touched.values():
+            try:
+                _sync(log.log_fd)
+            except OSError as e:
+                self.stream.write(f"Error syncing transcript {log.uid}: {e}\n")
+        duration = time.perf_counter() - started
+        for log, data, context in batch:
+            context.run(record, "transcript_chunk", started_epoch, duration, bytes=len(data), batch=len(batch))
+            with log.written:
+                log.queued -= 1
+                log.written.notify_all()
+
+
+def get_writer() -> TranscriptWriter:
+    """Start the shared transcript writer thread on first use"""
+    global writer
+    with writer_lock:
+        if writer is None:
+            writer = TranscriptWriter()
+    return writer
+
+
+def _encode(text: str) -> bytes:
+    return text.replace("\n", " ").encode("utf-8") + b"\n"
+
+
+def _sync(fd: int) -> None:
+    if hasattr(os, "fdatasync"):
+        os.fdatasync(fd)
+    else:
+        os.fsync(fd)
@@ -0,0 +1,246 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Weighted emergency lexicon: (phrase, weight, department). A single phrase at or above
+# HIGH_PHRASE_WEIGHT makes a call HIGH on its own; weaker phrases add up.
+LEXICON: List[Tuple[str, int, str]] = [
+    # Fire
+    ("fire", 3, "Fire"), ("on fire", 5, "Fire"), ("flames", 4, "Fire"), ("burning", 3, "Fire"),
+    ("smoke", 2, "Fire"), ("explosion", 5, "Fire"), ("exploded", 5, "Fire"), ("gas leak", 4, "Fire"),
+    ("smell gas", 4, "Fire"), ("smells like gas", 4, "Fire"), ("trapped", 4, "Fire"),
+    ("collapsed building", 5, "Fire"), ("building collapsed", 5, "Fire"),
+    # Medical
+    ("not breathing", 6, "Medical"), ("stopped breathing", 6, "Medical"), ("can't breathe", 5, "Medical"),
+    ("cannot breathe", 5, "Medical"), ("unconscious", 5, "Medical"), ("unresponsive", 5, "Medical"),
+    ("passed out", 4, "Medical"), ("heart attack", 6, "Medical"), ("cardiac arrest", 6, "Medical"),
+    ("no pulse", 6, "Medical"), ("chest pain", 4, "Medical"), ("stroke", 4, "Medical"),
+    ("seizure", 4, "Medical"), ("overdose", 5, "Medical"), ("choking", 5, "Medical"),
+    ("bleeding", 3, "Medical"), ("bleeding heavily", 5, "Medical"), ("lot of blood", 4, "Medical"),
+    ("allergic reaction", 3, "Medical"), ("in labor", 3, "Medical"), ("injured", 2, "Medical"),
+    ("hurt", 2, "Medical"), ("broken", 2, "Medical"), ("fell", 1, "Medical"), ("ambulance", 3, "Medical"),
+    # Police
+    ("gun", 5, "Police"), ("shot", 5, "Police"), ("shooting", 6, "Police"), ("gunshot", 6, "Police"),
+    ("gunshots", 6, "Police"), ("shots fired", 6, "Police"), ("knife", 4, "Police"), ("stabbed", 6, "Police"), ("stabbing", 6, "Police"),
+    ("weapon", 4, "Police"), ("armed", 4, "Police"), ("hostage", 6, "Police"), ("kidnapped", 6, "Police"),
+    ("breaking in", 4, "Police"), ("break in", 3, "Police"), ("intruder", 4, "Police"),
+    ("robbery", 4, "Police"), ("robbed", 3, "Police"), ("assault", 4, "Police"), ("attacked", 4, "Police"),
+    ("attacking", 4, "Police"), ("threatening", 3, "Police"), ("fight", 2, "Police"), ("stolen", 2, "Police"),
+    ("theft", 2, "Police"), ("car accident", 3, "Police"), ("crash", 3, "Police"), ("accident", 2, "Police"),
+    ("suspicious", 1, "Police"), ("vandalism", 1, "Police"),
+]
+
+HIGH_PHRASE_WEIGHT = 5
+HIGH_SCORE = 8
+MEDIUM_SCORE = 2
+# A second department is reported when it scores at least this fraction of the top one
+SECONDARY_DEPARTMENT_RATIO = 0.5
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse everything but letters and digits to single spaces"""
+    return _NON_WORD.sub(" ", text.lower())
+
+
+class TriageMatcher:
+    """Aho-Corasick automaton over the normalized lexicon phrases.
+
+    Phrases are compiled as " phrase " so every match falls on word boundaries, and
+    failure links are folded into a full transition table, so matching is a single
+    dict lookup per character with no backtracking.
+    """
+
+    def __init__(self, lexicon: Iterable[Tuple[str, int, str]] = LEXICON):
+        self.phrases: List[Tuple[str, int, str]] = []
+        self.transitions: List[Dict[str, int]] = [{}]
+        self.outputs: List[Tuple[int, ...]] = [()]
+        for phrase, weight, department in lexicon:
+            self._add(f" {normalize(phrase).strip()} ", len(self.phrases))
+            self.phrases.append((phrase, weight, department))
+        self._build()
+
+    def _add(self, pattern: str, phrase_id: int) -> None:
+        state = 0
+        for char in pattern:
+            if char not in self.transitions[state]:
+                self.transitions.append({})
+                self.outputs.append(())
+                self.transitions[state][char] = len(self.transitions) - 1
+            state = self.transitions[state][char]
+        self.outputs[state] += (phrase_id,)
+
+    def _build(self) -> None:
+        fail = [0] * len(self.transitions)
+        queue = list(self.transitions[0].values())
+        # Breadth-first, so each state's failure state is complete before its children need it
+        for state in queue:
+            for char, child in self.transitions[state].items():
+                queue.append(child)
+                fallback = fail[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = fail[fallback]
+                target = self.transitions[fallback].get(char, 0)
+                fail[child] = target if target != child else 0
+                self.outputs[child] += self.outputs[fail[child]]
+        for state in queue:
+            # Inherit the failure state's moves; characters outside every phrase return to the root
+            for char, target in self.transitions[fail[state]].items():
+                self.transitions[state].setdefault(char, target)
+
+
+matcher = None
+
+
+def get_matcher() -> TriageMatcher:
+    """Compile the shared matcher on first use"""
+    global matcher
+    if matcher is None:
+        matcher = TriageMatcher()
+    return matcher
+
+
+class TriageScanner:
+    """Streaming pre-triage of a transcript.
+
+    feed() can be called with arbitrary chunks as the call goes on; the automaton
+    state is carried across chunks, so phrases split between chunks still match.
+    result() returns the criticality and department guess for everything fed so far.
+    """
+
+    def __init__(self, matcher: Optional[TriageMatcher] = None):
+        self.matcher = matcher or get_matcher()
+        self.state = self.matcher.transitions[0].get(" ", 0)
+        self.last_char = " "
+        self.matched = set()
+
+    def feed(self, text: str) -> None:
+        text = normalize(text)
+        if self.last_char == " ":
+            text = text.lstrip(" ")
+        if not text:
+            return
+        transitions = self.matcher.transitions
+        outputs = self.matcher.outputs
+        state = self.state
+        for char in text:
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                self.matched.update(outputs[state])
+        self.state = state
+        self.last_char = text[-1]
+
+    def feed_caller(self, transcript: str) -> None:
+        """Feed only the caller's utterances from complete transcript lines.
+
+        The operator's own words ("is anyone injured?") are no evidence of an emergency.
+        """
+        for line in _caller_lines(transcript):
+            self.feed(line + "\n")
+
+    def result(self) -> Dict:
+        # A phrase at the very end of the stream is still waiting for its closing boundary
+        state = self.matcher.transitions[self.state].get(" ", 0) if self.last_char != " " else self.state
+        matched = self.matched | set(self.matcher.outputs[state])
+
+        score = 0
+        strongest = 0
+        departments = defaultdict(int)
+        for phrase_id in matched:
+            _, weight, department = self.matcher.phrases[phrase_id]
+            score += weight
+            strongest = max(strongest, weight)
+            departments[department] += weight
+
+        if strongest >= HIGH_PHRASE_WEIGHT or score >= HIGH_SCORE:
+            criticality = "HIGH"
+        elif score >= MEDIUM_SCORE:
+            criticality = "MEDIUM"
+        else:
+            criticality = "LOW"
+
+        ranked = sorted(departments.items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            department = "Unknown"
+        else:
+            top = ranked[0][1]
+            department = ", ".join(name for name, weight in ranked if weight >= top * SECONDARY_DEPARTMENT_RATIO)
+
+        return {
+            "criticality": criticality,
+            "department": department,
+            "score": score,
+            "matches": sorted(self.matcher.phrases[phrase_id][0] for phrase_id in matched),
+        }
+
+
+def triage(text: str) -> Dict:
+    """Return the local criticality and department guess for a piece of caller speech"""
+    scanner = TriageScanner()
+    scanner.feed(text)
+    return scanner.result()
+
+
+# Street addresses ("42 Park Street") first, then capitalized places after a preposition ("near Central Hospital")
+LOCATION_PATTERNS = [
+    re.compile(r"\b\d+\s+(?:[A-Z][\w'-]*\s+){1,3}(?:Street|St|Road|Rd|Avenue|Ave|Boulevard|Blvd|Lane|Ln|Drive|Dr|"
+               r"Highway|Hwy|Way|Place|Court|Square)\b\.?"),
+    re.compile(r"\b(?:at|in|near|on|outside|behind|opposite)\s+(?:the\s+)?((?:[A-Z][\w'-]*\s?){1,4})"),
+]
+NAME_PATTERN = re.compile(r"\b(?:[Mm]y name is|[Tt]his is|[Ii] am|[Ii]'m)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)")
+# Words the location pattern picks up at the start of a sentence rather than as a place
+NOT_PLACES = {"I", "The", "A", "Please", "Help", "Yes", "No", "Okay", "EVI", "You"}
+EXTRACTIVE_SUMMARY_CHARS = 300
+
+
+def _caller_lines(text: str) -> List[str]:
+    lines = []
+    for line in text.splitlines():
+        line = re.sub(r"^\[\d{2}:\d{2}:\d{2}\]\s*", "", line.strip())
+        if line.startswith("You:"):
+            lines.append(re.sub(r"<[A-Z_]+>", "", line[4:]).strip())
+    return [line for line in lines if line]
+
+
+def extract_location(text: str) -> Optional[str]:
+    for pattern in LOCATION_PATTERNS:
+        for match in pattern.finditer(text):
+            location = (match.group(1) if pattern.groups else match.group(0)).strip().rstrip(".,")
+            if location and location.split()[0] not in NOT_PLACES:
+                return location
+    return None
+
+
+def local_analysis(text: str) -> Dict:
+    """Build a summary record from the transcript alone, for when the LLM misses its deadline.
+
+    Criticality and department come from the keyword triage, the location and caller
+    name from regular expressions, and the summary is extracted from the caller's own
+    words, preferring utterances that matched the emergency lexicon.
+    """
+    caller = _caller_lines(text)
+    caller_text = "\n".join(caller)
+    result = triage(caller_text)
+
+    # Keep the caller's utterances that carry emergency keywords, in call order
+    key_lines = [line for line in caller if triage(line)["matches"]] or caller
+    summary = ""
+    for line in key_lines:
+        if len(summary) + len(line) > EXTRACTIVE_SUMMARY_CHARS:
+            break
+        summary = f"{summary} {line}".strip()
+    if not summary and key_lines:
+        summary = key_lines[0][:EXTRACTIVE_SUMMARY_CHARS]
+
+    name = NAME_PATTERN.search(caller_text)
+    return {
+        "summary": f"[Preliminary] {summary}" if summary else "[Preliminary] No caller speech recorded",
+        "criticality": result["criticality"],
+        # A keyword match is no evidence of a prank, so a preliminary record is never marked as spam
+        "isSpam": "False",
+        "department": result["department"],
+        "user": name.group(1) if name else "Unknown",
+        "location": extract_location(caller_text) or "Unknown",
+        "needs_refinement": True,
+    }
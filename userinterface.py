@@ -5,112 +5,257 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                            QHBoxLayout, QPushButton, QLabel, QTreeWidget, 
                            QTreeWidgetItem, QMessageBox, QTextEdit, QSplitter,
                            QStackedWidget, QLineEdit, QFrame, QGridLayout,
-                           QComboBox, QListWidget, QListWidgetItem)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QUrl, QSize
-from PyQt5.QtGui import QFont, QPainter
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtChart import (QChart, QChartView, QPieSeries, QBarSeries,
-                          QBarSet, QBarCategoryAxis, QValueAxis, QLineSeries, QDateTimeAxis)
+                           QComboBox, QListWidget, QListWidgetItem, QDialog,
+                           QScrollArea, QToolTip)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QUrl, QSize, QEvent
+from PyQt5.QtGui import QFont, QPainter, QColor
+# QtWebEngine and QtChart are imported where they are first used, after login; see check_startup.py
 import sqlite3
-import signal
+import time
 from datetime import datetime
 from collections import Counter
 import hashlib  # For password hashing
 from PyQt5.QtCore import QDateTime
+from control import send_command
+import metrics
+from tracing import load_trace, span
+from storage import criticality_level, get_storage, spam_flag
+from transcript import TranscriptLog
+from triage import local_analysis
+import uuid
+
+# How long each wait command blocks before the call thread checks its own deadline
+WAIT_POLL_SECONDS = 5
+# Shorter polls once the call is ending, so the preliminary criticality shows up as soon as it streams in
+PROCESSING_POLL_SECONDS = 0.5
+# Calls from the last ACTIVE_CALL_WINDOW seconds are candidates for the active calls queue, which shows
+# the ACTIVE_CALLS_SHOWN most critical of them
+ACTIVE_CALL_WINDOW = float(os.getenv("ACTIVE_CALL_WINDOW", str(2 * 3600)))
+ACTIVE_CALLS_SHOWN = 5
+
+# Long-lived voice supervisor process shared by every call (started on first use)
+supervisor_process = None
+
+def ensure_supervisor(timeout=15.0):
+    """Start the voice supervisor process unless one is already answering on the control channel"""
+    global supervisor_process
+    try:
+        send_command("status")
+        return
+    except OSError:
+        pass
+    
+    if supervisor_process is None or supervisor_process.poll() is not None:
+        print("Starting voice supervisor process...")
+        with span("subprocess_spawn"):
+            supervisor_process = subprocess.Popen([sys.executable, 'main.py', '--serve'])
+    
+    # Wait for the supervisor to start listening
+    deadline = time.monotonic() + timeout
+    with span("supervisor_startup"):
+        while time.monotonic() < deadline:
+            if supervisor_process.poll() is not None:
+                raise RuntimeError(f"Voice supervisor exited with code {supervisor_process.returncode}")
+            try:
+                send_command("status")
+                return
+            except OSError:
+                time.sleep(0.05)
+    raise TimeoutError("Voice supervisor did not start listening in time")
+
+def prestart_supervisor():
+    """Spawn the voice supervisor without waiting for it; ensure_supervisor() waits when a call starts"""
+    global supervisor_process
+    if supervisor_process is not None and supervisor_process.poll() is None:
+        return
+    try:
+        send_command("status")
+        return
+    except OSError:
+        pass
+    print("Starting voice supervisor process in the background...")
+    supervisor_process = subprocess.Popen([sys.executable, 'main.py', '--serve'])
+
+def stop_supervisor():
+    """Shut down the voice supervisor if this UI started it"""
+    global supervisor_process
+    if supervisor_process and supervisor_process.poll() is None:
+        try:
+            send_command("shutdown")
+            supervisor_process.wait(timeout=5)
+        except Exception as e:
+            print(f"Error stopping voice supervisor, terminating: {e}")
+            supervisor_process.terminate()
+    supervisor_process = None
 
 class ConversationThread(QThread):
     finished = pyqtSignal()
     error = pyqtSignal(str)
+    # Latest call status from each wait poll, for the preliminary analysis label
+    status_changed = pyqtSignal(dict)
+    # Supervisor's LLM admission snapshot, for the load label
+    admission_changed = pyqtSignal(dict)
     
     def __init__(self):
         super().__init__()
-        self.process = None
         self.termination_requested = False
         self.max_wait_time = 30  # Maximum time to wait for summary completion in seconds
         self.wait_start_time = None
+        self.uid = str(uuid.uuid4())  # Call uid shared by the transcript log and database record
 
     def run(self):
+        # The UI's side of the call, traced alongside the supervisor's spans for the same uid
+        with span("ui_call", uid=self.uid):
+            self.run_call()
+
+    def run_call(self):
         try:
             if os.path.exists("summary_complete.txt"):
                 os.remove("summary_complete.txt")
-            if os.path.exists("end_call.txt"):
-                os.remove("end_call.txt")
-                
-            self.process = subprocess.Popen([sys.executable, 'main.py'], 
-                                    stdout=subprocess.PIPE, 
-                                    stderr=subprocess.PIPE,
-                                    universal_newlines=True)
-            
-            # Read output in real-time
-            while True:
-                if self.process.poll() is not None:
-                    break
-                    
-                output = self.process.stdout.readline()
-                if output:
-                    print(output.strip())
-                    
-            stdout, stderr = self.process.communicate()
             
-            if self.process.returncode != 0 and not self.process.returncode == -signal.SIGTERM:
-                print(f"Process error output: {stderr}")
-                self.error.emit(f"Error in main.py: {stderr}")
+            # Start the call in the shared supervisor and poll until it has been processed
+            with span("supervisor_ready"):
+                ensure_supervisor()
+            with span("control_start"):
+                send_command("start", uid=self.uid)
+            with span("await_processing"):
+                seconds = WAIT_POLL_SECONDS
+                while True:
+                    status = send_command("wait", uid=self.uid, timeout=seconds + 5, seconds=seconds)
+                    self.status_changed.emit(status)
+                    self.poll_admission()
+                    if status.get("state") in ("completed", "failed"):
+                        break
+                    if status.get("state") in ("ending", "processing"):
+                        seconds = PROCESSING_POLL_SECONDS
+                        self.wait_start_time = self.wait_start_time or time.monotonic()
+                        if time.monotonic() - self.wait_start_time > self.max_wait_time:
+                            # The supervisor missed its own deadline; never leave the operator without a record
+                            self.store_local_record()
+                            break
+            
+            if status.get("state") == "failed":
+                print(f"Call {self.uid} failed: {status.get('error')}")
+                self.error.emit(f"Error in call {self.uid}: {status.get('error')}")
             else:
-                print("Process completed successfully")
+                print("Call completed successfully")
                 self.finished.emit()
         except Exception as e:
             print(f"Thread error: {str(e)}")
             self.error.emit(str(e))
 
+    def poll_admission(self):
+        """Pass on the supervisor's LLM admission level; a missed poll just keeps the last one shown"""
+        try:
+            self.admission_changed.emit(send_command("admission"))
+        except Exception:
+            pass
+
+    def store_local_record(self):
+        """Commit a keyword triage record for the call and signal completion"""
+        print(f"Call {self.uid} not processed within {self.max_wait_time}s, storing local triage")
+        transcript = TranscriptLog(self.uid).read_all()
+        record = local_analysis(transcript)
+        values = (self.uid, transcript, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                  record["summary"], record["criticality"], bool(spam_flag(record["isSpam"])), record["user"],
+                  record["location"])
+        # Leave any record the supervisor managed to store in the meantime alone
+        get_storage().save_conversation(values, record["department"], needs_refinement=True, replace=False)
+        with open("summary_complete.txt", "w") as f:
+            f.write(self.uid)
+
     def stop_conversation(self):
-        if self.process:
-            print("Stopping conversation...")
-            # Create end call signal first
-            with open("end_call.txt", "w") as f:
-                f.write("1")
-            print("Created end_call.txt signal")
-            
-            # Process the conversation immediately
-            try:
-                print("Processing conversation immediately...")
-                with open("conversations.txt", "r") as f:
-                    conversations = f.read()
-                    print("Final conversation length:", len(conversations))
-                
-                if conversations.strip():
-                    # Import and call get_conversation directly
-                    from main import get_conversation
-                    get_conversation()
-                    print("Successfully processed conversation")
-                else:
-                    print("Warning: Empty conversation, skipping processing")
-            except Exception as e:
-                print(f"Error processing conversation: {e}")
-            
-            # Force stop the process after processing
-            QTimer.singleShot(1000, self.force_stop_if_needed)
-            
-    def force_stop_if_needed(self):
-        if self.process and self.process.poll() is None:
-            print("Process still running, forcing termination...")
-            try:
-                self.process.terminate()
-                # Give it a moment to terminate gracefully
-                QTimer.singleShot(1000, self.kill_if_needed)
-            except Exception as e:
-                print(f"Error terminating process: {e}")
-                self.kill_if_needed()
+        print("Stopping conversation...")
+        # The supervisor stops the audio and summarizes the call off the GUI thread
+        try:
+            reply = send_command("end", uid=self.uid)
+            print("End call command acknowledged:", reply)
+        except OSError as e:
+            print(f"Error sending end call command: {e}")
+            self.error.emit(f"Unable to reach the voice supervisor: {e}")
+            
+    def set_muted(self, muted):
+        """Mute or unmute the caller's microphone through the control channel"""
+        try:
+            reply = send_command("mute" if muted else "unmute", uid=self.uid)
+            return reply.get("ok", False) and reply.get("supported", False)
+        except OSError as e:
+            print(f"Error sending mute command: {e}")
+            return False
+            
+class TraceWaterfall(QWidget):
+    """A call's spans as a waterfall: one row per span, indented by depth, with a bar placed by start time"""
     
-    def kill_if_needed(self):
-        if self.process and self.process.poll() is None:
-            print("Process still running after terminate, killing...")
-            try:
-                self.process.kill()
-            except Exception as e:
-                print(f"Error killing process: {e}")
-            finally:
-                self.finished.emit()
-            
+    ROW_HEIGHT = 22
+    LABEL_WIDTH = 280
+    DURATION_WIDTH = 90
+    COLORS = ["#2196F3", "#4CAF50", "#FF9800", "#9C27B0", "#607D8B"]
+    
+    def __init__(self, spans, parent=None):
+        super().__init__(parent)
+        self.spans = spans
+        self.total = max((item["offset"] + item["duration"] for item in spans), default=0.0) or 1.0
+        self.setMinimumSize(900, self.ROW_HEIGHT * max(1, len(spans)))
+        self.setMouseTracking(True)
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("white"))
+        scale = (self.width() - self.LABEL_WIDTH - self.DURATION_WIDTH) / self.total
+        for row, item in enumerate(self.spans):
+            y = row * self.ROW_HEIGHT
+            indent = 12 * item["depth"]
+            painter.setPen(QColor("#333333"))
+            painter.drawText(8 + indent, y, self.LABEL_WIDTH - 16 - indent, self.ROW_HEIGHT,
+                             Qt.AlignVCenter | Qt.AlignLeft, item["name"])
+            x = self.LABEL_WIDTH + int(item["offset"] * scale)
+            width = max(2, int(item["duration"] * scale))
+            color = "#F44336" if item["error"] else self.COLORS[item["depth"] % len(self.COLORS)]
+            painter.fillRect(x, y + 5, width, self.ROW_HEIGHT - 10, QColor(color))
+            painter.drawText(x + width + 6, y, self.DURATION_WIDTH, self.ROW_HEIGHT,
+                             Qt.AlignVCenter | Qt.AlignLeft, f"{item['duration']:.0f} ms")
+        painter.end()
+    
+    def event(self, event):
+        # Hovering a row shows its timings, attributes and error
+        if event.type() == QEvent.ToolTip:
+            row = event.pos().y() // self.ROW_HEIGHT
+            if 0 <= row < len(self.spans):
+                item = self.spans[row]
+                lines = [item["name"], f"start +{item['offset']:.1f} ms, took {item['duration']:.1f} ms"]
+                lines += [f"{key}: {value}" for key, value in item["attrs"].items()]
+                if item["error"]:
+                    lines.append(f"error: {item['error']}")
+                QToolTip.showText(event.globalPos(), "\n".join(lines), self)
+            else:
+                QToolTip.hideText()
+            return True
+        return super().event(event)
+
+class TraceDialog(QDialog):
+    def __init__(self, uid, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Trace for call {uid}")
+        self.resize(1100, 600)
+        layout = QVBoxLayout(self)
+        
+        spans = load_trace(uid)
+        if not spans:
+            layout.addWidget(QLabel("No trace was recorded for this call."))
+            return
+        
+        total = max(item["offset"] + item["duration"] for item in spans)
+        slowest = max((item for item in spans if item["depth"] > 0), key=lambda item: item["duration"], default=spans[0])
+        summary = QLabel(f"{len(spans)} spans over {total / 1000:.2f} s; slowest step: "
+                         f"{slowest['name']} ({slowest['duration']:.0f} ms)")
+        summary.setStyleSheet("font-weight: bold; padding: 4px;")
+        layout.addWidget(summary)
+        
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(TraceWaterfall(spans))
+        layout.addWidget(scroll)
+
 class VoiceAnalysisUI(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -195,6 +340,9 @@ class VoiceAnalysisUI(QMainWindow):
         
         # Initialize thread and timers
         self.conv_thread = None
+        self.transcript_offset = 0  # Byte offset already read from the live call's transcript log
+        self.transcript_messages_html = ""
+        self.end_clicked_at = None  # perf_counter() when End was pressed, for the summary_visible stage
         self.update_timer = QTimer()
         self.update_timer.timeout.connect(self.update_transcript)
         
@@ -209,6 +357,11 @@ class VoiceAnalysisUI(QMainWindow):
         # Initialize analytics with real data
         QTimer.singleShot(500, self.update_analytics)
         
+    def closeEvent(self, event):
+        # Stop the voice supervisor started for this window
+        stop_supervisor()
+        super().closeEvent(event)
+        
     def create_active_calls_page(self):
         page = QWidget()
         layout = QVBoxLayout(page)
@@ -256,6 +409,40 @@ class VoiceAnalysisUI(QMainWindow):
         self.end_button.setEnabled(False)
         button_layout.addWidget(self.end_button)
         
+        self.mute_button = QPushButton("Mute")
+        self.mute_button.setCheckable(True)
+        self.mute_button.setStyleSheet("""
+            QPushButton {
+                background-color: #607D8B;
+                color: white;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #546E7A;
+            }
+            QPushButton:checked {
+                background-color: #F44336;
+            }
+            QPushButton:disabled {
+                background-color: #cccccc;
+            }
+        """)
+        self.mute_button.clicked.connect(self.toggle_mute)
+        self.mute_button.setEnabled(False)
+        button_layout.addWidget(self.mute_button)
+        
+        # Preliminary criticality, shown as soon as it streams in and before the summary is stored
+        self.analysis_label = QLabel("")
+        self.analysis_label.setStyleSheet("font-weight: bold; padding: 0 8px;")
+        button_layout.addWidget(self.analysis_label)
+        
+        # Degradation level of the LLM tier, shown only while analysis is being shed
+        self.admission_label = QLabel("")
+        self.admission_label.setStyleSheet("font-weight: bold; padding: 0 8px;")
+        button_layout.addWidget(self.admission_label)
+        
         # Add Dispatch button and options
         self.dispatch_button = QPushButton("Dispatch")
         self.dispatch_button.setStyleSheet("""
@@ -393,11 +580,10 @@ class VoiceAnalysisUI(QMainWindow):
         map_label.setStyleSheet("color: #2196F3; margin-bottom: 5px;")
         map_layout.addWidget(map_label)
         
-        self.map_view = QWebEngineView()
-        self.map_view.setMinimumWidth(400)
-        self.map_view.setMinimumHeight(300)
-        self.map_view.setUrl(QUrl('https://www.openstreetmap.org'))
-        map_layout.addWidget(self.map_view)
+        # The web view starts a Chromium process, so it is created once the window is on screen
+        self.map_layout = map_layout
+        self.map_view = None
+        QTimer.singleShot(0, self.create_map_view)
         
         # Right side - Live Transcript
         transcript_widget = QWidget()
@@ -625,6 +811,23 @@ class VoiceAnalysisUI(QMainWindow):
         """)
         filters_layout.addWidget(apply_filters_btn)
         
+        # Waterfall of the selected call's trace, for diagnosing slow calls after the fact
+        trace_btn = QPushButton("View Trace")
+        trace_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #607D8B;
+                color: white;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #455A64;
+            }
+        """)
+        trace_btn.clicked.connect(self.show_selected_trace)
+        filters_layout.addWidget(trace_btn)
+        
         layout.addLayout(filters_layout)
         
         # History table
@@ -662,9 +865,20 @@ class VoiceAnalysisUI(QMainWindow):
         self.conversation_tree.setColumnWidth(6, 150)  # user
         self.conversation_tree.setColumnWidth(7, 150)  # location
         
+        self.conversation_tree.itemDoubleClicked.connect(lambda item, column: self.show_trace(item.text(0)))
         layout.addWidget(self.conversation_tree)
         
         return page
+    
+    def show_selected_trace(self):
+        item = self.conversation_tree.currentItem()
+        if item is None:
+            QMessageBox.information(self, "Trace", "Select a call in the history to view its trace.")
+            return
+        self.show_trace(item.text(0))
+    
+    def show_trace(self, uid):
+        TraceDialog(uid, self).exec_()
         
     def create_analytics_page(self):
         page = QWidget()
@@ -845,6 +1059,7 @@ class VoiceAnalysisUI(QMainWindow):
             print("Warning: Could not find value label in stat card")
 
     def create_pie_chart(self, title):
+        from PyQt5.QtChart import QChart, QChartView, QPieSeries
         series = QPieSeries()
         
         # Sample data - will be updated with real data
@@ -872,6 +1087,7 @@ class VoiceAnalysisUI(QMainWindow):
         return chartview
 
     def create_bar_chart(self, title):
+        from PyQt5.QtChart import QChart, QChartView, QBarSeries, QBarSet, QBarCategoryAxis, QValueAxis
         series = QBarSeries()
         
         # Empty bar set - data will be populated in update_analytics
@@ -914,6 +1130,7 @@ class VoiceAnalysisUI(QMainWindow):
         return chartview
 
     def create_line_chart(self, title):
+        from PyQt5.QtChart import QChart, QChartView, QLineSeries, QDateTimeAxis, QValueAxis
         # Create an empty line series for call volume
         series = QLineSeries()
         series.setName("Call Volume")
@@ -956,75 +1173,79 @@ class VoiceAnalysisUI(QMainWindow):
         return chartview
 
     def update_analytics(self):
+        with metrics.stage("analytics_refresh"):
+            self._update_analytics()
+        metrics.publish("ui")
+
+    def _update_analytics(self):
         try:
             period = self.period_combo.currentText()
             
             # Fetch data based on selected time period
-            conn = sqlite3.connect("conversation.db")
-            c = conn.cursor()
+            c = get_storage().connection().cursor()
             
-            # Query based on time period
+            # Query based on time period; ts_epoch is indexed, so each filter is a range scan
+            now = int(time.time())
             if period == "Last 24 Hours":
-                time_filter = "datetime(timestamp) >= datetime('now', '-1 day')"
                 days_to_look_back = 1
             elif period == "Last Week":
-                time_filter = "datetime(timestamp) >= datetime('now', '-7 days')"
                 days_to_look_back = 7
             elif period == "Last Month":
-                time_filter = "datetime(timestamp) >= datetime('now', '-30 days')"
                 days_to_look_back = 30
             else:  # All Time
+                days_to_look_back = None
+            
+            if days_to_look_back:
+                time_filter = "ts_epoch >= ?"
+                params = (now - days_to_look_back * 86400,)
+            else:
                 time_filter = "1=1"
+                params = ()
                 # Get the oldest record to determine range
-                c.execute("SELECT julianday('now') - julianday(MIN(timestamp)) FROM conversations")
+                c.execute("SELECT MIN(ts_epoch) FROM conversations")
                 result = c.fetchone()
-                days_to_look_back = int(result[0]) if result and result[0] else 30  # Default to 30 if no data
-            
-            # Get total calls
-            c.execute(f"SELECT COUNT(*) FROM conversations WHERE {time_filter}")
-            total_calls = c.fetchone()[0]
+                days_to_look_back = (now - result[0]) // 86400 if result and result[0] else 30  # Default to 30 if no data
             
-            # Get spam rate
-            c.execute(f"SELECT COUNT(*) FROM conversations WHERE isSpam = 1 AND {time_filter}")
-            spam_calls = c.fetchone()[0]
+            # Get totals, spam and criticality counts and word counts in one pass over the analytics index
+            c.execute(f"""
+                SELECT 
+                    COUNT(*),
+                    COALESCE(SUM(is_spam), 0),
+                    COALESCE(SUM(criticality_level = 3), 0),
+                    COALESCE(SUM(criticality_level = 2), 0),
+                    COALESCE(SUM(criticality_level = 1), 0),
+                    COALESCE(SUM(word_count), 0)
+                FROM conversations
+                WHERE {time_filter}
+            """, params)
+            total_calls, spam_calls, high_priority, medium_priority, low_priority, total_words = c.fetchone()
             spam_rate = (spam_calls / total_calls * 100) if total_calls > 0 else 0
             
-            # Get emergency distribution
-            c.execute(f"SELECT criticality FROM conversations WHERE {time_filter}")
-            criticalities = [row[0].upper() if row[0] else "UNKNOWN" for row in c.fetchall()]
-            
-            # Count different criticality levels
-            high_priority = sum(1 for c in criticalities if c == 'HIGH')
-            medium_priority = sum(1 for c in criticalities if c == 'MEDIUM')
-            low_priority = sum(1 for c in criticalities if c == 'LOW')
-            
             # Emergency rate is percentage of high criticality calls
             emergency_rate = (high_priority / total_calls * 100) if total_calls > 0 else 0
             
             # Get average call duration (simulated since we don't track actual duration)
             # Instead, let's use word count as a proxy for call duration
-            c.execute(f"SELECT conversation FROM conversations WHERE {time_filter}")
-            conversations = c.fetchall()
-            total_words = sum(len(str(convo[0]).split()) for convo in conversations if convo[0])
             avg_words = total_words / total_calls if total_calls > 0 else 0
             # Assume average speaking rate of 150 words per minute
             avg_duration = avg_words / 150 if avg_words > 0 else 0
             
             # Get location distribution
-            c.execute(f"SELECT location FROM conversations WHERE {time_filter}")
-            locations = [row[0] if row[0] and row[0].lower() != "unknown" else "Other" for row in c.fetchall()]
-            location_counts = Counter(locations)
+            c.execute(f"SELECT location, COUNT(*) FROM conversations WHERE {time_filter} GROUP BY location", params)
+            location_counts = Counter()
+            for location, count in c.fetchall():
+                location_counts[location if location and location.lower() != "unknown" else "Other"] += count
             
             # Get data for call volume timeline
             c.execute(f"""
                 SELECT 
-                    date(timestamp) as call_date,
+                    date(ts_epoch, 'unixepoch', 'localtime') as call_date,
                     COUNT(*) as call_count
                 FROM conversations
                 WHERE {time_filter}
-                GROUP BY date(timestamp)
+                GROUP BY call_date
                 ORDER BY call_date
-            """)
+            """, params)
             date_counts = c.fetchall()
             
             # Update statistics cards
@@ -1042,14 +1263,13 @@ class VoiceAnalysisUI(QMainWindow):
             # Update timeline chart
             self._update_timeline_chart(date_counts, days_to_look_back)
             
-            conn.close()
-            
         except Exception as e:
             print(f"Error updating analytics: {e}")
             import traceback
             traceback.print_exc()
             
     def _update_criticality_chart(self, high, medium, low, spam):
+        from PyQt5.QtChart import QBarSeries, QBarSet, QBarCategoryAxis, QValueAxis
         # Update the emergency type bar chart with real data
         chart = self.type_chart.chart()
         
@@ -1150,6 +1370,7 @@ class VoiceAnalysisUI(QMainWindow):
         axis_y.setLabelsFont(QFont("Arial", 9))
 
     def _update_location_chart(self, location_counts):
+        from PyQt5.QtChart import QPieSeries
         # Update the location pie chart with new data
         series = QPieSeries()
         
@@ -1194,31 +1415,19 @@ class VoiceAnalysisUI(QMainWindow):
         if index == 2:  # Analytics page is at index 2
             self.update_analytics()
 
+    def fetch_active_conversations(self):
+        """The active calls queue: recent and still preliminary calls, ordered by criticality in the query"""
+        try:
+            return get_storage().fetch_active_conversations(int(time.time() - ACTIVE_CALL_WINDOW), ACTIVE_CALLS_SHOWN)
+        except sqlite3.Error as e:
+            print(f"SQLite error fetching active calls: {e}")
+            return []
+
     def fetch_conversations(self):
         try:
             print("\nAttempting to fetch conversations from database...")
-            conn = sqlite3.connect("conversation.db")
-            c = conn.cursor()
-            
-            # First check if table exists
-            c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='conversations'")
-            if not c.fetchone():
-                print("Table 'conversations' does not exist!")
-                return []
-            
-            # Check table structure
-            c.execute("PRAGMA table_info(conversations)")
-            columns = c.fetchall()
-            print("Table structure:", columns)
-            
-            # Get the count of records before fetching
-            c.execute("SELECT COUNT(*) FROM conversations")
-            count = c.fetchone()[0]
-            print(f"Total records in database: {count}")
-            
-            # Fetch all conversations ordered by timestamp
-            c.execute("SELECT * FROM conversations ORDER BY timestamp DESC")
-            rows = c.fetchall()
+            # Fetch all conversations ordered by timestamp; the storage layer creates the table if needed
+            rows = get_storage().fetch_conversations()
             
             # Print detailed debug information
             print(f"\nFetched {len(rows)} conversations from database")
@@ -1230,7 +1439,6 @@ class VoiceAnalysisUI(QMainWindow):
                     print(f"Column {idx}: {value}")
                 print(f"\nLatest conversation timestamp: {rows[0][2]}")
             
-            conn.close()
             return rows
             
         except sqlite3.Error as e:
@@ -1241,12 +1449,18 @@ class VoiceAnalysisUI(QMainWindow):
             return []
 
     def update_conversation_list(self):
+        with metrics.stage("ui_refresh"):
+            self._update_conversation_list()
+        metrics.publish("ui")
+
+    def _update_conversation_list(self):
         print("\nUpdating conversation list...")
         self.conversation_tree.clear()
         self.active_conversation_tree.clear()  # Clear both trees
         self.active_calls_list.clear()  # Clear active calls list
         conversations = self.fetch_conversations()
         print(f"Fetched {len(conversations)} conversations from database")
+        active_calls = self.fetch_active_conversations() if conversations else []
         
         # If no conversations found, add some sample data for testing
         if not conversations:
@@ -1259,6 +1473,8 @@ class VoiceAnalysisUI(QMainWindow):
                 (5, "Gas leak reported near School", "2023-07-15 18:05:45", "Gas leak at School", "HIGH", 0, "Michael Wilson", "City School")
             ]
             conversations = sample_conversations
+            # Most critical first, as the database orders the real queue; the sort is stable, so newest first within a level
+            active_calls = sorted(conversations, key=lambda convo: -criticality_level(convo[4]))[:ACTIVE_CALLS_SHOWN]
         
         # Store the current scroll positions
         current_scroll = self.conversation_tree.verticalScrollBar().value()
@@ -1291,75 +1507,82 @@ class VoiceAnalysisUI(QMainWindow):
                     history_item.setText(col, value)
                     active_item.setText(col, value)
                 
-                # Add to active calls list
-                if idx < 5:  # Show only the 5 most recent calls
-                    call_item = QListWidgetItem()
-                    
-                    # Set background color based on status
-                    call_uid = tree_values[0]
-                    
-                    # Initialize status for new calls
-                    if call_uid not in self.call_status:
-                        self.call_status[call_uid] = {'dispatched': False, 'resolved': False}
-                    
-                    status = self.call_status[call_uid]
-                    
-                    # Create main card widget
-                    call_widget = QFrame()
-                    call_widget.setObjectName("callCard")
-                    call_widget.setMinimumHeight(50)  # Set minimum height
-                    
-                    # Determine border color based on status
-                    border_color = "#F44336"  # Default red
-                    if status['resolved']:
-                        border_color = "#4CAF50"  # Green for resolved
-                    elif status['dispatched']:
-                        border_color = "#FFEB3B"  # Yellow for dispatched
-                    
-                    # Basic styling for all cards
-                    call_widget.setStyleSheet(f"""
-                        #callCard {{
-                            background-color: white;
-                            border: none;
-                            border-left: 4px solid {border_color};
-                            padding: 10px 15px;
-                        }}
-                    """)
-                    
-                    # Use a grid layout for more control
-                    card_layout = QGridLayout(call_widget)
-                    card_layout.setContentsMargins(5, 5, 5, 5)
-                    card_layout.setSpacing(2)
-                    
-                    # Create a label for emergency type and location with better visibility
-                    emergency_info = QLabel(f"{tree_values[3]} - {tree_values[7]}")
-                    emergency_info.setFont(QFont("Arial", 11, QFont.Bold))
-                    emergency_info.setStyleSheet("color: #212121; padding: 2px;")
-                    emergency_info.setWordWrap(True)
-                    
-                    # Time label
-                    time_label = QLabel(f"Time: {tree_values[2].split(' ')[1]}")  # Only show time portion
-                    time_label.setFont(QFont("Arial", 10))
-                    time_label.setStyleSheet("color: #666666; padding: 2px;")
-                    
-                    # Add widgets to layout
-                    card_layout.addWidget(emergency_info, 0, 0)
-                    card_layout.addWidget(time_label, 1, 0)
-                    
-                    # Apply final styling to item
-                    call_item.setSizeHint(QSize(call_widget.sizeHint().width(), 70))  # Force height
-                    
-                    # Store the conversation data in the item
-                    call_item.setData(Qt.UserRole, convo)
-                    
-                    # Add to list
-                    self.active_calls_list.addItem(call_item)
-                    self.active_calls_list.setItemWidget(call_item, call_widget)
-                
                 print(f"Added conversation {idx + 1}: {tree_values[0]} - {tree_values[6]} - {tree_values[7]}")
             except Exception as e:
                 print(f"Error adding conversation {idx}: {str(e)}")
         
+        for convo in active_calls:
+            try:
+                tree_values = [str(value) for value in convo]
+                
+                # Add to active calls list
+                call_item = QListWidgetItem()
+                
+                # Set background color based on status
+                call_uid = tree_values[0]
+                
+                # Initialize status for new calls
+                if call_uid not in self.call_status:
+                    self.call_status[call_uid] = {'dispatched': False, 'resolved': False}
+                
+                status = self.call_status[call_uid]
+                
+                # Create main card widget
+                call_widget = QFrame()
+                call_widget.setObjectName("callCard")
+                call_widget.setMinimumHeight(50)  # Set minimum height
+                
+                # Determine border color based on status
+                border_color = "#F44336"  # Default red
+                if status['resolved']:
+                    border_color = "#4CAF50"  # Green for resolved
+                elif status['dispatched']:
+                    border_color = "#FFEB3B"  # Yellow for dispatched
+                
+                # Basic styling for all cards
+                call_widget.setStyleSheet(f"""
+                    #callCard {{
+                        background-color: white;
+                        border: none;
+                        border-left: 4px solid {border_color};
+                        padding: 10px 15px;
+                    }}
+                """)
+                
+                # Use a grid layout for more control
+                card_layout = QGridLayout(call_widget)
+                card_layout.setContentsMargins(5, 5, 5, 5)
+                card_layout.setSpacing(2)
+                
+                # Create a label for emergency type and location with better visibility
+                emergency_info = QLabel(f"{tree_values[3]} - {tree_values[7]}")
+                emergency_info.setFont(QFont("Arial", 11, QFont.Bold))
+                emergency_info.setStyleSheet("color: #212121; padding: 2px;")
+                emergency_info.setWordWrap(True)
+                
+                # Time label
+                time_label = QLabel(f"Time: {tree_values[2].split(' ')[1]}")  # Only show time portion
+                time_label.setFont(QFont("Arial", 10))
+                time_label.setStyleSheet("color: #666666; padding: 2px;")
+                
+                # Add widgets to layout
+                card_layout.addWidget(emergency_info, 0, 0)
+                card_layout.addWidget(time_label, 1, 0)
+                
+                # Apply final styling to item
+                call_item.setSizeHint(QSize(call_widget.sizeHint().width(), 70))  # Force height
+                
+                # Store the conversation data in the item
+                call_item.setData(Qt.UserRole, convo)
+                
+                # Add to list
+                self.active_calls_list.addItem(call_item)
+                self.active_calls_list.setItemWidget(call_item, call_widget)
+                
+                print(f"Added active call {call_uid} ({tree_values[4]})")
+            except Exception as e:
+                print(f"Error adding active call {convo[0]}: {str(e)}")
+        
         # Restore scroll positions
         self.conversation_tree.verticalScrollBar().setValue(current_scroll)
         self.active_conversation_tree.verticalScrollBar().setValue(active_scroll)
@@ -1378,142 +1601,164 @@ class VoiceAnalysisUI(QMainWindow):
         print("Conversation list update complete")
 
     def update_transcript(self):
-        try:
-            with open("conversations.txt", "r") as f:
-                transcript_text = f.read()
-                
-                # Parse the conversation into individual messages
-                lines = transcript_text.split("\n")
-                chat_html = "<div class=\"chat-container\">"
-                chat_html += "<h3 style=\"color: #333; border-bottom: 1px solid #ddd; padding-bottom: 5px; margin-top: 0;\">CALL TRANSCRIPT</h3>"
-                
-                for line in lines:
+        if not self.conv_thread:
+            return
+        # Tail only the bytes appended to this call's transcript since the last tick
+        transcript_text, self.transcript_offset = TranscriptLog(self.conv_thread.uid).read_from(self.transcript_offset)
+        if not transcript_text:
+            return
+        self.update_preliminary_analysis()
+        
+        # Parse the new lines into individual messages
+        lines = transcript_text.split("\n")
+        chat_html = ""
+        
+        for line in lines:
+            if line.strip():
+                if line.startswith("EVI:"):
+                    # Operator message
+                    message = line[4:].strip()
+                    chat_html += f"""
+                        <div class="message-row operator-row">
+                            <div class="operator-icon">🤖</div>
+                            <div class="operator-message">{message}</div>
+                        </div>
+                    """
+                elif line.startswith("You:"):
+                    # Caller message
+                    message = line[4:].strip()
+                    chat_html += f"""
+                        <div class="message-row caller-row">
+                            <div class="caller-icon">👤</div>
+                            <div class="caller-message">{message}</div>
+                        </div>
+                    """
+                elif not line.startswith("<"):  # Skip tags like <USER_INTERRUPTION>
+                    # System message or untagged line
                     if line.strip():
-                        if line.startswith("EVI:"):
-                            # Operator message
-                            message = line[4:].strip()
-                            chat_html += f"""
-                                <div class="message-row operator-row">
-                                    <div class="operator-icon">🤖</div>
-                                    <div class="operator-message">{message}</div>
-                                </div>
-                            """
-                        elif line.startswith("You:"):
-                            # Caller message
-                            message = line[4:].strip()
-                            chat_html += f"""
-                                <div class="message-row caller-row">
-                                    <div class="caller-icon">👤</div>
-                                    <div class="caller-message">{message}</div>
-                                </div>
-                            """
-                        elif not line.startswith("<"):  # Skip tags like <USER_INTERRUPTION>
-                            # System message or untagged line
-                            if line.strip():
-                                chat_html += f"""
-                                    <div style="text-align: center; color: #666; font-style: italic; margin: 8px 0; font-size: 12px;">
-                                        {line.strip()}
-                                    </div>
-                                """
-                
-                chat_html += "</div>"
-                
-                # Update the HTML content
-                self.transcript_area.setHtml(f"""
-                    <html>
-                    <head>
-                        <style>
-                            body {{ 
-                                background-color: #f5f5f5; 
-                                font-family: Arial, sans-serif;
-                                margin: 0;
-                                padding: 5px;
-                            }}
-                            .chat-container {{
-                                display: flex;
-                                flex-direction: column;
-                                gap: 10px;
-                            }}
-                            .operator-message, .caller-message {{
-                                max-width: 80%;
-                                padding: 10px 14px;
-                                border-radius: 18px;
-                                margin: 2px 0;
-                                position: relative;
-                                display: inline-block;
-                            }}
-                            .operator-message {{
-                                background-color: #e9e9e9;
-                                color: #333;
-                                align-self: flex-start;
-                                margin-right: auto;
-                                border-bottom-left-radius: 5px;
-                            }}
-                            .caller-message {{
-                                background-color: #2979FF;
-                                color: white;
-                                align-self: flex-end;
-                                margin-left: auto;
-                                border-bottom-right-radius: 5px;
-                            }}
-                            .operator-icon, .caller-icon {{
-                                width: 28px;
-                                height: 28px;
-                                background-color: #ccc;
-                                border-radius: 50%;
-                                display: inline-flex;
-                                align-items: center;
-                                justify-content: center;
-                                margin-right: 8px;
-                                vertical-align: top;
-                                text-align: center;
-                                font-size: 14px;
-                            }}
-                            .operator-icon {{
-                                background-color: #e0e0e0;
-                            }}
-                            .caller-icon {{
-                                background-color: #e0e0e0;
-                                margin-right: 0;
-                                margin-left: 8px;
-                            }}
-                            .message-row {{
-                                display: flex;
-                                margin-bottom: 12px;
-                                align-items: flex-start;
-                            }}
-                            .operator-row {{
-                                justify-content: flex-start;
-                            }}
-                            .caller-row {{
-                                justify-content: flex-end;
-                                flex-direction: row-reverse;
-                            }}
-                        </style>
-                    </head>
-                    <body>
-                        {chat_html}
-                    </body>
-                    </html>
-                """)
-                
-                # Scroll to the top to show the beginning of the conversation
-                self.transcript_area.verticalScrollBar().setValue(0)
-        except FileNotFoundError:
-            pass
+                        chat_html += f"""
+                            <div style="text-align: center; color: #666; font-style: italic; margin: 8px 0; font-size: 12px;">
+                                {line.strip()}
+                            </div>
+                        """
+        
+        self.transcript_messages_html += chat_html
+        chat_html = "<div class=\"chat-container\">"
+        chat_html += "<h3 style=\"color: #333; border-bottom: 1px solid #ddd; padding-bottom: 5px; margin-top: 0;\">CALL TRANSCRIPT</h3>"
+        chat_html += self.transcript_messages_html
+        chat_html += "</div>"
+        
+        # Update the HTML content
+        self.transcript_area.setHtml(f"""
+            <html>
+            <head>
+                <style>
+                    body {{ 
+                        background-color: #f5f5f5; 
+                        font-family: Arial, sans-serif;
+                        margin: 0;
+                        padding: 5px;
+                    }}
+                    .chat-container {{
+                        display: flex;
+                        flex-direction: column;
+                        gap: 10px;
+                    }}
+                    .operator-message, .caller-message {{
+                        max-width: 80%;
+                        padding: 10px 14px;
+                        border-radius: 18px;
+                        margin: 2px 0;
+                        position: relative;
+                        display: inline-block;
+                    }}
+                    .operator-message {{
+                        background-color: #e9e9e9;
+                        color: #333;
+                        align-self: flex-start;
+                        margin-right: auto;
+                        border-bottom-left-radius: 5px;
+                    }}
+                    .caller-message {{
+                        background-color: #2979FF;
+                        color: white;
+                        align-self: flex-end;
+                        margin-left: auto;
+                        border-bottom-right-radius: 5px;
+                    }}
+                    .operator-icon, .caller-icon {{
+                        width: 28px;
+                        height: 28px;
+                        background-color: #ccc;
+                        border-radius: 50%;
+                        display: inline-flex;
+                        align-items: center;
+                        justify-content: center;
+                        margin-right: 8px;
+                        vertical-align: top;
+                        text-align: center;
+                        font-size: 14px;
+                    }}
+                    .operator-icon {{
+                        background-color: #e0e0e0;
+                    }}
+                    .caller-icon {{
+                        background-color: #e0e0e0;
+                        margin-right: 0;
+                        margin-left: 8px;
+                    }}
+                    .message-row {{
+                        display: flex;
+                        margin-bottom: 12px;
+                        align-items: flex-start;
+                    }}
+                    .operator-row {{
+                        justify-content: flex-start;
+                    }}
+                    .caller-row {{
+                        justify-content: flex-end;
+                        flex-direction: row-reverse;
+                    }}
+                </style>
+            </head>
+            <body>
+                {chat_html}
+            </body>
+            </html>
+        """)
+        
+        # Scroll to the top to show the beginning of the conversation
+        self.transcript_area.verticalScrollBar().setValue(0)
 
     def start_conversation_thread(self):
         self.start_button.setEnabled(False)
         self.end_button.setEnabled(True)
+        self.mute_button.setEnabled(True)
         self.transcript_area.clear()
+        self.transcript_offset = 0
+        self.transcript_messages_html = ""
+        self.analysis_label.setText("")
         self.conv_thread = ConversationThread()
         self.conv_thread.finished.connect(self.on_conversation_finished)
         self.conv_thread.error.connect(self.on_conversation_error)
+        self.conv_thread.status_changed.connect(self.update_preliminary_analysis)
+        self.conv_thread.admission_changed.connect(self.update_admission_level)
         self.conv_thread.start()
         
         self.update_timer.start(1000)
 
+    def create_map_view(self):
+        if self.map_view is not None:
+            return
+        from PyQt5.QtWebEngineWidgets import QWebEngineView
+        self.map_view = QWebEngineView()
+        self.map_view.setMinimumWidth(400)
+        self.map_view.setMinimumHeight(300)
+        self.map_view.setUrl(QUrl('https://www.openstreetmap.org'))
+        self.map_layout.addWidget(self.map_view)
+
     def update_map_location(self, location):
+        self.create_map_view()
         if location and location.lower() != "unknown":
             formatted_location = location.replace(' ', '+')
             self.map_view.setUrl(
@@ -1525,6 +1770,30 @@ class VoiceAnalysisUI(QMainWindow):
             self.map_view.setUrl(QUrl('https://www.openstreetmap.org'))
             print("Reset map to default view (location unknown)")
 
+    def update_preliminary_analysis(self, status):
+        # Local keyword triage until the LLM's criticality has streamed in
+        analysis = status.get("analysis") or {}
+        priority = status.get("priority") or {}
+        criticality = str(priority.get("criticality") or "").upper()
+        if criticality not in ("HIGH", "MEDIUM", "LOW"):
+            return
+        colors = {"HIGH": "#F44336", "MEDIUM": "#FF9800", "LOW": "#4CAF50"}
+        if priority.get("source") == "triage":
+            detail = f" ({priority.get('department', 'Unknown')}, keyword triage)"
+        else:
+            detail = " (possible spam)" if str(analysis.get("isSpam")).lower() == "true" else ""
+        self.analysis_label.setText(f"Criticality: {criticality}{detail}")
+        self.analysis_label.setStyleSheet(f"font-weight: bold; padding: 0 8px; color: {colors[criticality]};")
+
+    def update_admission_level(self, admission):
+        colors = {"reduced": "#FF9800", "local-only": "#F44336"}
+        name = admission.get("name")
+        if name in colors:
+            self.admission_label.setText(f"LLM load: {name} (depth {admission.get('depth', 0)})")
+            self.admission_label.setStyleSheet(f"font-weight: bold; padding: 0 8px; color: {colors[name]};")
+        else:
+            self.admission_label.setText("")
+
     def check_summary_completion(self):
         if os.path.exists("summary_complete.txt"):
             print("Summary completion detected, reading conversation ID...")
@@ -1534,14 +1803,14 @@ class VoiceAnalysisUI(QMainWindow):
                 print(f"Found conversation ID: {conversation_id}")
                 
                 # Verify the conversation exists in the database
-                conn = sqlite3.connect("conversation.db")
-                c = conn.cursor()
-                c.execute("SELECT * FROM conversations WHERE uid = ?", (conversation_id,))
-                result = c.fetchone()
-                conn.close()
+                result = get_storage().fetch_conversation(conversation_id)
                 
                 if result:
                     print(f"Verified conversation {conversation_id} exists in database")
+                    if self.end_clicked_at is not None:
+                        # From the operator pressing End to the stored summary reaching the UI
+                        metrics.observe("summary_visible", time.perf_counter() - self.end_clicked_at)
+                        self.end_clicked_at = None
                     # Update map with location from the conversation
                     location = result[7]  # Location is the 8th column (index 7)
                     self.update_map_location(location)
@@ -1566,6 +1835,7 @@ class VoiceAnalysisUI(QMainWindow):
                 # Enable the start button and disable the end button
                 self.start_button.setEnabled(True)
                 self.end_button.setEnabled(False)
+                self.reset_mute_button()
                 print("Updated button states")
                 
                 # Stop the transcript update timer
@@ -1582,6 +1852,7 @@ class VoiceAnalysisUI(QMainWindow):
     def on_conversation_finished(self):
         self.start_button.setEnabled(True)
         self.end_button.setEnabled(False)
+        self.reset_mute_button()
         self.update_timer.stop()
         self.summary_check_timer.stop()
         print("Conversation finished, performing final update...")
@@ -1592,6 +1863,7 @@ class VoiceAnalysisUI(QMainWindow):
     def on_conversation_error(self, error_msg):
         self.start_button.setEnabled(True)
         self.end_button.setEnabled(False)
+        self.reset_mute_button()
         self.update_timer.stop()
         self.summary_check_timer.stop()
         QMessageBox.critical(self, "Error", error_msg)
@@ -1600,13 +1872,29 @@ class VoiceAnalysisUI(QMainWindow):
         if self.conv_thread and self.conv_thread.isRunning():
             print("Ending conversation...")
             # Stop the conversation thread
+            self.end_clicked_at = time.perf_counter()
             self.conv_thread.stop_conversation()
             self.end_button.setEnabled(False)
+            self.reset_mute_button()
             QMessageBox.information(self, "Info", "Ending conversation and generating summary...\nPlease wait while the conversation is processed.")
             
             # Start checking for summary completion with a shorter interval
             self.summary_check_timer.start(500)  # Check every 500ms instead of 1000ms
 
+    def reset_mute_button(self):
+        self.mute_button.setChecked(False)
+        self.mute_button.setText("Mute")
+        self.mute_button.setEnabled(False)
+
+    def toggle_mute(self):
+        muted = self.mute_button.isChecked()
+        if self.conv_thread and self.conv_thread.isRunning() and self.conv_thread.set_muted(muted):
+            self.mute_button.setText("Unmute" if muted else "Mute")
+        else:
+            # Revert the button if the voice process could not apply the change
+            self.mute_button.setChecked(not muted)
+            QMessageBox.warning(self, "Warning", "Unable to change microphone mute state.")
+
     def toggle_dark_mode(self):
         self.dark_mode = self.dark_mode_toggle.isChecked()
         self.apply_theme()
@@ -2565,12 +2853,16 @@ class LoginWindow(QMainWindow):
             self.status_label.setText("Invalid username or password")
             return
         
-        # Login successful, launch main application
+        # Login successful; start the voice supervisor in the background so the first call does not wait for it
+        prestart_supervisor()
+        # Launch main application
         self.main_app = VoiceAnalysisUI()
         self.main_app.show()
         self.close()
 
 if __name__ == '__main__':
+    # Lets QtWebEngine be imported after the QApplication exists, so the login window does not wait for it
+    QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
     login_window = LoginWindow()
     login_window.show()